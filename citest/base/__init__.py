@@ -22,9 +22,13 @@ from .snapshot import (
     JsonSnapshotHelper,
     JsonSnapshot,
     Edge,
-    SnapshotEntity)
+    SnapshotEntity,
+    SnapshotRelation)
+
+from .snapshot_budget import SnapshotPayloadBudget
 
 from .record_stream import (
+    PartialFrameError,
     RecordInputStream,
     RecordOutputStream)
 
@@ -39,8 +43,18 @@ from .global_journal import (
     set_global_journal,
     unset_global_journal)
 
+from .journal_index import (
+    JournalIndex,
+    JournalIndexEntry,
+    rebuild_journal_index)
+
 from .journal_navigator import (
+    IndexedJournalNavigator,
     JournalNavigator,
+    FollowJournalNavigator,
+    MergedJournalNavigator,
+    ParallelJournalNavigator,
+    SegmentedJournalNavigator,
     StreamJournalNavigator)
 
 from .journal_processor import (
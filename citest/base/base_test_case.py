@@ -41,6 +41,7 @@ import traceback
 import unittest
 
 from .journal_logger import JournalLogger
+from .snapshot import SnapshotRelation
 
 
 class _TestProcessingStep(object):
@@ -102,13 +103,13 @@ class BaseTestCase(unittest.TestCase):
     # Note this comment is not a string so that the TestRunner
     # will not reflect on its comment.
 
-    self.__end_step_context(relation='VALID')
+    self.__end_step_context(relation=SnapshotRelation.VALID)
     self.__in_step = _TestProcessingStep.SETUP
 
     JournalLogger.begin_context('Execute')
     self.__method()
 
-    JournalLogger.end_context(relation='VALID')
+    JournalLogger.end_context(relation=SnapshotRelation.VALID)
     self.__in_step = _TestProcessingStep.TEARDOWN
 
     self.__begin_step_context()
@@ -128,26 +129,26 @@ class BaseTestCase(unittest.TestCase):
     JournalLogger.end_context(relation=relation)
 
   def __trap_skip(self, delegate, test, reason):
-    self.__final_outcome_relation = 'VALID'
+    self.__final_outcome_relation = SnapshotRelation.VALID
     return delegate(test, reason)
 
   def __trap_success(self, delegate, test):
-    self.__final_outcome_relation = 'VALID'
+    self.__final_outcome_relation = SnapshotRelation.VALID
     return delegate(test)
 
   def __trap_failure(self, delegate, test, err):
-    self.__final_outcome_relation = 'INVALID'
+    self.__final_outcome_relation = SnapshotRelation.INVALID
     return delegate(test, err)
 
   def __trap_error(self, delegate, test, err):
-    self.__final_outcome_relation = 'ERROR'
+    self.__final_outcome_relation = SnapshotRelation.ERROR
     error_details = '%s: %s' % (err[0], err[1])
     trace = traceback.format_tb(err[2])
     JournalLogger.journal_or_log_detail(
-        'Raised Exception', error_details, relation='ERROR',
+        'Raised Exception', error_details, relation=SnapshotRelation.ERROR,
         levelno=logging.ERROR, format='pre', _logger=self.logger)
     JournalLogger.journal_or_log_detail(
-        'Exception Trace', trace, relation='ERROR',
+        'Exception Trace', trace, relation=SnapshotRelation.ERROR,
         levelno=logging.DEBUG, format='pre', _logger=self.logger)
     return delegate(test, err)
 
@@ -18,10 +18,13 @@
 import argparse
 import copy
 import inspect
+import logging
 import os
 import re
 import sys
 
+from multiprocessing.pool import ThreadPool
+
 try:
   import ConfigParser
 except ImportError:
@@ -41,19 +44,20 @@ def _normalize_key(key):
   return key.lower()
 
 
+# Either $VAR or ${VAR}, as long as not preceeded by '\'
+_ENVIRONMENT_VARIABLE_REGEX = re.compile(r'(?<!\\)\$(\w+|\{([^}]*)\})')
+
+
 def _normalize_value(value):
   """Substitute environment variable references."""
-  if not isinstance(value, basestring):
+  if not isinstance(value, basestring) or '$' not in value:
     return value
 
   def replace_var(m):
     """helper function"""
     return os.environ.get(m.group(2) or m.group(1), m.group(0))
 
-  # Either $VAR or ${VAR}, as long as not preceeded by '\'
-  regex = r'(?<!\\)\$(\w+|\{([^}]*)\})'
-
-  return re.sub(regex, replace_var, value)
+  return _ENVIRONMENT_VARIABLE_REGEX.sub(replace_var, value)
 
 
 def _normalize_dict_keys(data):
@@ -97,8 +101,19 @@ class ConfigurationBindings(object):
   other values that have lazy initializers, thus the functions should not
   form a cycle.
 
+  LazyInitializers that are slow to compute, such as those discovering the
+  environment over the network, can be declared prefetchable. These are
+  computed concurrently by prefetch_lazy_initializers, which the TestRunner
+  calls before running tests. Prefetchable functions may therefore be called
+  from other threads, and at the same time as one another.
+
   Bindings are typically collected and assembled by a
   ConfigurationBindingsBuilder.
+
+  The values within the ConfigParser sections are merged into a single
+  dictionary when the bindings are constructed so that lookups do not need
+  to search the sections. Changes to the ConfigParser made afterwards are
+  not seen.
   """
 
   @property
@@ -112,7 +127,8 @@ class ConfigurationBindings(object):
     return self.__overrides
 
   def __init__(self, config_parser, overrides,
-               lazy_initializers=None, defaults=None, section=None):
+               lazy_initializers=None, defaults=None, section=None,
+               prefetch_keys=None):
     """Construct a bindings instance.
 
     Args:
@@ -121,12 +137,45 @@ class ConfigurationBindings(object):
       lazy_initializers: [dict] Values that are initialized on demand.
       defaults[dict]: Default values if not otherwise determined.
       section: [string] Section to constrain ConfigParser to.
+      prefetch_keys: [set] The keys of the lazy_initializers that can be
+          computed by prefetch_lazy_initializers.
     """
     self.__config_parser = config_parser
     self.__overrides = overrides or {}
     self.__lazy_initializers = lazy_initializers or {}
+    self.__prefetch_keys = prefetch_keys if prefetch_keys is not None else set()
     self.__defaults = defaults or {}
     self.__section = section
+    self.__config_values = self.__merge_config_sections()
+
+  def __merge_config_sections(self):
+    """Returns the ConfigParser values visible to these bindings.
+
+    Each key has the value from the first section it is found in, or the
+    specific section this instance was configured for.
+    """
+    parser = self.__config_parser
+    all_sections = ([self.__section]
+                    if self.__section
+                    else parser.sections())
+    if not all_sections:
+      all_sections = [ConfigParser.DEFAULTSECT]
+
+    result = {}
+    for section in all_sections:
+      if section == ConfigParser.DEFAULTSECT:
+        values = parser.defaults()
+        keys = values.keys()
+      elif parser.has_section(section):
+        keys = parser.options(section)
+        values = None
+      else:
+        continue
+      for key in keys:
+        if key not in result:
+          result[key] = (values[key] if values is not None
+                         else parser.get(section, key))
+    return result
 
   def __str__(self):
     return self.__to_string(False)
@@ -152,12 +201,13 @@ class ConfigurationBindings(object):
         'defaults={!r}'.format(self.__defaults)]
     return ' '.join(parts)
 
-  def add_lazy_initializer(self, key, initializer):
+  def add_lazy_initializer(self, key, initializer, prefetch=False):
     """Add to the existing lazy initializers.
 
     Args:
       key: [string] The key to add (or replace)
       initializer: [callable] The initializer.
+      prefetch: [bool] Whether prefetch_lazy_initializers should compute it.
     """
     normalized_key = _normalize_key(key)
     if (self.__overrides.get(normalized_key) is None
@@ -165,6 +215,52 @@ class ConfigurationBindings(object):
       del(self.__overrides[normalized_key])
 
     self.__lazy_initializers[normalized_key] = initializer
+    if prefetch:
+      self.__prefetch_keys.add(normalized_key)
+    else:
+      self.__prefetch_keys.discard(normalized_key)
+
+  def prefetch_lazy_initializers(self, max_threads=None):
+    """Concurrently computes the prefetchable lazy initializers.
+
+    The values are added to the overrides as if they had been accessed.
+    Initializers whose value is already determined are not called. Those
+    that fail are left to be retried if their value is accessed.
+
+    Args:
+      max_threads: [int] The most initializers to run at a time, or None
+          to run them all at once.
+
+    Returns:
+      The list of keys whose values were prefetched.
+    """
+    keys = [key for key in sorted(self.__prefetch_keys)
+            if key not in self.__overrides
+            and key not in self.__config_values
+            and key in self.__lazy_initializers]
+    if not keys:
+      return []
+
+    def prefetch(key):
+      """Computes the value for the given key, returning whether it did."""
+      try:
+        value = self.__lazy_initializers[key](self, key)
+      except Exception as ex:
+        logging.getLogger(__name__).warning(
+            'Failed to prefetch binding %s: %s', key, ex)
+        return False
+      if value is None:
+        return False
+      self.__overrides.setdefault(key, value)
+      return True
+
+    pool = ThreadPool(processes=min(len(keys), max_threads or len(keys)))
+    try:
+      fetched = pool.map(prefetch, keys)
+    finally:
+      pool.close()
+      pool.join()
+    return [key for key, ok in zip(keys, fetched) if ok]
 
   def get_section_bindings(self, section):
     """Returns a new instance restrained to a particular section.
@@ -174,7 +270,8 @@ class ConfigurationBindings(object):
     """
     return ConfigurationBindings(
         self.__config_parser, overrides=self.__overrides,
-        lazy_initializers=self.__lazy_initializers, section=section)
+        lazy_initializers=self.__lazy_initializers, section=section,
+        prefetch_keys=self.__prefetch_keys)
 
   def __setitem__(self, name, value):
     """Override a binding values."""
@@ -184,22 +281,11 @@ class ConfigurationBindings(object):
     """Determine if a binding name is defined."""
 
     key = _normalize_key(name)
-    if (key in self.__overrides
-        or key in self.__lazy_initializers
-        or key in self.__defaults
-        or key in self.__config_parser.defaults()):
-      return True
-
-    all_sections = ([self.__section]
-                    if self.__section
-                    else self.__config_parser.sections())
-    if not all_sections:
-      all_sections = [ConfigParser.DEFAULTSECT]
-
-    for section in all_sections:
-      if self.__config_parser.has_option(section, key):
-        return True
-    return False
+    return (key in self.__overrides
+            or key in self.__config_values
+            or key in self.__lazy_initializers
+            or key in self.__defaults
+            or key in self.__config_parser.defaults())
 
   def __getitem__(self, name):
     """Retrieve a binding value."""
@@ -228,16 +314,8 @@ class ConfigurationBindings(object):
     if key in self.__overrides:
       return _normalize_value(self.__overrides[key])
 
-    all_sections = ([self.__section]
-                    if self.__section
-                    else self.__config_parser.sections())
-    if not all_sections:
-      all_sections = [ConfigParser.DEFAULTSECT]
-
-    for section in all_sections:
-      if self.__config_parser.has_option(section, key):
-        return _normalize_value(self.__config_parser.get(section, key)
-                                or default_value)
+    if key in self.__config_values:
+      return _normalize_value(self.__config_values[key] or default_value)
 
     lazy_init = self.__lazy_initializers.get(key)
     if lazy_init is not None:
@@ -292,6 +370,7 @@ class ConfigurationBindingsBuilder(object):
     self.__visited_for_config = set([])
     self.__arguments = []
     self.__lazy_initializers = {}
+    self.__prefetch_keys = set()
 
     # These dummies are used for validation purposes at the point of API calls.
     # The final build() will recreate the parsers from scratch so they run
@@ -345,7 +424,7 @@ class ConfigurationBindingsBuilder(object):
     """
     self.__overrides.update(_normalize_dict_keys(values))
 
-  def add_lazy_initializer(self, name, func):
+  def add_lazy_initializer(self, name, func, prefetch=False):
     """Adds a lazy initialization function for a bindings.
 
     The lazy function will only be called if the binding is requested
@@ -356,21 +435,34 @@ class ConfigurationBindingsBuilder(object):
     Args:
       name: [string] The key for the initializer.
       func: [value (bindings, key)] function.
+      prefetch: [bool] If True then the function may instead be called
+          concurrently with other prefetchable functions before the value
+          is requested. See ConfigurationBindings.prefetch_lazy_initializers.
     """
     normalized_key = _normalize_key(name)
     if (self.__overrides.get(normalized_key) is None
         and normalized_key in self.__overrides):
       del self.__overrides[normalized_key]
     self.__lazy_initializers[normalized_key] = func
+    if prefetch:
+      self.__prefetch_keys.add(normalized_key)
+    else:
+      self.__prefetch_keys.discard(normalized_key)
 
-  def update_lazy_initializers(self, values):
+  def update_lazy_initializers(self, values, prefetch=False):
     """Add a collection of lazy initializers.
 
     Args:
       values: [dict]  All the lazy initializers to add.
+      prefetch: [bool] Whether the initializers are prefetchable.
     """
-    self.__lazy_initializers.update({_normalize_key(name): value
-                                     for name, value in values.items()})
+    normalized = {_normalize_key(name): value
+                  for name, value in values.items()}
+    self.__lazy_initializers.update(normalized)
+    if prefetch:
+      self.__prefetch_keys.update(normalized.keys())
+    else:
+      self.__prefetch_keys.difference_update(normalized.keys())
 
   def add_config_file(self, path):
     """Explicitly add a configuration file to the bindings.
@@ -463,7 +555,8 @@ class ConfigurationBindingsBuilder(object):
         config_parser, overrides=flags,
         lazy_initializers=self.__lazy_initializers,
         defaults=self.__defaults,
-        section=section)
+        section=section,
+        prefetch_keys=set(self.__prefetch_keys))
     return bindings
 
   def _exists(self, path):
@@ -21,6 +21,7 @@ import stat
 import threading
 
 from . import Journal
+from .journal_index import index_path_for_journal
 
 # pylint: disable=invalid-name
 # pylint: disable=global-statement
@@ -46,6 +47,23 @@ def new_global_journal_with_path(path, **metadata):
 
   Args:
     path: [string] The path to the journal to open.
+    _async_queue_size: [int] If positive then write the journal from a
+        background thread with a queue of this size. See Journal.
+    _encoding: [string] The name of the encoding to write the journal with.
+        See Journal.
+    _blob_min_bytes: [int] If positive then write large repeated snapshot
+        data only once. See Journal.
+    _buffer_per_thread: [bool] If True then buffer entries per thread rather
+        than contending on the journal lock. See Journal.
+    _payload_budget: [SnapshotPayloadBudget] If provided then limit the
+        size of the data stored in snapshots. See Journal.
+    _share_entities: [bool] If True then write immutable objects such as
+        predicates only once. See Journal.
+    _index: [bool] If True then also write a sidecar index. See JournalIndex.
+    _segment_bytes: [int] If positive then split the journal into segments
+        of about this size. See Journal.open_with_path.
+    _segment_entries: [int] If positive then split the journal into
+        segments of this many entries. See Journal.open_with_path.
     metadata: [kwargs] The journal metadata to write into the journal.
   """
   global _global_journal
@@ -59,12 +77,24 @@ def new_global_journal_with_path(path, **metadata):
       atexit.register(_atexit_handler)
       _added_atexit = True
 
-    journal_file = open(path, 'wb')
-    # Protect sensitive data.
-    if hasattr(os, "fchmod"):
-      os.fchmod(journal_file.fileno(), stat.S_IRUSR | stat.S_IWUSR)
-    journal = Journal()
-    journal.open_with_file(journal_file, **metadata)
+    journal = Journal(
+        async_queue_size=metadata.pop('_async_queue_size', 0),
+        encoding=metadata.pop('_encoding', 'pretty'),
+        blob_min_bytes=metadata.pop('_blob_min_bytes', 0),
+        buffer_per_thread=metadata.pop('_buffer_per_thread', False),
+        payload_budget=metadata.pop('_payload_budget', None),
+        share_entities=metadata.pop('_share_entities', False))
+    if metadata.get('_segment_bytes') or metadata.get('_segment_entries'):
+      # The journal protects the segment files itself.
+      journal.open_with_path(path, **metadata)
+    else:
+      journal_file = open(path, 'wb')
+      # Protect sensitive data.
+      if hasattr(os, "fchmod"):
+        os.fchmod(journal_file.fileno(), stat.S_IRUSR | stat.S_IWUSR)
+      if metadata.pop('_index', False):
+        metadata['_index_output'] = open(index_path_for_journal(path), 'w')
+      journal.open_with_file(journal_file, **metadata)
 
     _global_journal = journal
   finally:
@@ -19,18 +19,110 @@ The JSON snspahosts in a journal are JsonSnashot. A journal is a collection
 of snapshots and, in future, other events.
 """
 
+import collections
+import heapq
 import json
+import os
+import stat
 import threading
 import sys
 import time
 
-from .record_stream import RecordOutputStream
+try:
+  import Queue as queue
+except ImportError:
+  import queue
+
+from .journal_blobs import (
+    BLOB_REFERENCE_KEY,
+    BLOB_RELATIONS,
+    JOURNAL_BLOB_TYPE,
+    SharedEntityCache,
+    blob_digest)
+from .journal_index import (
+    JournalIndex,
+    JournalIndexWriter,
+    index_path_for_journal)
+from .journal_manifest import (
+    SEGMENT_CONTINUATION_KEY,
+    segment_path_for_journal,
+    write_journal_manifest)
+from .record_stream import (
+    RecordOutputStream,
+    RAW_FRAMES,
+    ZLIB_BLOCKS,
+    ZLIB_FRAMES)
 from .snapshot import JsonSnapshot
 
 if sys.version_info[0] > 2:
   basestring = str
 
 
+class _ThreadBuffer(object):
+  """The entries that a thread buffered for a journal with buffer_per_thread.
+
+  Only the owning thread appends entries and only the merger removes them.
+  While the thread is adding an entry, pending is the earliest timestamp
+  that the entry can have, otherwise it is None.
+  """
+
+  # The pending timestamp while the thread is still reading the clock.
+  UNKNOWN_TIMESTAMP = float('-inf')
+
+  def __init__(self, thread):
+    self.thread = thread
+    self.entries = collections.deque()
+    self.pending = None
+
+
+class _StreamedSnapshotEntry(dict):
+  """A JsonSnapshot entry whose entities were already encoded.
+
+  The '_entities' value is a placeholder that is replaced by the encoded
+  entities once the rest of the entry is encoded.
+  """
+
+  PLACEHOLDER = '\x00citest-streamed-entities\x00'
+  ENCODED_PLACEHOLDER = json.dumps(PLACEHOLDER)
+
+  @property
+  def blobs(self):
+    """The (digest, value) of the blobs that the entry references."""
+    return self.__blobs
+
+  def __init__(self, json_object, fragments, blobs=None):
+    """Constructor.
+
+    Args:
+      json_object: [dict] The JsonSnapshot entry without its entities.
+      fragments: [list of string] The encoded "<id>": <entity> members.
+      blobs: [list of (digest, value)] The blobs that the entry references,
+          each preceding any blobs that reference it.
+    """
+    super(_StreamedSnapshotEntry, self).__init__()
+    self.__fragments = fragments
+    self.__blobs = blobs or []
+    for key, value in json_object.items():
+      self[key] = value
+      if key == '_subject_id':
+        self['_entities'] = self.PLACEHOLDER
+
+  def encode(self, encoder, pretty):
+    """Returns the encoded entry.
+
+    Args:
+      encoder: [JSONEncoder] The encoder for the entry.
+      pretty: [bool] Whether the encoder is indenting.
+    """
+    prefix, suffix = encoder.encode(self).split(self.ENCODED_PLACEHOLDER, 1)
+    if pretty:
+      begin, separator, end = '{\n    ', ',\n    ', '\n  }'
+    else:
+      begin, separator, end = '{', ',', '}'
+    return ''.join([prefix, begin, separator.join(self.__fragments), end,
+                    suffix])
+
+
 class Journal(object):
   """Stores object snapshots into an output file.
 
@@ -41,21 +133,161 @@ class Journal(object):
   resiliency to premature crashes and invalid json encodings of individual
   entries.
 
+  The encoding determines how the entries are written:
+     'pretty': Indented JSON in plain frames. This is the original format.
+     'compact': JSON without whitespace in plain frames.
+     'zlib': Compact JSON with each frame individually compressed.
+     'zlib-block': Compact JSON compressed in blocks of many frames.
+        This is the smallest, but entries still in the current block are
+        not written until the journal is flushed or terminated.
+  All but 'pretty' begin with a header declaring the encoding so that
+  RecordInputStream can decode them transparently.
+
+  Entries may be buffered in memory until the journal is flushed, so
+  processes following the journal as it is written (see
+  FollowJournalNavigator) see them only after flush() is called.
+
   The journal is thread-safe so multiple threads can write into it
   concurrently.
+
+  By default entries are encoded and written by the calling thread while
+  holding the journal lock. If an async_queue_size is given then the journal
+  instead hands entries off to a bounded queue that is drained by a dedicated
+  writer thread. Entries are still written in the order they were queued.
+  Callers block when the queue is full so that a slow disk pushes back on
+  the writers rather than growing memory without bound. Since the entries
+  are encoded later, callers should not mutate values they pass into the
+  journal after the call returns.
+
+  If buffer_per_thread is set then each thread instead appends its entries
+  to its own buffer without taking the journal lock. A merger thread
+  periodically writes the buffered entries from all the threads, ordered by
+  their '_timestamp'. Each thread's entries stay in the order it wrote them.
+  Entries stamped later than one that another thread is still adding are
+  held back until it is buffered so that they are not written out of
+  order. Entries are only visible in the file once merged, which happens
+  every _MERGE_INTERVAL seconds, and when the journal is flushed or
+  terminated.
+
+  If a blob_min_bytes is given then DATA and OUTPUT snapshot edge values
+  whose encoding is at least that large are written once as JournalBlob
+  entries and referenced by digest thereafter. See journal_blobs.
+
+  If share_entities then the entities exported for objects whose snapshot
+  is immutable, such as predicates, are written once as JournalBlob entries
+  that the snapshots referencing the objects share. See journal_blobs.
+
+  If a payload_budget is given then the DATA and OUTPUT values within each
+  stored snapshot are limited to it, truncating or spilling the oversized
+  ones. See snapshot_budget.
+
+  Journals opened with a path can be split into segment files that roll
+  over after a number of bytes or entries. The path then holds a manifest
+  of the segments. See journal_manifest.
   """
 
-  def __init__(self, now_function=time.time):
+  # Queued in place of an entry to tell the writer thread to stop.
+  __STOP_WRITER = object()
+
+  # Queued in place of an entry to tell the writer thread to flush.
+  __FLUSH_WRITER = object()
+
+  # Seconds between merges of the per-thread buffers.
+  _MERGE_INTERVAL = 0.1
+
+  # The frame encoding to use for each of the supported journal encodings.
+  _FRAME_ENCODINGS = {
+      'pretty': None,
+      'compact': RAW_FRAMES,
+      'zlib': ZLIB_FRAMES,
+      'zlib-block': ZLIB_BLOCKS
+  }
+
+  @property
+  def is_async(self):
+    """Returns whether entries are written by a background writer thread."""
+    return self.__async_queue_size > 0
+
+  @property
+  def encoding(self):
+    """Returns the name of the encoding used to write entries."""
+    return self.__encoding
+
+  def __init__(self, now_function=time.time, async_queue_size=0,
+               encoding='pretty', blob_min_bytes=0, buffer_per_thread=False,
+               payload_budget=None, share_entities=False):
     """Constructs new journal.
 
     Args:
       now_function: [time] Optional override for timestamping function.
           Returns a real value indicating the current time.
+      async_queue_size: [int] If positive then write entries from a background
+          thread, queuing at most this many pending entries.
+      encoding: [string] The name of the encoding to write entries with.
+          See the class description.
+      blob_min_bytes: [int] If positive then the smallest snapshot data
+          value to write as a shared blob. See the class description.
+      buffer_per_thread: [bool] If True then buffer entries per thread and
+          merge them in timestamp order. See the class description.
+      payload_budget: [SnapshotPayloadBudget] If provided then limits the
+          size of snapshot data values. See the class description.
+      share_entities: [bool] If True then export immutable objects once and
+          share them among snapshots. See the class description.
     """
-    self.__encoder = json.JSONEncoder(indent=2, separators=(',', ': '))
+    if encoding not in self._FRAME_ENCODINGS:
+      raise ValueError('Unknown journal encoding {0!r}'.format(encoding))
+    if buffer_per_thread and async_queue_size:
+      raise ValueError(
+          'A journal cannot both be async and buffer_per_thread.')
+    self.__encoding = encoding
+    if encoding == 'pretty':
+      self.__encoder = json.JSONEncoder(indent=2, separators=(',', ': '))
+    else:
+      self.__encoder = json.JSONEncoder(separators=(',', ':'))
     self.__lock = threading.Lock()
     self.__now_function = now_function
     self.__output = None
+    self.__index = None
+    self.__async_queue_size = async_queue_size or 0
+    self.__queue = None
+    self.__writer_thread = None
+    self.__writer_error = None
+
+    # Set while terminating to refuse new entries, whether for the writer
+    # queue or the per-thread buffers. Writers count their pending puts, and
+    # mark their buffer pending, so terminate can wait for them.
+    self.__closing = False
+    self.__queue_puts = 0
+    self.__queue_puts_done = threading.Condition(self.__lock)
+
+    # The _ThreadBuffer for each thread when buffer_per_thread.
+    # Each deque is only appended to by its thread and popped by the merger.
+    self.__buffer_per_thread = buffer_per_thread
+    self.__thread_local = threading.local()
+    self.__thread_buffers = []
+    self.__merger_thread = None
+    self.__merger_stop = threading.Event()
+
+    self.__payload_budget = payload_budget
+
+    # The digests of the blobs already written into the current segment.
+    # Entries carry the blobs they reference, which are written before
+    # them unless already in the segment.
+    self.__blob_min_bytes = blob_min_bytes or 0
+    self.__blob_digests = set()
+    self.__shared_entities = (SharedEntityCache(self.__use_blob)
+                              if share_entities else None)
+
+    # The BEGIN entries for the currently open contexts, keyed by '_thread'
+    # since each thread nests its contexts independently.
+    self.__context_stacks = {}
+
+    # Segmenting state, only used when opened with segment limits.
+    self.__manifest_path = None
+    self.__segment_bytes = 0
+    self.__segment_entries = 0
+    self.__segments = []
+    self.__index_segments = False
 
   def now(self):
     """Returns current timestamp for marking journal entries."""
@@ -67,9 +299,34 @@ class Journal(object):
     Args:
       _path: [string] Path to file to write into.
       _append: [bool] True if append, else write new.
+      _index: [bool] True to also write a sidecar index. See JournalIndex.
+      _segment_bytes: [int] If positive then write the journal as segments,
+          starting a new segment once a segment reaches this many bytes.
+      _segment_entries: [int] If positive then write the journal as
+          segments, starting a new segment after this many entries.
       metadata: [kwargs] Metadata for initial entry.
     """
     append = metadata.pop('_append', False)
+    segment_bytes = metadata.pop('_segment_bytes', 0) or 0
+    segment_entries = metadata.pop('_segment_entries', 0) or 0
+    if segment_bytes > 0 or segment_entries > 0:
+      if append:
+        raise ValueError('Cannot append to a segmented journal.')
+      self.__manifest_path = _path
+      self.__segment_bytes = segment_bytes
+      self.__segment_entries = segment_entries
+      self.__index_segments = metadata.pop('_index', False)
+      output, metadata['_index_output'] = self.__open_segment_files()
+      self.open_with_file(output, **metadata)
+      return
+
+    if metadata.pop('_index', False):
+      index_path = index_path_for_journal(_path)
+      open_contexts = None
+      if append and os.path.exists(index_path):
+        open_contexts = JournalIndex.new_from_path(index_path).open_contexts
+      metadata['_index_output'] = open(index_path, 'a' if append else 'w')
+      metadata['_index_open_contexts'] = open_contexts
     mode = 'ab' if append else 'wb'
     self.open_with_file(open(_path, mode), **metadata)
 
@@ -77,15 +334,31 @@ class Journal(object):
     """
     Args:
       output: [FileObject] Takes ownership of the file to store snapshots into.
+      _index_output: [FileObject] Takes ownership of a text file to write
+          a JournalIndex into, if any.
+      _index_open_contexts: [dict] The positions of context BEGIN entries
+          still open when appending to an existing indexed journal, keyed
+          by thread.
       metadata: [kwargs] Metadata for initial message.
     """
     message = metadata.pop('_message', 'Starting journal.')
+    index_output = metadata.pop('_index_output', None)
+    index_open_contexts = metadata.pop('_index_open_contexts', None)
     self.__lock.acquire(True)
     try:
       if self.__output is not None:
         raise ValueError('Journal is already open.')
 
-      self.__output = RecordOutputStream(_output)
+      frame_encoding = self._FRAME_ENCODINGS[self.__encoding]
+      self.__output = RecordOutputStream(_output, frame_encoding=frame_encoding)
+      if index_output is not None:
+        self.__index = JournalIndexWriter(
+            index_output, frame_encoding=frame_encoding or RAW_FRAMES,
+            open_contexts=index_open_contexts)
+      if self.is_async:
+        self.__start_writer_thread()
+      if self.__buffer_per_thread:
+        self.__start_merger_thread()
     finally:
       self.__lock.release()
 
@@ -101,15 +374,37 @@ class Journal(object):
     message = metadata.pop('_message', 'Finished journal.')
     if message:
       self.write_message(message, **metadata)
+
+    self.__lock.acquire(True)
+    try:
+      self.__closing = True
+    finally:
+      self.__lock.release()
+
+    self.__stop_merger_thread()
     self.__lock.acquire(True)
     try:
       if self.__output is None:
         raise ValueError('Journal is already terminated.')
+      self.__stop_writer_thread()
+      self.__wait_for_buffering_threads()
+      self.__merge_thread_buffers(True)
       self._do_close()
       self.__output = None
+      if self.__index is not None:
+        self.__index.close()
+        self.__index = None
+      if self.__manifest_path is not None:
+        write_journal_manifest(self.__manifest_path, self.__segments)
     finally:
+      self.__closing = False
       self.__lock.release()
 
+    if self.__writer_error is not None:
+      error = self.__writer_error
+      self.__writer_error = None
+      raise error
+
   def begin_context(self, _title, **metadata):
     """Write a begin context marker into the journal.
 
@@ -162,9 +457,10 @@ class Journal(object):
       obj: [JsonSnapshotable] The object to store into the journal.
       metadata: [kwargs] Additional metadata for the entry.
     """
-    snapshot = JsonSnapshot(**metadata)
-    snapshot.add_object(obj)
-    self.__write_json_object(snapshot.to_json_object())
+    snapshot = JsonSnapshot(_payload_budget=self.__payload_budget,
+                            _shared_entities=self.__shared_entities,
+                            **metadata)
+    self.__store_snapshot(snapshot, snapshot.add_object, obj)
 
   def store_summary(self, obj, **metadata):
     """Stores an object summary as a graph within the journal.
@@ -173,9 +469,29 @@ class Journal(object):
       obj: [JsonSnapshotable] The object to store into the journal.
       metadata: [kwargs] Additional metadata for the entry.
     """
-    snapshot = JsonSnapshot(**metadata)
-    snapshot.add_object_summary(obj)
-    self.__write_json_object(snapshot.to_json_object())
+    snapshot = JsonSnapshot(_payload_budget=self.__payload_budget,
+                            _shared_entities=self.__shared_entities,
+                            **metadata)
+    self.__store_snapshot(snapshot, snapshot.add_object_summary, obj)
+
+  def flush(self):
+    """Writes out any entries buffered within the journal.
+
+    In async mode this happens once the writer thread gets to the entries
+    that were already queued. With buffer_per_thread, all the buffered
+    entries are merged without holding any back.
+    """
+    if self.__queue is not None and self.__put_queued(self.__FLUSH_WRITER):
+      return
+
+    self.__lock.acquire(True)
+    try:
+      if self.__output is None:
+        raise ValueError('Journal is not open')
+      self.__merge_thread_buffers(True)
+      self.__flush_output()
+    finally:
+      self.__lock.release()
 
   def _do_close(self):
     """Actually closes the journal output file.
@@ -184,16 +500,85 @@ class Journal(object):
     """
     self.__output.close()
 
-  def __write_json_object(self, json_object):
+  def __store_snapshot(self, snapshot, add_function, obj):
+    """Writes a snapshot of obj into the journal.
+
+    The snapshot entities are encoded as each is completed and released
+    rather than building the whole snapshot and its JSON object in memory.
+
+    Args:
+      snapshot: [JsonSnapshot] The snapshot to add obj to.
+      add_function: [callable] The snapshot method to add obj with.
+      obj: [JsonSnapshotable] The object to store.
+    """
+    pretty = self.__encoding == 'pretty'
+    def encode_entity(entity):
+      """Returns the encoded '"<id>": <entity>' member of the entities."""
+      json_object = entity.to_json_object()
+      if self.__blob_min_bytes > 0:
+        self.__replace_values_with_blobs(json_object)
+      encoded = self.__encoder.encode(json_object)
+      if pretty:
+        # Indent the entity as if it were nested within the snapshot.
+        return '"{0}": {1}'.format(entity.id, encoded.replace('\n', '\n    '))
+      return '"{0}":{1}'.format(entity.id, encoded)
+
+    fragments = []
+    blobs = []
+    outer_blobs = getattr(self.__thread_local, 'blobs', None)
+    self.__thread_local.blobs = blobs
+    try:
+      snapshot.stream_entities(
+          lambda entity: fragments.append(encode_entity(entity)))
+      add_function(obj)
+      snapshot.flush_entities()
+    finally:
+      self.__thread_local.blobs = outer_blobs
+    self.__write_json_object(snapshot.to_json_object(),
+                             entity_fragments=fragments, blobs=blobs)
+
+  def __replace_values_with_blobs(self, entity_json):
+    """Replaces large data values on an entity's edges with blob references.
+
+    The blobs are written along with the snapshot referencing them.
+
+    Args:
+      entity_json: [dict] The JSON object for a snapshot entity.
+    """
+    for edge in entity_json.get('_edges', ()):
+      if '_value' not in edge or edge.get('relation') not in BLOB_RELATIONS:
+        continue
+      digest = blob_digest(edge['_value'], self.__blob_min_bytes)
+      if digest is None:
+        continue
+      self.__use_blob(digest, edge['_value'])
+      del edge['_value']
+      edge[BLOB_REFERENCE_KEY] = digest
+
+  def __use_blob(self, digest, value):
+    """Adds a blob to those referenced by the snapshot being stored."""
+    self.__thread_local.blobs.append((digest, value))
+
+  def __write_json_object(self, json_object, entity_fragments=None,
+                          blobs=None):
     """Write JSON object into the journal file.
 
     Args:
       json_object: [any] Encodable object to store into the snapshot
+      entity_fragments: [list of string] For a JsonSnapshot whose entities
+          were streamed, the encoded entities.
+      blobs: [list of (digest, value)] For a JsonSnapshot whose entities
+          were streamed, the blobs that they reference.
     """
 
-    json_copy = dict(json_object)
-    json_copy.setdefault('_timestamp', self.now())
-    json_copy.setdefault('_thread', threading.current_thread().ident)
+    if (self.__merger_thread is not None
+        and self.__buffer_entry(json_object, entity_fragments, blobs)):
+      return
+
+    json_copy = self.__stamp_entry(json_object, entity_fragments, blobs)
+
+    if self.__queue is not None and self.__put_queued(json_copy):
+      return
 
     # protect both the encoder and the output stream.
     self.__lock.acquire(True)
@@ -201,7 +586,365 @@ class Journal(object):
       if self.__output is None:
         raise ValueError('Journal is not open')
 
-      text = self.__encoder.encode(json_copy)
-      self.__output.append(text)
+      self.__append_entry(json_copy)
+    finally:
+      self.__lock.release()
+
+  def __buffer_entry(self, json_object, entity_fragments, blobs):
+    """Appends an entry to the calling thread's buffer for the merger thread.
+
+    The merger thread writes the entry later so we do not need the lock.
+    While the entry is being added, the thread's pending timestamp tells
+    the merger and terminate to wait for it.
+
+    Raises:
+      ValueError if the journal is being terminated.
+
+    Returns:
+      False if the merger thread has since stopped, so the entry was not
+      buffered.
+    """
+    thread_buffer = self.__get_thread_buffer()
+    thread_buffer.pending = _ThreadBuffer.UNKNOWN_TIMESTAMP
+    try:
+      # Terminate sets __closing before looking for pending entries, and we
+      # mark the entry pending before looking at __closing, so either we
+      # refuse the entry or terminate waits for it.
+      if self.__closing:
+        raise ValueError('Journal is not open')
+      if self.__merger_thread is None:
+        return False
+      json_copy = self.__stamp_entry(json_object, entity_fragments, blobs)
+      thread_buffer.pending = json_copy['_timestamp']
+      thread_buffer.entries.append(json_copy)
+      return True
+    finally:
+      thread_buffer.pending = None
+
+  def __put_queued(self, json_object):
+    """Puts an entry onto the writer thread's queue.
+
+    The queue is only set while the output is open, and the writer thread
+    owns both the encoder and output stream so we only need the lock to
+    check that the journal is not being terminated. This will block when
+    the queue is full.
+
+    Raises:
+      ValueError if the journal is being terminated.
+
+    Returns:
+      False if there is no longer a queue, so the entry was not put.
+    """
+    self.__lock.acquire(True)
+    try:
+      if self.__queue is None:
+        return False
+      if self.__closing:
+        raise ValueError('Journal is not open')
+      entry_queue = self.__queue
+      self.__queue_puts += 1
     finally:
       self.__lock.release()
+
+    try:
+      entry_queue.put(json_object)
+    finally:
+      self.__lock.acquire(True)
+      try:
+        self.__queue_puts -= 1
+        if not self.__queue_puts:
+          self.__queue_puts_done.notify_all()
+      finally:
+        self.__lock.release()
+    return True
+
+  def __append_entry(self, json_object):
+    """Encodes and writes the entry into the output and index.
+
+    The blobs that the entry references are written first, unless already
+    in the segment, so that each segment can be read on its own. The segment
+    does not roll between the blobs and the entry.
+    The caller should either be holding the lock or be the writer thread.
+    """
+    if isinstance(json_object, _StreamedSnapshotEntry):
+      for digest, value in json_object.blobs:
+        if digest not in self.__blob_digests:
+          self.__blob_digests.add(digest)
+          self.__write_entry({
+              '_type': JOURNAL_BLOB_TYPE,
+              '_digest': digest,
+              '_value': value,
+              '_timestamp': json_object['_timestamp'],
+              '_thread': json_object['_thread']
+          })
+    if self.__write_entry(json_object):
+      self.__roll_segment()
+
+  def __write_entry(self, json_object):
+    """Helper function writing a single entry for __append_entry.
+
+    Returns:
+      True if the segment is full so should be rolled.
+    """
+    if isinstance(json_object, _StreamedSnapshotEntry):
+      encoded = json_object.encode(self.__encoder,
+                                   self.__encoding == 'pretty')
+    else:
+      encoded = self.__encoder.encode(json_object)
+    position = self.__output.append(encoded)
+    if self.__index is not None:
+      self.__index.add(position, json_object)
+
+    if json_object.get(SEGMENT_CONTINUATION_KEY):
+      return False
+    if json_object.get('_type') == 'JournalContextControl':
+      context_stack = self.__context_stacks.setdefault(
+          json_object.get('_thread'), [])
+      if json_object.get('control') == 'BEGIN':
+        context_stack.append(json_object)
+      elif json_object.get('control') == 'END' and context_stack:
+        context_stack.pop()
+
+    if self.__manifest_path is None:
+      return False
+    segment = self.__segments[-1]
+    segment['entries'] += 1
+    return ((self.__segment_entries > 0
+             and segment['entries'] >= self.__segment_entries)
+            or (self.__segment_bytes > 0
+                and self.__output.offset >= self.__segment_bytes))
+
+  def __flush_output(self):
+    """Flushes the output stream.
+
+    The caller should either be holding the lock or be the writer thread.
+    """
+    self.__output.flush()
+    self.__output.stream.flush()
+
+  def __open_segment_files(self):
+    """Opens the files for the next segment and updates the manifest.
+
+    Returns:
+      The segment's output file and index file (or None).
+    """
+    path = segment_path_for_journal(self.__manifest_path,
+                                    len(self.__segments) + 1)
+    output = open(path, 'wb')
+    # Protect sensitive data.
+    if hasattr(os, 'fchmod'):
+      os.fchmod(output.fileno(), stat.S_IRUSR | stat.S_IWUSR)
+    index_output = (open(index_path_for_journal(path), 'w')
+                    if self.__index_segments else None)
+    self.__segments.append({'path': path, 'entries': 0})
+    write_journal_manifest(self.__manifest_path, self.__segments)
+    return output, index_output
+
+  def __roll_segment(self):
+    """Closes the current segment and continues into a new one.
+
+    The open contexts are ended in the old segment and begun again in the
+    new segment, each within its own thread, so that each segment is well
+    formed on its own. Blobs are
+    written again into the new segment when referenced there.
+    The caller should either be holding the lock or be the writer thread.
+    """
+    self.__blob_digests = set()
+    open_contexts = [begin
+                     for context_stack in self.__context_stacks.values()
+                     for begin in context_stack]
+    timestamp = self.now()
+    for begin in reversed(open_contexts):
+      self.__append_entry({
+          '_type': 'JournalContextControl',
+          'control': 'END',
+          '_timestamp': timestamp,
+          '_thread': begin['_thread'],
+          SEGMENT_CONTINUATION_KEY: True
+      })
+    self.__output.close()
+    if self.__index is not None:
+      self.__index.close()
+
+    output, index_output = self.__open_segment_files()
+    frame_encoding = self._FRAME_ENCODINGS[self.__encoding]
+    self.__output = RecordOutputStream(output, frame_encoding=frame_encoding)
+    if index_output is not None:
+      self.__index = JournalIndexWriter(
+          index_output, frame_encoding=frame_encoding or RAW_FRAMES)
+    for begin in open_contexts:
+      continuation = dict(begin)
+      continuation[SEGMENT_CONTINUATION_KEY] = True
+      self.__append_entry(continuation)
+
+  def __stamp_entry(self, json_object, entity_fragments, blobs):
+    """Returns a copy of an entry with its '_timestamp' and '_thread' set.
+
+    Args:
+      json_object: [dict] The entry to copy.
+      entity_fragments: [list of string] See __write_json_object.
+      blobs: [list of (digest, value)] See __write_json_object.
+    """
+    json_copy = dict(json_object)
+    json_copy.setdefault('_timestamp', self.now())
+    json_copy.setdefault('_thread', threading.current_thread().ident)
+    if entity_fragments:
+      json_copy = _StreamedSnapshotEntry(json_copy, entity_fragments, blobs)
+    return json_copy
+
+  def __get_thread_buffer(self):
+    """Returns the calling thread's _ThreadBuffer, creating it if needed."""
+    thread_buffer = getattr(self.__thread_local, 'buffer', None)
+    if thread_buffer is None:
+      thread_buffer = _ThreadBuffer(threading.current_thread())
+      self.__thread_local.buffer = thread_buffer
+      self.__lock.acquire(True)
+      try:
+        self.__thread_buffers.append(thread_buffer)
+      finally:
+        self.__lock.release()
+    return thread_buffer
+
+  def __merge_thread_buffers(self, final):
+    """Writes the buffered entries from all the threads in timestamp order.
+
+    The caller should be holding the lock.
+
+    Args:
+      final: [bool] If True then write all the buffered entries. Otherwise
+          only write the entries that no entry still being added by a live
+          thread can precede.
+    """
+    # Count the entries before looking at the pending timestamps. Any entry
+    # buffered after its pending timestamp was seen is then left for later.
+    counts = [len(thread_buffer.entries)
+              for thread_buffer in self.__thread_buffers]
+    cutoff = None
+    if not final:
+      pending = [thread_buffer.pending
+                 for thread_buffer in self.__thread_buffers
+                 if thread_buffer.pending is not None
+                 and thread_buffer.thread.is_alive()]
+      cutoff = min(pending) if pending else None
+
+    batches = []
+    for rank, thread_buffer in enumerate(self.__thread_buffers):
+      buffer = thread_buffer.entries
+      batch = []
+      while (len(batch) < counts[rank]
+             and (cutoff is None or buffer[0]['_timestamp'] <= cutoff)):
+        # The rank and sequence keep entries with the same timestamp in a
+        # stable order and keep the entries themselves from being compared.
+        batch.append((buffer[0]['_timestamp'], rank, len(batch),
+                      buffer.popleft()))
+      if batch:
+        batches.append(batch)
+
+    # Forget buffers for threads that have finished.
+    self.__thread_buffers = [
+        thread_buffer for thread_buffer in self.__thread_buffers
+        if thread_buffer.entries or thread_buffer.thread.is_alive()]
+
+    for _, _, _, json_object in heapq.merge(*batches):
+      self.__append_entry(json_object)
+
+  def __start_merger_thread(self):
+    """Starts the background thread that merges the per-thread buffers.
+
+    The caller should be holding the lock.
+    """
+    self.__merger_stop.clear()
+    self.__merger_thread = threading.Thread(
+        target=self.__merger_loop, name='JournalMerger')
+    self.__merger_thread.daemon = True
+    self.__merger_thread.start()
+
+  def __stop_merger_thread(self):
+    """Stops the background merger thread, if any.
+
+    The caller should not be holding the lock. Entries still buffered are
+    left for the caller to merge.
+    """
+    thread = self.__merger_thread
+    if thread is None:
+      return
+    self.__merger_thread = None
+    self.__merger_stop.set()
+    thread.join()
+
+  def __merger_loop(self):
+    """Periodically merges the per-thread buffers until told to stop.
+
+    Errors are remembered and raised from terminate(). Entries continue to
+    be drained so that the buffers do not grow without bound.
+    """
+    while not self.__merger_stop.wait(self._MERGE_INTERVAL):
+      self.__lock.acquire(True)
+      try:
+        self.__merge_thread_buffers(False)
+      except Exception as ex:
+        if self.__writer_error is None:
+          self.__writer_error = ex
+      finally:
+        self.__lock.release()
+
+  def __start_writer_thread(self):
+    """Starts the background thread that writes queued entries.
+
+    The caller should be holding the lock.
+    """
+    self.__queue = queue.Queue(maxsize=self.__async_queue_size)
+    self.__writer_thread = threading.Thread(
+        target=self.__writer_loop, name='JournalWriter')
+    self.__writer_thread.daemon = True
+    self.__writer_thread.start()
+
+  def __stop_writer_thread(self):
+    """Drains the queue then stops the background writer thread, if any.
+
+    The caller should be holding the lock while terminating, so that new
+    entries are refused.
+    """
+    if self.__queue is None:
+      return
+
+    # Wait for the pending entries to be queued so that none are queued
+    # after the writer stops.
+    while self.__queue_puts:
+      self.__queue_puts_done.wait()
+    self.__queue.put(self.__STOP_WRITER)
+    self.__writer_thread.join()
+    self.__queue = None
+    self.__writer_thread = None
+
+  def __wait_for_buffering_threads(self):
+    """Waits for the threads still adding an entry to their buffer.
+
+    The caller should be holding the lock while terminating, so that new
+    entries are refused. Buffering does not take the lock, and only takes
+    a moment, so this polls rather than having every entry signal.
+    """
+    while any(thread_buffer.pending is not None
+              for thread_buffer in self.__thread_buffers):
+      time.sleep(0.001)
+
+  def __writer_loop(self):
+    """Writes entries from the queue until told to stop.
+
+    Once an error is encountered, subsequent entries are discarded so that
+    writers blocked on the queue can still make progress. The error is
+    raised from terminate().
+    """
+    while True:
+      json_object = self.__queue.get()
+      if json_object is self.__STOP_WRITER:
+        return
+      if self.__writer_error is not None:
+        continue
+      try:
+        if json_object is self.__FLUSH_WRITER:
+          self.__flush_output()
+        else:
+          self.__append_entry(json_object)
+      except Exception as ex:
+        self.__writer_error = ex
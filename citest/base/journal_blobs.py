@@ -0,0 +1,338 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Implements content-addressed storage of large payloads within journals.
+
+When a journal is written with a blob threshold, large values on DATA and
+OUTPUT snapshot edges are written once into a "JournalBlob" entry keyed by
+the SHA-256 digest of their canonical JSON encoding:
+   {"_type": "JournalBlob", "_digest": <hex digest>, "_value": <value>}
+
+Edges with such values then hold a "_blob" digest in place of their
+"_value". A blob entry is always written before the first entry that
+references it. The JournalNavigators resolve the references so that readers
+see the same entries as if the values had been written inline.
+
+Journals can also share the snapshot entities exported for immutable
+objects, such as predicate trees, among all the snapshots that reference
+them. The blob value is then the JsonSnapshot object holding just the
+object's entity graph, whose '_subject_id' is the object's entity. Snapshots
+reference the graph with a placeholder entity holding only an '_id' and a
+"_blob" digest. Readers see the placeholder replaced by the graph, whose
+entities are renumbered to fit within the referencing snapshot.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import weakref
+
+
+JOURNAL_BLOB_TYPE = 'JournalBlob'
+
+# Replaces '_value' within snapshot edges whose value was written as a blob.
+BLOB_REFERENCE_KEY = '_blob'
+
+# The edge relations whose values are considered for blobs.
+BLOB_RELATIONS = frozenset(['DATA', 'OUTPUT'])
+
+_CANONICAL_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+_ENTITY_REFERENCE = '"_type":"EntityReference"'
+
+
+def blob_digest(value, min_bytes):
+  """Returns the digest to store a JSON value as a blob under.
+
+  Values that embed EntityReferences are left inline because the referenced
+  entity ids are only meaningful within their own snapshot.
+
+  Args:
+    value: [any] A JSON encodable snapshot edge value.
+    min_bytes: [int] The smallest canonical encoding to store as a blob.
+
+  Returns:
+    The hex digest, or None if the value should be stored inline.
+  """
+  encoded = _CANONICAL_ENCODER.encode(value)
+  if len(encoded) < min_bytes or _ENTITY_REFERENCE in encoded:
+    return None
+  return hashlib.sha256(str.encode(encoded)).hexdigest()
+
+
+def entity_graph_digest(snapshot_json):
+  """Returns the digest to store a shared snapshot entity graph as a blob.
+
+  Args:
+    snapshot_json: [dict] The JSON object of the JsonSnapshot holding
+       just the entity graph.
+  """
+  encoded = _CANONICAL_ENCODER.encode(snapshot_json)
+  return hashlib.sha256(str.encode(encoded)).hexdigest()
+
+
+class SharedEntityCache(object):
+  """Remembers the blobs that objects were exported into for a journal.
+
+  This is used by JsonSnapshot to export immutable objects only once.
+  Objects are remembered for as long as they are alive.
+
+  Each time a graph is referenced, the blobs it needs are passed to the
+  journal, nested graphs first, so the journal can write them into each
+  segment that references them.
+  """
+
+  def __init__(self, use_blob):
+    """Constructor.
+
+    Args:
+      use_blob: [callable] Called with the digest and value of each entity
+         graph referenced by the snapshot being exported, to write the blob
+         into the journal unless already there.
+    """
+    self.__use_blob = use_blob
+    self.__digests = {}  # The (reference, blobs) keyed by id of the object.
+    self.__local = threading.local()
+
+  def get_digest(self, obj):
+    """Returns the blob digest that obj was exported into, or None.
+
+    If obj was exported then its blobs are used again.
+    """
+    found = self.__digests.get(id(obj))
+    if found is None:
+      return None
+    blobs = found[1]
+    for digest, value in blobs:
+      self.__use(digest, value)
+    return blobs[-1][0]
+
+  def begin_graph(self):
+    """Called before exporting the entity graph of an object to add.
+
+    Graphs referenced while exporting are remembered as dependencies of
+    the graph. Each call must be matched by a call to add or abort_graph.
+    """
+    self.__get_exporting().append([])
+
+  def abort_graph(self):
+    """Called instead of add if exporting the entity graph failed."""
+    self.__get_exporting().pop()
+
+  def add(self, obj, snapshot_json, reusable=True):
+    """Writes the entity graph exported for obj as a blob.
+
+    Args:
+      obj: [JsonSnapshotableEntity] The object that was exported.
+      snapshot_json: [dict] The JSON object of the JsonSnapshot holding
+         just the entity graph for obj.
+      reusable: [bool] Whether the graph can be reused for obj later.
+         This is False if the graph may change, so obj must be exported
+         again each time it is referenced.
+
+    Returns:
+      The digest of the blob.
+    """
+    dependencies = self.__get_exporting().pop()
+    digest = entity_graph_digest(snapshot_json)
+    self.__use(digest, snapshot_json)
+    if not reusable:
+      return digest
+
+    blobs = []
+    seen = set()
+    for blob in dependencies + [(digest, snapshot_json)]:
+      if blob[0] not in seen:
+        seen.add(blob[0])
+        blobs.append(blob)
+
+    key = id(obj)
+    try:
+      reference = weakref.ref(obj, lambda _: self.__digests.pop(key, None))
+    except TypeError:
+      reference = obj  # Not weakly referencable so keep it alive instead.
+    self.__digests[key] = (reference, blobs)
+    return digest
+
+  def __get_exporting(self):
+    """Returns this thread's stack of dependencies for graphs being exported."""
+    exporting = getattr(self.__local, 'exporting', None)
+    if exporting is None:
+      exporting = []
+      self.__local.exporting = exporting
+    return exporting
+
+  def __use(self, digest, value):
+    """Uses a blob in the snapshot and the graphs being exported."""
+    for dependencies in self.__get_exporting():
+      dependencies.append((digest, value))
+    self.__use_blob(digest, value)
+
+
+class JournalBlobTable(object):
+  """Resolves blob references in journal entries as they are read.
+
+  The table must see the entries in journal order so that it learns each
+  blob before the entries that reference it.
+  """
+
+  def __init__(self):
+    """Constructor."""
+    self.__values = {}
+
+  def add_blob_entry(self, entry):
+    """Remembers the payload within a JournalBlob entry."""
+    self.__values[entry['_digest']] = entry.get('_value')
+
+  def process(self, entry):
+    """Returns the entry as it should be presented to readers.
+
+    Args:
+      entry: [dict] The next entry read from the journal.
+
+    Returns:
+      None if the entry is a JournalBlob, which is only remembered.
+      Otherwise the entry with its blob references resolved.
+    """
+    if entry.get('_type') == JOURNAL_BLOB_TYPE:
+      self.add_blob_entry(entry)
+      return None
+    self.resolve(entry)
+    return entry
+
+  def resolve(self, entry):
+    """Replaces the blob references in a JsonSnapshot entry with values.
+
+    References to unknown blobs, such as those within a pruned segment,
+    are left in place.
+
+    Args:
+      entry: [dict] The journal entry to resolve in place.
+    """
+    self.__expand_shared_entities(entry)
+    for edge in _iter_blob_edges(entry):
+      digest = edge[BLOB_REFERENCE_KEY]
+      if digest not in self.__values:
+        logging.warning('Journal blob %s is missing.', digest)
+        continue
+      del edge[BLOB_REFERENCE_KEY]
+      edge['_value'] = self.__values[digest]
+
+
+  def __expand_shared_entities(self, entry):
+    """Replaces the shared entity placeholders in a JsonSnapshot entry.
+
+    The entities of each shared graph are given ids following the largest
+    id in the entry, except that the graph's subject takes the id of the
+    placeholder. Graphs can themselves contain placeholders. A graph is
+    only expanded once per entry; other placeholders for it are redirected
+    to its subject.
+    """
+    if entry.get('_type') != 'JsonSnapshot':
+      return
+    entities = entry.get('_entities') or {}
+    pending = [key for key, entity in entities.items()
+               if BLOB_REFERENCE_KEY in entity]
+    if not pending:
+      return
+
+    next_id = max(int(key) for key in entities) + 1
+    expanded = {}  # The subject id for each digest expanded.
+    aliases = {}   # The subject id replacing each redundant placeholder id.
+    while pending:
+      placeholder = entities[pending.pop()]
+      digest = placeholder[BLOB_REFERENCE_KEY]
+      if digest in expanded:
+        aliases[placeholder['_id']] = expanded[digest]
+        del entities[str(placeholder['_id'])]
+        continue
+      graph = self.__values.get(digest)
+      if graph is None:
+        logging.warning('Journal blob %s is missing.', digest)
+        continue
+      expanded[digest] = placeholder['_id']
+
+      subject_id = graph['_subject_id']
+      id_map = {}
+      for graph_key in graph['_entities']:
+        graph_id = int(graph_key)
+        if graph_id == subject_id:
+          id_map[graph_id] = placeholder['_id']
+        else:
+          id_map[graph_id] = next_id
+          next_id += 1
+
+      for graph_entity in graph['_entities'].values():
+        entity = _renumber_entity(graph_entity, id_map)
+        key = str(entity['_id'])
+        entities[key] = entity
+        if BLOB_REFERENCE_KEY in entity:
+          pending.append(key)
+
+    if aliases:
+      for key, entity in entities.items():
+        entities[key] = _renumber_entity(entity, aliases)
+
+
+def has_blob_references(entry):
+  """Determines whether a journal entry references any blobs."""
+  if entry.get('_type') != 'JsonSnapshot':
+    return False
+  return (any(BLOB_REFERENCE_KEY in entity
+              for entity in entry.get('_entities', {}).values())
+          or any(True for _ in _iter_blob_edges(entry)))
+
+
+def _renumber_entity(entity, id_map):
+  """Returns a copy of a shared graph entity with its ids renumbered.
+
+  Args:
+    entity: [dict] The JSON object of the entity within the shared graph.
+    id_map: [dict] The new id for each of the ids within the graph.
+  """
+  result = dict(entity)
+  result['_id'] = id_map.get(entity['_id'], entity['_id'])
+  if '_edges' in entity:
+    edges = []
+    for edge in entity['_edges']:
+      edge = dict(edge)
+      if '_to' in edge:
+        edge['_to'] = id_map.get(edge['_to'], edge['_to'])
+      if '_value' in edge:
+        edge['_value'] = _renumber_entity_references(edge['_value'], id_map)
+      edges.append(edge)
+    result['_edges'] = edges
+  return result
+
+
+def _renumber_entity_references(value, id_map):
+  """Returns a copy of an edge value with its EntityReferences renumbered."""
+  if isinstance(value, list):
+    return [_renumber_entity_references(elem, id_map) for elem in value]
+  if not isinstance(value, dict):
+    return value
+  if value.get('_type') == 'EntityReference':
+    return dict(value, _id=id_map.get(value.get('_id'), value.get('_id')))
+  return {key: _renumber_entity_references(elem, id_map)
+          for key, elem in value.items()}
+
+
+def _iter_blob_edges(entry):
+  """Yields the edges within a JsonSnapshot entry that reference blobs."""
+  if entry.get('_type') != 'JsonSnapshot':
+    return
+  for entity in entry.get('_entities', {}).values():
+    for edge in entity.get('_edges', ()):
+      if BLOB_REFERENCE_KEY in edge:
+        yield edge
@@ -0,0 +1,268 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Implements a sidecar index of the entries within a journal file.
+
+The index for "<name>.journal" is written to "<name>.journal.idx". It is a
+text file where each line is a JSON dictionary. Lines with a 'frame_encoding'
+declare the encoding of the journal frames that the following lines refer to.
+The other lines each describe one journal entry, in journal order:
+   offset: [int] The byte offset of the frame containing the entry.
+   record: [int] The index of the entry within its frame (for blocks).
+   type: [string] The '_type' of the entry.
+   timestamp: [float] The '_timestamp' of the entry.
+   thread: [int] The '_thread' of the entry.
+   depth: [int] The number of contexts open in the entry's thread when the
+      entry was written.
+   title: [string] The '_title' of a BEGIN JournalContextControl.
+   begin: [[int, int]] The [offset, record] of the BEGIN entry that an END
+      JournalContextControl closes. This is the innermost context still
+      open in the same thread.
+
+This lets tools seek directly to the entries they are interested in without
+decoding the rest of the journal.
+"""
+
+import collections
+import json
+import os
+
+from .record_stream import (
+    RecordInputStream,
+    RAW_FRAMES)
+
+
+JournalIndexEntry = collections.namedtuple(
+    'JournalIndexEntry',
+    ['sequence', 'offset', 'record', 'frame_encoding',
+     'type', 'timestamp', 'thread', 'depth', 'title', 'pair'])
+JournalIndexEntry.__doc__ = """Describes an entry in an indexed journal.
+
+The sequence is the entry's index within the journal. The pair is the
+sequence of the matching END entry for a BEGIN context control, or the
+matching BEGIN entry for an END context control, or None.
+"""
+
+
+def index_path_for_journal(journal_path):
+  """Returns the path of the sidecar index for the given journal."""
+  return journal_path + '.idx'
+
+
+class JournalIndexWriter(object):
+  """Writes the sidecar index as entries are written into a journal."""
+
+  @property
+  def open_contexts(self):
+    """The [offset, record] of each BEGIN entry not yet ended, by thread."""
+    return {thread: list(stack)
+            for thread, stack in self.__context_stacks.items() if stack}
+
+  def __init__(self, stream, frame_encoding=None, open_contexts=None):
+    """Constructor.
+
+    Args:
+      stream: [stream] The text stream to write the index into.
+      frame_encoding: [string] The frame encoding of the journal entries.
+         If None then it is declared later with set_frame_encoding.
+      open_contexts: [dict of list of [int, int]] The positions of BEGIN
+         entries that were still open when appending to an existing journal,
+         keyed by the '_thread' of the entries.
+    """
+    self.__stream = stream
+    self.__encoder = json.JSONEncoder(separators=(',', ':'))
+    self.__frame_encoding = None
+    self.__context_stacks = {thread: list(stack)
+                             for thread, stack in (open_contexts or {}).items()}
+    if frame_encoding is not None:
+      self.set_frame_encoding(frame_encoding)
+
+  def close(self):
+    """Closes the index stream."""
+    self.__stream.close()
+
+  def set_frame_encoding(self, frame_encoding):
+    """Declares the frame encoding of subsequent entries."""
+    if frame_encoding != self.__frame_encoding:
+      self.__frame_encoding = frame_encoding
+      self.__write({'frame_encoding': frame_encoding})
+
+  def add(self, position, entry):
+    """Adds an entry into the index.
+
+    Args:
+      position: [(int, int)] The (offset, record) position of the entry.
+      entry: [dict] The JSON entry that was written into the journal.
+    """
+    position = list(position)
+    row = {
+        'offset': position[0],
+        'record': position[1],
+        'type': entry.get('_type'),
+        'timestamp': entry.get('_timestamp'),
+        'thread': entry.get('_thread')
+    }
+    # Threads nest their contexts independently of one another.
+    context_stack = self.__context_stacks.setdefault(entry.get('_thread'), [])
+    if entry.get('_type') == 'JournalContextControl':
+      if entry.get('control') == 'BEGIN':
+        row['title'] = entry.get('_title')
+        row['depth'] = len(context_stack)
+        context_stack.append(position)
+      elif entry.get('control') == 'END' and context_stack:
+        row['begin'] = context_stack.pop()
+    row.setdefault('depth', len(context_stack))
+    self.__write(row)
+
+  def __write(self, row):
+    self.__stream.write(self.__encoder.encode(row))
+    self.__stream.write('\n')
+
+
+class JournalIndex(object):
+  """The index of a journal file that has been loaded into memory."""
+
+  @property
+  def entries(self):
+    """The list of JournalIndexEntry in journal order."""
+    return self.__entries
+
+  @property
+  def open_contexts(self):
+    """The [offset, record] of each BEGIN entry never ended, by thread."""
+    result = {}
+    for entry in self.__entries:
+      if (entry.type == 'JournalContextControl'
+          and entry.title is not None and entry.pair is None):
+        result.setdefault(entry.thread, []).append(
+            [entry.offset, entry.record])
+    return result
+
+  @staticmethod
+  def new_from_path(path):
+    """Loads the index from a sidecar file.
+
+    Args:
+      path: [string] The path to the index file (not the journal).
+    """
+    with open(path, 'r') as stream:
+      return JournalIndex(stream)
+
+  def __init__(self, stream):
+    """Constructor.
+
+    Args:
+      stream: [stream] The text stream containing the index.
+    """
+    decoder = json.JSONDecoder()
+    rows = []
+    sequence_at_position = {}
+    pairs = {}
+    frame_encoding = RAW_FRAMES
+    for line in stream:
+      if not line.strip():
+        continue
+      row = decoder.decode(line)
+      if 'frame_encoding' in row:
+        frame_encoding = row['frame_encoding']
+        continue
+      row['frame_encoding'] = frame_encoding
+      sequence = len(rows)
+      sequence_at_position[(row['offset'], row['record'])] = sequence
+      if 'begin' in row:
+        begin = sequence_at_position.get(tuple(row['begin']))
+        if begin is not None:
+          pairs[begin] = sequence
+          pairs[sequence] = begin
+      rows.append(row)
+
+    self.__entries = [
+        JournalIndexEntry(
+            sequence=sequence, offset=row['offset'], record=row['record'],
+            frame_encoding=row['frame_encoding'], type=row.get('type'),
+            timestamp=row.get('timestamp'), thread=row.get('thread'),
+            depth=row.get('depth', 0), title=row.get('title'),
+            pair=pairs.get(sequence))
+        for sequence, row in enumerate(rows)]
+
+  def find_contexts(self, title=None):
+    """Returns the BEGIN entries of contexts.
+
+    Args:
+      title: [string] If provided, only contexts with this title.
+    """
+    return [entry for entry in self.__entries
+            if (entry.type == 'JournalContextControl'
+                and entry.title is not None
+                and (title is None or entry.title == title))]
+
+  def context_entries(self, begin_entry):
+    """Returns all the entries from a BEGIN entry through its END entry.
+
+    If the context was never ended then this is through the end of the
+    journal.
+
+    Args:
+      begin_entry: [JournalIndexEntry] The BEGIN entry for the context.
+    """
+    end = (len(self.__entries) if begin_entry.pair is None
+           else begin_entry.pair + 1)
+    return self.__entries[begin_entry.sequence:end]
+
+  def time_range_entries(self, start=None, end=None):
+    """Returns the entries whose timestamp is within [start, end].
+
+    Args:
+      start: [float] The earliest timestamp, or None for no bound.
+      end: [float] The latest timestamp, or None for no bound.
+    """
+    return [entry for entry in self.__entries
+            if ((start is None or entry.timestamp >= start)
+                and (end is None or entry.timestamp <= end))]
+
+  def type_entries(self, types):
+    """Returns the entries having any of the given types.
+
+    Args:
+      types: [list of string] The '_type' values of interest.
+    """
+    types = set(types)
+    return [entry for entry in self.__entries if entry.type in types]
+
+
+def rebuild_journal_index(journal_path, index_path=None):
+  """Writes a new sidecar index for an existing journal.
+
+  Args:
+    journal_path: [string] The path to the journal file to index.
+    index_path: [string] The path to write the index to if not the default.
+
+  Returns:
+    The number of entries indexed.
+  """
+  index_path = index_path or index_path_for_journal(journal_path)
+  decoder = json.JSONDecoder()
+  count = 0
+  with open(journal_path, 'rb') as stream:
+    records = RecordInputStream(stream)
+    writer = JournalIndexWriter(open(index_path + '.tmp', 'w'))
+    try:
+      for text in records:
+        writer.set_frame_encoding(records.frame_encoding)
+        writer.add(records.position, decoder.decode(text))
+        count += 1
+    finally:
+      writer.close()
+  os.rename(index_path + '.tmp', index_path)
+  return count
@@ -16,16 +16,22 @@
 """Specialized logging.Logger and logging.LogHandler to write into journals."""
 
 
+import itertools
 import json as json_module
 import logging
 import sys
 import threading
+import time
+import weakref
 
 from .global_journal import (get_global_journal, new_global_journal_with_path)
 
 if sys.version_info[0] > 2:
   basestring = str
 
+# Monotonic clock for measuring context durations.
+_monotonic = getattr(time, 'monotonic', time.time)
+
 
 def _to_json_if_possible(value):
   """Render value as JSON string if it is json, otherwise as a normal string.
@@ -49,10 +55,31 @@ def _to_json_if_possible(value):
 
 
 class JournalLogger(logging.Logger):
-  """This class is only providing Journal-aware convienence functions."""
+  """This class is only providing Journal-aware convienence functions.
+
+  Contexts begun through this class are timed. Each context is given a
+  '_context_id' that is unique within the process, and the '_parent_id' of
+  the context it is nested in within the same thread, if any. The END entry
+  also records the '_monotonic_start' and '_monotonic_end' seconds of the
+  context. These are only comparable with one another, but unlike the
+  '_timestamp' are not affected by changes to the system time.
+
+  Records held back by JournalLogHandler sampling are written before each
+  context begins or ends so that they stay within the context they were
+  logged in.
+  """
 
   __thread_data = threading.local()
-  __thread_data.context_stack = []
+  __context_ids = itertools.count(1)
+
+  @staticmethod
+  def __get_context_stack():
+    """Returns the calling thread's stack of (title, id, start time)."""
+    stack = getattr(JournalLogger.__thread_data, 'context_stack', None)
+    if stack is None:
+      stack = []
+      JournalLogger.__thread_data.context_stack = stack
+    return stack
 
   @staticmethod
   def delegate(method, *positional_args, **kwargs):
@@ -177,27 +204,67 @@ class JournalLogger(logging.Logger):
     Args:
       _title: [string] The title of the context.
     """
-    context_stack = JournalLogger.__thread_data.context_stack
+    context_stack = JournalLogger.__get_context_stack()
     logging.getLogger(__name__).debug(
         '+context[%d]: %s', len(context_stack), _title,
         extra={'citest_journal':{'nojournal':True}})
-    context_stack.append(_title)
+    context_id = next(JournalLogger.__context_ids)
+    parent_id = context_stack[-1][1] if context_stack else None
+    context_stack.append((_title, context_id, _monotonic()))
 
     journal = get_global_journal()
     if journal is not None:
-      journal.begin_context(_title, **kwargs)
+      JournalLogHandler.flush_sampling_handlers()
+      journal.begin_context(_title, _context_id=context_id,
+                            _parent_id=parent_id, **kwargs)
 
   @staticmethod
   def end_context(**kwargs):
     """Mark the ending of the current context within the journal."""
-    context_stack = JournalLogger.__thread_data.context_stack
-    context_stack.pop()
+    end_time = _monotonic()
+    context_stack = JournalLogger.__get_context_stack()
+    _, context_id, start_time = context_stack.pop()
     logging.getLogger(__name__).debug(
         '-context[%d]', len(context_stack),
         extra={'citest_journal':{'nojournal':True}})
     journal = get_global_journal()
     if journal is not None:
-      journal.end_context(**kwargs)
+      JournalLogHandler.flush_sampling_handlers()
+      journal.end_context(
+          _context_id=context_id,
+          _parent_id=context_stack[-1][1] if context_stack else None,
+          _monotonic_start=start_time,
+          _monotonic_end=end_time,
+          **kwargs)
+
+
+class _LoggerSamplingState(object):
+  """The sampling state JournalLogHandler keeps for each logger name."""
+
+  # pylint: disable=too-few-public-methods
+  def __init__(self, level, rate, burst):
+    self.level = level
+    self.rate = rate
+    self.burst = burst
+    self.tokens = burst
+    self.refill_time = time.time()
+    self.dropped_count = 0
+    self.dropped_record = None
+    self.repeat_key = None
+    self.repeat_count = 0
+    self.repeat_record = None
+
+  def take_token(self, now):
+    """Returns whether a record may be written under the rate limit."""
+    if self.rate is None:
+      return True
+    self.tokens = min(self.burst,
+                      self.tokens + (now - self.refill_time) * self.rate)
+    self.refill_time = now
+    if self.tokens < 1:
+      return False
+    self.tokens -= 1
+    return True
 
 
 class JournalLogHandler(logging.StreamHandler):
@@ -219,9 +286,36 @@ class JournalLogHandler(logging.StreamHandler):
   are:
      nojournal [bool]:  If True do not log the message into the journal.
      _joural_message [string]: Journal this instead of the LogRecord message.
+
+  The handler can also sample high volume logging, as configured by its
+  entry in the logging configuration:
+     journal_levels [dict]: The minimum level to journal, keyed by logger
+        name. Loggers without an entry use their nearest configured parent.
+     journal_rate_limits [dict]: Token bucket limits keyed by logger name as
+        with journal_levels. Each is a dictionary with the 'rate' of records
+        per second and the 'burst' of records allowed at once. When records
+        were dropped, the last one dropped is written, with a '_dropped'
+        count, before the next record that is allowed.
+     collapse_repeats [bool]: If True then consecutive records from a
+        logger with identical messages are collapsed. The first is written
+        as usual. The last is written once a different message arrives,
+        with a '_repeat_count' of the records it stands for.
+  Records held back by sampling are written when the handler is flushed
+  or closed, so flush the handler before terminating the journal. They are
+  also written when a JournalLogger context begins or ends.
   """
 
-  def __init__(self, path, **kwargs):
+  # The handlers that may hold back records.
+  __sampling_handlers = weakref.WeakSet()
+
+  @staticmethod
+  def flush_sampling_handlers():
+    """Writes the records held back by every sampling JournalLogHandler."""
+    for handler in list(JournalLogHandler.__sampling_handlers):
+      handler.flush()
+
+  def __init__(self, path, journal_levels=None, journal_rate_limits=None,
+               collapse_repeats=False, **kwargs):
     """Construct a handler using the global journal.
 
     Ideally we'd like to inject a journal in here.
@@ -232,24 +326,126 @@ class JournalLogHandler(logging.StreamHandler):
     Args:
       path: [string] Specifies the path for the global journal, if it does not
           already exist.
+      journal_levels: [dict] Minimum journal levels. See the class.
+      journal_rate_limits: [dict] Token bucket limits. See the class.
+      collapse_repeats: [bool] Whether to collapse repeated messages.
       kwargs: [kwargs] Additional keyword args to pass to journal consructor
-          if the journal is to be created.
+          if the journal is to be created. This includes '_async_queue_size'
+          to write the journal from a background thread, '_buffer_per_thread'
+          to avoid contending on the journal lock, '_encoding' to choose
+          how entries are encoded, and '_index' to write a sidecar index.
+          See new_global_journal_with_path for the others.
     """
     super(JournalLogHandler, self).__init__()
     self.__journal = get_global_journal()
     if self.__journal is None:
       self.__journal = new_global_journal_with_path(path, **kwargs)
 
+    self.__levels = {name: self.__to_level(level)
+                     for name, level in (journal_levels or {}).items()}
+    self.__rate_limits = dict(journal_rate_limits or {})
+    self.__collapse_repeats = collapse_repeats
+    self.__sampling = bool(self.__levels or self.__rate_limits
+                           or collapse_repeats)
+    self.__logger_state = {}
+    if self.__sampling:
+      JournalLogHandler.__sampling_handlers.add(self)
+
+  @staticmethod
+  def __to_level(level):
+    """Converts a level name such as 'INFO' into its numeric value."""
+    if isinstance(level, basestring):
+      return logging.getLevelName(level.upper())
+    return level
+
+  @staticmethod
+  def __find_config(config, name):
+    """Returns the config value for the logger name or its nearest parent."""
+    while True:
+      if name in config:
+        return config[name]
+      if not name:
+        return None
+      name = name.rpartition('.')[0]
+
+  def __get_logger_state(self, name):
+    """Returns the _LoggerSamplingState for the named logger."""
+    state = self.__logger_state.get(name)
+    if state is None:
+      limit = self.__find_config(self.__rate_limits, name) or {}
+      rate = limit.get('rate')
+      state = _LoggerSamplingState(
+          level=self.__find_config(self.__levels, name) or logging.NOTSET,
+          rate=rate, burst=limit.get('burst', rate))
+      self.__logger_state[name] = state
+    return state
+
   def emit(self, record):
     """Emit the record to the journal."""
     journal_extra = getattr(record, 'citest_journal', {})
     if journal_extra.get('nojournal', False):
       # See class description
       return
+    if not self.__sampling:
+      self.__write_record(record)
+      return
+
+    state = self.__get_logger_state(record.name)
+    if record.levelno < state.level:
+      return
+
+    if self.__collapse_repeats:
+      key = (record.levelno, record.getMessage(),
+             journal_extra.get('_journal_message'))
+      if key == state.repeat_key:
+        state.repeat_count += 1
+        state.repeat_record = record
+        return
+      if state.repeat_record is not None:
+        # Keep the journal in order since the repeats followed the drops.
+        self.__write_dropped(state)
+        self.__write_repeats(state)
+      state.repeat_key = key
+
+    if not state.take_token(record.created):
+      state.dropped_count += 1
+      state.dropped_record = record
+      return
+    self.__write_dropped(state)
+    self.__write_record(record)
+
+  def __write_repeats(self, state):
+    """Writes the last of the repeated records being collapsed, if any."""
+    if state.repeat_record is not None:
+      self.__write_record(state.repeat_record,
+                          _repeat_count=state.repeat_count,
+                          _timestamp=state.repeat_record.created)
+    state.repeat_key = None
+    state.repeat_count = 0
+    state.repeat_record = None
+
+  def __write_dropped(self, state):
+    """Writes the last record dropped by the rate limit, if any."""
+    if state.dropped_record is not None:
+      self.__write_record(state.dropped_record,
+                          _dropped=state.dropped_count,
+                          _timestamp=state.dropped_record.created)
+    state.dropped_count = 0
+    state.dropped_record = None
+
+  def __write_record(self, record, **metadata):
+    """Writes the record into the journal.
+
+    Args:
+      record: [LogRecord] The record to write.
+      metadata: [kwargs] Additional metadata for the journal entry.
+    """
+    journal_extra = dict(getattr(record, 'citest_journal', {}))
     journal_extra.pop('nojournal', None)
     journal_extra.setdefault('format', 'pre')
     message = record.getMessage()
     message = journal_extra.pop('_journal_message', message)
+    journal_extra.update(metadata)
 
     self.__journal.write_message(message,
                                  _level=record.levelno,
@@ -257,8 +453,27 @@ class JournalLogHandler(logging.StreamHandler):
                                  **journal_extra)
 
   def flush(self):
-    """Implements the LogHandler interface."""
+    """Implements the LogHandler interface.
+
+    This writes any records held back by sampling.
+    """
     # The journal always flushes. Since we are using the global journal,
     # which is accessable outside this logger, it needs to already be flushed
     # to allow interleaving writers to preserve ordering.
-    pass
+    self.acquire()
+    try:
+      for state in self.__logger_state.values():
+        self.__write_dropped(state)
+        self.__write_repeats(state)
+    finally:
+      self.release()
+
+  def close(self):
+    """Implements the LogHandler interface.
+
+    This writes any records held back by sampling before closing.
+    """
+    try:
+      self.flush()
+    finally:
+      super(JournalLogHandler, self).close()
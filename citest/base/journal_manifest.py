@@ -0,0 +1,92 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Implements the manifest for journals that are split into segments.
+
+A segmented journal "<name>.journal" is written as a sequence of segment
+files "<name>.0001.journal", "<name>.0002.journal", etc. in the same
+directory. The "<name>.journal" file itself is a JSON manifest listing the
+segments so that navigators can treat the segments as one logical journal.
+
+Each segment is a complete journal on its own. Contexts that are open when
+a segment is rolled over are ended at the end of the old segment and begun
+again at the start of the new one. These synthetic entries are marked with
+'_segment_continuation' so that navigators reading the logical journal can
+drop them.
+"""
+
+import json
+import os
+
+
+JOURNAL_MANIFEST_TYPE = 'JournalManifest'
+
+# Added to the synthetic context controls written at segment boundaries.
+SEGMENT_CONTINUATION_KEY = '_segment_continuation'
+
+
+def segment_path_for_journal(journal_path, number):
+  """Returns the path of a numbered segment of a segmented journal.
+
+  Args:
+    journal_path: [string] The path to the logical journal (the manifest).
+    number: [int] The 1-based segment number.
+  """
+  base, ext = os.path.splitext(journal_path)
+  return '{0}.{1:04d}{2}'.format(base, number, ext or '.journal')
+
+
+def is_journal_manifest(path):
+  """Determines whether the file at path is a manifest rather than a journal.
+
+  Journal files begin with a binary frame length whereas manifests are JSON.
+  """
+  with open(path, 'rb') as stream:
+    return stream.read(1) == b'{'
+
+
+def load_journal_manifest(path):
+  """Returns the manifest dictionary at the given path.
+
+  The segment paths are resolved relative to the manifest's directory.
+  """
+  with open(path, 'r') as stream:
+    manifest = json.JSONDecoder().decode(stream.read())
+  if manifest.get('_type') != JOURNAL_MANIFEST_TYPE:
+    raise ValueError('{0} is not a journal manifest'.format(path))
+  base_dir = os.path.dirname(path)
+  for segment in manifest.get('segments', []):
+    segment['path'] = os.path.join(base_dir, segment['path'])
+  return manifest
+
+
+def write_journal_manifest(path, segments):
+  """Writes or replaces the manifest for a segmented journal.
+
+  Args:
+    path: [string] The path to the manifest.
+    segments: [list of dict] Describes each segment. The 'path' is the
+       segment's path and 'entries' is the number of entries within it.
+  """
+  manifest = {
+      '_type': JOURNAL_MANIFEST_TYPE,
+      'version': 1,
+      'segments': [dict(segment, path=os.path.basename(segment['path']))
+                   for segment in segments]
+  }
+  tmp_path = path + '.tmp'
+  with open(tmp_path, 'w') as stream:
+    stream.write(json.JSONEncoder(indent=2, separators=(',', ': '))
+                 .encode(manifest))
+  os.rename(tmp_path, path)
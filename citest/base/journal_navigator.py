@@ -14,12 +14,125 @@
 
 """Various journal iterators to facilitate navigating through journal JSON."""
 
+import collections
+import heapq
 import json
 import logging
+import mmap
+import multiprocessing
 import os
+import re
+import threading
+import time
 
 from io import BytesIO
-from .record_stream import RecordInputStream
+from .journal_blobs import (
+    JOURNAL_BLOB_TYPE,
+    JournalBlobTable,
+    has_blob_references)
+from .journal_index import (
+    JournalIndex,
+    index_path_for_journal)
+from .journal_manifest import (
+    SEGMENT_CONTINUATION_KEY,
+    is_journal_manifest,
+    load_journal_manifest)
+from .record_stream import (
+    PartialFrameError,
+    RecordInputStream)
+
+
+# Matches the '_type' at the start of a JSON encoded journal entry.
+# The Journal writes '_type' first in all the entries it creates.
+_TYPE_PREFIX_RE = re.compile(br'^\s*{\s*"_type"\s*:\s*"([^"\\]*)"')
+
+
+def _make_type_filter(types):
+  """Returns RecordInputStream.next_accepted predicate for entry types.
+
+  Records whose type cannot be determined from the prefix are accepted.
+  The blobs referenced by snapshots are accepted along with the snapshots.
+  """
+  types = set(str.encode(entry_type) for entry_type in types)
+  if b'JsonSnapshot' in types:
+    types.add(str.encode(JOURNAL_BLOB_TYPE))
+  def accept(prefix):
+    """Returns False if prefix starts an entry whose type is not wanted."""
+    match = _TYPE_PREFIX_RE.match(prefix)
+    return match is None or match.group(1) in types
+  return accept
+
+
+class _MappedFileStream(object):
+  """A read-only stream over a memory mapped file.
+
+  Pages that were already read are released back to the operating system as
+  the stream advances so that resident memory does not grow with the size
+  of the file.
+  """
+
+  # Release pages in chunks of at least this size.
+  __RELEASE_BYTES = 16 * 1024 * 1024
+
+  def __init__(self, mapped):
+    """Constructor.
+
+    Args:
+      mapped: [mmap] Takes ownership of the mapped file.
+    """
+    self.__map = mapped
+    self.__released = 0
+    self.__can_release = (hasattr(mapped, 'madvise')
+                          and hasattr(mmap, 'MADV_DONTNEED'))
+
+  def read(self, count):
+    """Returns a copy of the next count bytes."""
+    data = self.__map.read(count)
+    if self.__can_release:
+      self.__release_read_pages()
+    return data
+
+  def seek(self, offset):
+    """Positions the stream at the given offset."""
+    self.__map.seek(offset)
+    self.__released = min(self.__released, offset - offset % mmap.PAGESIZE)
+
+  def tell(self):
+    """Returns the current offset."""
+    return self.__map.tell()
+
+  def close(self):
+    """Unmaps the file."""
+    self.__map.close()
+
+  def __release_read_pages(self):
+    offset = self.__map.tell()
+    end = offset - offset % mmap.PAGESIZE
+    if end - self.__released >= self.__RELEASE_BYTES:
+      self.__map.madvise(mmap.MADV_DONTNEED, self.__released,
+                         end - self.__released)
+      self.__released = end
+
+
+def _new_mapped_record_stream(path):
+  """Returns a RecordInputStream reading from a memory mapped file."""
+  with open(path, 'rb') as stream:
+    try:
+      # The map keeps its own handle so we can close the file.
+      contents = _MappedFileStream(
+          mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+    except ValueError:
+      # Empty files cannot be mapped.
+      contents = BytesIO()
+  return RecordInputStream(contents)
+
+
+def _journal_id_to_name(journal_id):
+  """Returns the journal_name for a journal_id, typically a path."""
+  basename = os.path.basename(journal_id)
+  if basename.endswith('.journal'):
+    basename = os.path.splitext(basename)[0]
+  return basename
 
 
 class JournalNavigator(object):
@@ -46,6 +159,18 @@ class JournalNavigator(object):
     raise NotImplementedError('{0}.next() not implemented'.format(
         self.__class__.__name__))
 
+  def set_type_filter(self, types):
+    """Hints that only entries with the given '_type' values are wanted.
+
+    Navigators that can cheaply determine an entry's type without decoding
+    it will skip the other entries. Others may ignore this hint so callers
+    should still check the type of the entries returned.
+
+    Args:
+      types: [list of string] The '_type' values wanted, or None for all.
+    """
+    pass
+
 
 class StreamJournalNavigator(JournalNavigator):
   """Iterates over journal JSON from a stream."""
@@ -62,16 +187,24 @@ class StreamJournalNavigator(JournalNavigator):
     if self.__input_stream is not None:
       raise ValueError('Navigator is already open.')
     self.__input_stream = RecordInputStream(open(path, 'rb'))
+    self.__closed = False
 
   @staticmethod
   def new_from_path(path):
     """Create a new navigator using the contents of a file.
 
+    The file is memory mapped rather than read so that only the record
+    currently being decoded needs to be copied into memory.
+
+    If the path is the manifest of a segmented journal then this returns
+    a SegmentedJournalNavigator over the segments instead.
+
     Args:
       path: [string] Path to journal file.
     """
-    with open(path, 'rb') as stream:
-      return StreamJournalNavigator.new_from_bytes(path, stream.read())
+    if is_journal_manifest(path):
+      return SegmentedJournalNavigator(path)
+    return StreamJournalNavigator(path, _new_mapped_record_stream(path))
 
   @staticmethod
   def new_from_bytes(journal_id, contents):
@@ -91,26 +224,538 @@ class StreamJournalNavigator(JournalNavigator):
 
   @property
   def journal_name(self):
-    basename = os.path.basename(self.__id)
-    if basename.endswith('.journal'):
-      basename = os.path.splitext(basename)[0]
-    return basename
+    return _journal_id_to_name(self.__id)
 
-  def __init__(self, journal_id, stream):
-    """Constructor"""
+  def __init__(self, journal_id, stream, blobs=None):
+    """Constructor.
+
+    Args:
+      journal_id: [string] Identifies the source of the stream.
+      stream: [RecordInputStream] The stream to read the journal from.
+      blobs: [JournalBlobTable] The blobs already read when the journal is
+          continued from another stream, if any.
+    """
     self.__id = journal_id
     self.__input_stream = stream
+    self.__blobs = blobs or JournalBlobTable()
     self.__decoder = json.JSONDecoder()
+    self.__closed = False
+    self.__accept = None
 
   def __iter__(self):
     return self
 
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface.
+
+    Entry types are determined by peeking at the start of each record.
+    """
+    self.__accept = None if types is None else _make_type_filter(types)
+
+  def close(self):
+    """Closes the underlying stream."""
+    if not self.__closed:
+      self.__closed = True
+      self.__input_stream.close()
+
   def next(self):
     """Return the next item in the journal.
 
+    The underlying stream is closed once the journal is exhausted.
+
     Raises:
       StopIteration when there are no more elements.
     """
+    while True:
+      if self.__closed:
+        raise StopIteration()
+      try:
+        json_str = self.__input_stream.next_accepted(self.__accept)
+      except StopIteration:
+        self.close()
+        raise
+
+      try:
+        entry = self.__blobs.process(self.__decoder.decode(json_str))
+      except ValueError:
+        logging.error('Invalid json record:\n%s', json_str)
+        raise
+      if entry is not None:
+        return entry
+
+
+class SegmentedJournalNavigator(JournalNavigator):
+  """Iterates over the segments of a segmented journal as one journal.
+
+  The synthetic context controls written at segment boundaries are dropped
+  so the entries are as if the journal had been written into one file.
+  Segments listed in the manifest that no longer exist are skipped.
+  """
+
+  @property
+  def journal_id(self):
+    return self.__path
+
+  @property
+  def journal_name(self):
+    return _journal_id_to_name(self.__path)
+
+  @property
+  def segment_paths(self):
+    """The paths to the segment files in order."""
+    return self.__segment_paths
+
+  def __init__(self, path):
+    """Constructor.
+
+    Args:
+      path: [string] The path to the journal manifest.
+    """
+    self.__path = path
+    self.__segment_paths = [segment['path'] for segment in
+                            load_journal_manifest(path).get('segments', [])]
+    self.__next_segment = 0
+    self.__navigator = None
+    self.__types = None
+    self.__blobs = JournalBlobTable()
+
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface."""
+    self.__types = types
+    if self.__navigator is not None:
+      self.__navigator.set_type_filter(types)
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.next()
+
+  def next(self):
+    """Return the next item in the journal.
+
+    Raises:
+      StopIteration when there are no more elements.
+    """
+    while True:
+      if self.__navigator is None:
+        if self.__next_segment >= len(self.__segment_paths):
+          raise StopIteration()
+        segment_path = self.__segment_paths[self.__next_segment]
+        self.__next_segment += 1
+        if not os.path.exists(segment_path):
+          logging.warning('Skipping missing journal segment %s', segment_path)
+          continue
+        self.__navigator = StreamJournalNavigator(
+            segment_path, _new_mapped_record_stream(segment_path),
+            blobs=self.__blobs)
+        self.__navigator.set_type_filter(self.__types)
+
+      try:
+        entry = self.__navigator.next()
+      except StopIteration:
+        self.__navigator = None
+        continue
+      if not entry.get(SEGMENT_CONTINUATION_KEY):
+        return entry
+
+
+class FollowJournalNavigator(JournalNavigator):
+  """Iterates over a journal while it is still being written.
+
+  Rather than stopping at the end of the file, the navigator waits for more
+  entries to be appended. A frame at the end of the file that is only
+  partially written is read again once the writer finishes it. The file is
+  polled with an exponential back-off so a quiet journal costs little.
+
+  Iteration stops once stop() was called and the navigator has caught up
+  with the writer. If an idle_timeout is given, iteration also stops when no
+  entries appeared within that time; iterating again later resumes from
+  where it left off so callers can process the journal incrementally.
+
+  Writers should call Journal.flush for entries to become visible promptly.
+  """
+
+  @property
+  def journal_id(self):
+    return self.__path
+
+  @property
+  def journal_name(self):
+    return _journal_id_to_name(self.__path)
+
+  def __init__(self, path, idle_timeout=None,
+               min_poll_interval=0.05, max_poll_interval=1.0):
+    """Constructor.
+
+    Args:
+      path: [string] The path to the journal file. It need not exist yet.
+      idle_timeout: [float] If not None then the number of seconds to wait
+          for new entries before stopping the iteration.
+      min_poll_interval: [float] The initial seconds to wait between polls.
+      max_poll_interval: [float] The most seconds to wait between polls.
+    """
+    self.__path = path
+    self.__idle_timeout = idle_timeout
+    self.__min_poll_interval = min_poll_interval
+    self.__max_poll_interval = max_poll_interval
+    self.__poll_interval = min_poll_interval
+    self.__records = None
+    self.__decoder = json.JSONDecoder()
+    self.__accept = None
+    self.__blobs = JournalBlobTable()
+    self.__stop_event = threading.Event()
+    self.__closed = False
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.next()
+
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface."""
+    self.__accept = None if types is None else _make_type_filter(types)
+
+  def stop(self):
+    """Stops the iteration once it catches up with the writer.
+
+    This can be called from any thread.
+    """
+    self.__stop_event.set()
+
+  def close(self):
+    """Closes the underlying stream."""
+    self.__closed = True
+    if self.__records is not None:
+      self.__records.close()
+      self.__records = None
+
+  def next(self):
+    """Return the next item in the journal, waiting for it if needed.
+
+    Raises:
+      StopIteration when stopped or idle.
+    """
+    idle_since = time.time()
+    while not self.__closed:
+      if self.__records is None and os.path.exists(self.__path):
+        self.__records = RecordInputStream(open(self.__path, 'rb'))
+
+      if self.__records is not None:
+        resume_position = self.__records.next_position
+        try:
+          json_str = self.__records.next_accepted(self.__accept)
+          self.__poll_interval = self.__min_poll_interval
+          entry = self.__blobs.process(self.__decoder.decode(json_str))
+          if entry is not None:
+            return entry
+          continue
+        except StopIteration:
+          pass
+        except PartialFrameError:
+          self.__records.seek(resume_position)
+
+      if self.__stop_event.is_set():
+        self.close()
+        break
+      if (self.__idle_timeout is not None
+          and time.time() - idle_since >= self.__idle_timeout):
+        break
+      self.__stop_event.wait(self.__poll_interval)
+      self.__poll_interval = min(self.__poll_interval * 2,
+                                 self.__max_poll_interval)
+
+    raise StopIteration()
+
+
+class MergedJournalNavigator(JournalNavigator):
+  """Iterates over several journals as one, such as from a parallel run.
+
+  The journals are merged by '_timestamp' with a heap holding the next entry
+  of each journal, so only one entry per journal is in memory at a time.
+  Each entry is tagged with the journal_name of the journal it came from
+  under '_journal'.
+
+  The entries of each journal are returned in their original order. By
+  default the navigator only switches to another journal between the
+  top-level contexts of the journal it is on so that the contexts remain
+  nested for renderers that track a single context stack. Alternatively
+  the entries can be interleaved individually by timestamp.
+  """
+
+  # The key that the source journal_name is recorded under within entries.
+  SOURCE_KEY = '_journal'
+
+  @property
+  def journal_id(self):
+    return ','.join(source.journal_id for source in self.__sources)
+
+  @property
+  def journal_name(self):
+    return '+'.join(source.journal_name for source in self.__sources)
+
+  @property
+  def sources(self):
+    """The navigators being merged."""
+    return self.__sources
+
+  @staticmethod
+  def new_from_paths(paths, interleave_contexts=False):
+    """Create a new navigator merging the journal files.
+
+    Args:
+      paths: [list of string] Paths to the journal files or manifests.
+      interleave_contexts: [bool] See the constructor.
+    """
+    return MergedJournalNavigator(
+        [StreamJournalNavigator.new_from_path(path) for path in paths],
+        interleave_contexts=interleave_contexts)
+
+  def __init__(self, navigators, interleave_contexts=False):
+    """Constructor.
+
+    Args:
+      navigators: [list of JournalNavigator] The journals to merge.
+      interleave_contexts: [bool] If True then merge entry by entry even
+          within the contexts of a journal, which strictly orders the
+          entries by timestamp. Otherwise whole top-level contexts are kept
+          together.
+    """
+    self.__sources = list(navigators)
+    self.__interleave_contexts = interleave_contexts
+    self.__heap = None
+    self.__depths = [0] * len(self.__sources)
+    self.__last_timestamps = [0] * len(self.__sources)
+    self.__current = None  # The source index within a top-level context.
+
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface.
+
+    Context controls are always read so that the nesting can be tracked.
+    """
+    if types is not None and not self.__interleave_contexts:
+      types = set(types)
+      types.add('JournalContextControl')
+    for source in self.__sources:
+      source.set_type_filter(types)
+
+  def close(self):
+    """Closes the navigators being merged."""
+    for source in self.__sources:
+      if hasattr(source, 'close'):
+        source.close()
+    self.__heap = []
+    self.__current = None
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.next()
+
+  def next(self):
+    """Return the next item across the journals.
+
+    Raises:
+      StopIteration when there are no more elements.
+    """
+    if self.__heap is None:
+      self.__heap = []
+      for index in range(len(self.__sources)):
+        self.__push_next(index)
+
+    if self.__current is not None:
+      index = self.__current
+      entry = self.__read_next(index)
+      if entry is None:
+        self.__current = None
+        return self.next()
+    elif self.__heap:
+      _, index, entry = heapq.heappop(self.__heap)
+    else:
+      raise StopIteration()
+
+    self.__track_depth(index, entry)
+    if self.__depths[index] and not self.__interleave_contexts:
+      self.__current = index
+    else:
+      self.__current = None
+      self.__push_next(index)
+    return entry
+
+  def __read_next(self, index):
+    """Returns the next tagged entry from a source, or None at its end."""
+    try:
+      entry = next(self.__sources[index])
+    except StopIteration:
+      return None
+    entry.setdefault(self.SOURCE_KEY, self.__sources[index].journal_name)
+    return entry
+
+  def __push_next(self, index):
+    """Adds the next entry from a source into the heap, if any."""
+    entry = self.__read_next(index)
+    if entry is None:
+      return
+    timestamp = entry.get('_timestamp')
+    if timestamp is None:
+      timestamp = self.__last_timestamps[index]
+    self.__last_timestamps[index] = timestamp
+    # Each source has at most one entry in the heap so the entries
+    # themselves are never compared.
+    heapq.heappush(self.__heap, (timestamp, index, entry))
+
+  def __track_depth(self, index, entry):
+    """Updates the context depth of a source for an entry it returned."""
+    if entry.get('_type') != 'JournalContextControl':
+      return
+    control = entry.get('control')
+    if control == 'BEGIN':
+      self.__depths[index] += 1
+    elif control == 'END' and self.__depths[index]:
+      self.__depths[index] -= 1
+
+
+class IndexedJournalNavigator(JournalNavigator):
+  """Iterates over selected journal entries using the journal's index.
+
+  Only the frames containing the selected entries are read and decoded.
+  The navigator can be narrowed down to individual contexts, time ranges
+  or entry types using the methods that return new navigators.
+  """
+
+  @property
+  def journal_id(self):
+    return self.__path
+
+  @property
+  def journal_name(self):
+    return _journal_id_to_name(self.__path)
+
+  @property
+  def index(self):
+    """The JournalIndex for the journal."""
+    return self.__index
+
+  @property
+  def entries(self):
+    """The JournalIndexEntry list of entries this navigator iterates over."""
+    return self.__entries
+
+  @staticmethod
+  def new_from_path(path, index_path=None):
+    """Create a new navigator over all the entries in an indexed journal.
+
+    Args:
+      path: [string] Path to journal file.
+      index_path: [string] Path to the index if not the default sidecar.
+    """
+    index = JournalIndex.new_from_path(
+        index_path or index_path_for_journal(path))
+    return IndexedJournalNavigator(path, index)
+
+  def __init__(self, path, index, entries=None):
+    """Constructor.
+
+    Args:
+      path: [string] The path to the journal file.
+      index: [JournalIndex] The index for the journal file.
+      entries: [list of JournalIndexEntry] The entries to iterate over
+         in the order to return them. If None then all the entries.
+    """
+    self.__path = path
+    self.__index = index
+    self.__entries = index.entries if entries is None else entries
+    self.__next_entry = 0
+    self.__input_stream = None
+    self.__decoder = json.JSONDecoder()
+    self.__blobs = None
+
+  def new_for_entries(self, entries):
+    """Returns a new navigator over the given subset of entries."""
+    return IndexedJournalNavigator(self.__path, self.__index, entries)
+
+  def new_for_context(self, begin_entry):
+    """Returns a new navigator over the entries within a context.
+
+    Args:
+      begin_entry: [JournalIndexEntry] The BEGIN entry of the context
+         as returned by index.find_contexts().
+    """
+    return self.new_for_entries(self.__index.context_entries(begin_entry))
+
+  def new_for_time_range(self, start=None, end=None):
+    """Returns a new navigator over the entries within a time range.
+
+    Args:
+      start: [float] The earliest timestamp, or None for no bound.
+      end: [float] The latest timestamp, or None for no bound.
+    """
+    return self.new_for_entries(self.__index.time_range_entries(start, end))
+
+  def new_for_types(self, types):
+    """Returns a new navigator over the entries with any of the given types.
+
+    Args:
+      types: [list of string] The '_type' values of interest.
+    """
+    return self.new_for_entries(self.__index.type_entries(types))
+
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface.
+
+    Entry types are determined from the index.
+    """
+    if types is not None:
+      types = set(types)
+      self.__entries = [entry for entry in self.__entries
+                        if entry.type in types]
+
+  def close(self):
+    """Closes the underlying journal file, if it was opened."""
+    if self.__input_stream is not None:
+      self.__input_stream.close()
+      self.__input_stream = None
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.next()
+
+  def next(self):
+    """Return the next selected item in the journal.
+
+    Raises:
+      StopIteration when there are no more elements.
+    """
+    while True:
+      if self.__next_entry >= len(self.__entries):
+        self.close()
+        raise StopIteration()
+
+      index_entry = self.__entries[self.__next_entry]
+      self.__next_entry += 1
+      if index_entry.type == JOURNAL_BLOB_TYPE:
+        continue
+
+      entry = self.__read_entry(index_entry)
+      if self.__blobs is None and has_blob_references(entry):
+        self.__load_blobs()
+      if self.__blobs is not None:
+        self.__blobs.resolve(entry)
+      return entry
+
+  def __read_entry(self, index_entry):
+    """Reads and decodes the journal entry for a JournalIndexEntry."""
+    if self.__input_stream is None:
+      self.__input_stream = RecordInputStream(open(self.__path, 'rb'))
+
+    position = (index_entry.offset, index_entry.record)
+    if self.__input_stream.next_position != position:
+      self.__input_stream.seek(position,
+                               frame_encoding=index_entry.frame_encoding)
     json_str = next(self.__input_stream)
 
     try:
@@ -119,3 +764,183 @@ class StreamJournalNavigator(JournalNavigator):
     except ValueError:
       logging.error('Invalid json record:\n%s', json_str)
       raise
+
+  def __load_blobs(self):
+    """Reads all the blobs in the journal, which are located by the index.
+
+    This is only done once the navigator comes across a blob reference
+    since the blobs might not be among the selected entries.
+    """
+    self.__blobs = JournalBlobTable()
+    for index_entry in self.__index.type_entries([JOURNAL_BLOB_TYPE]):
+      self.__blobs.add_blob_entry(self.__read_entry(index_entry))
+
+
+def _decode_journal_chunk(path, begin, end, frame_encoding, types):
+  """Decodes the journal entries in a range of frames.
+
+  This is the unit of work for ParallelJournalNavigator worker processes.
+
+  Args:
+    path: [string] The path to the journal file.
+    begin: [int] The offset of the first frame in the range.
+    end: [int] The offset just past the last frame in the range.
+    frame_encoding: [string] The frame encoding at the begin offset.
+    types: [list of string] The wanted entry types or None for all.
+
+  Returns:
+    A list of the decoded entries in the range.
+  """
+  accept = None if types is None else _make_type_filter(types)
+  decoder = json.JSONDecoder()
+  result = []
+  with open(path, 'rb') as stream:
+    records = RecordInputStream(stream)
+    records.seek((begin, 0), frame_encoding=frame_encoding)
+    while True:
+      try:
+        json_str = records.next_accepted(accept, limit=end)
+      except StopIteration:
+        break
+      try:
+        entry = decoder.decode(json_str)
+      except ValueError:
+        logging.error('Invalid json record:\n%s', json_str)
+        raise
+      if not entry.get(SEGMENT_CONTINUATION_KEY):
+        result.append(entry)
+  return result
+
+
+class ParallelJournalNavigator(JournalNavigator):
+  """Iterates over journal JSON decoded by a pool of processes.
+
+  The frames are located without decoding them, grouped into chunks, and the
+  chunks decoded concurrently by worker processes. Segmented journals are
+  supported as with SegmentedJournalNavigator. Entries are still returned
+  in journal order. Only a bounded number of chunks are decoded ahead of the
+  entries being consumed.
+  """
+
+  # Default number of frame bytes decoded by a worker at a time.
+  DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+  @property
+  def journal_id(self):
+    return self.__path
+
+  @property
+  def journal_name(self):
+    return _journal_id_to_name(self.__path)
+
+  @staticmethod
+  def new_from_path(path, processes=None):
+    """Create a new navigator for the journal file.
+
+    Args:
+      path: [string] Path to journal file.
+      processes: [int] Number of worker processes, or None for one per cpu.
+    """
+    return ParallelJournalNavigator(path, processes=processes)
+
+  def __init__(self, path, processes=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Constructor.
+
+    Args:
+      path: [string] The path to the journal file.
+      processes: [int] Number of worker processes, or None for one per cpu.
+      chunk_bytes: [int] Approximate number of frame bytes per chunk.
+    """
+    self.__path = path
+    self.__processes = processes or multiprocessing.cpu_count()
+    self.__chunk_bytes = chunk_bytes
+    self.__types = None
+    self.__pool = None
+    self.__chunks = None
+    self.__pending = collections.deque()
+    self.__entries = collections.deque()
+    self.__blobs = JournalBlobTable()
+
+  def set_type_filter(self, types):
+    """Implements JournalNavigator interface.
+
+    Entry types are determined by peeking at the start of each record.
+    """
+    self.__types = None if types is None else list(types)
+
+  def close(self):
+    """Stops the worker processes, if they were started."""
+    if self.__pool is not None:
+      self.__pool.terminate()
+      self.__pool.join()
+      self.__pool = None
+    self.__chunks = iter([])
+    self.__pending.clear()
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.next()
+
+  def next(self):
+    """Return the next item in the journal.
+
+    Raises:
+      StopIteration when there are no more elements.
+    """
+    if self.__chunks is None:
+      self.__chunks = iter(self.__find_chunks())
+      self.__pool = multiprocessing.Pool(self.__processes)
+
+    while True:
+      while not self.__entries:
+        self.__fill_pending()
+        if not self.__pending:
+          self.close()
+          raise StopIteration()
+        self.__entries.extend(self.__pending.popleft().get())
+        self.__fill_pending()
+
+      # Blobs are resolved here because they may be in earlier chunks.
+      entry = self.__blobs.process(self.__entries.popleft())
+      if entry is not None:
+        return entry
+
+  def __fill_pending(self):
+    """Keeps a couple of chunks per worker in progress."""
+    while len(self.__pending) < 2 * self.__processes:
+      chunk = next(self.__chunks, None)
+      if chunk is None:
+        return
+      self.__pending.append(self.__pool.apply_async(
+          _decode_journal_chunk, chunk + (self.__types,)))
+
+  def __find_chunks(self):
+    """Returns a list of (path, begin, end, frame_encoding) journal chunks."""
+    if is_journal_manifest(self.__path):
+      paths = [segment['path'] for segment in
+               load_journal_manifest(self.__path).get('segments', [])
+               if os.path.exists(segment['path'])]
+    else:
+      paths = [self.__path]
+
+    chunks = []
+    for path in paths:
+      begin = None
+      end = None
+      begin_encoding = None
+      records = _new_mapped_record_stream(path)
+      try:
+        for offset, size, frame_encoding in records.scan_frames():
+          if begin is None:
+            begin, begin_encoding = offset, frame_encoding
+          end = offset + size
+          if end - begin >= self.__chunk_bytes:
+            chunks.append((path, begin, end, begin_encoding))
+            begin = None
+      finally:
+        records.close()
+      if begin is not None:
+        chunks.append((path, begin, end, begin_encoding))
+    return chunks
@@ -109,7 +109,16 @@ class JournalProcessor(object):
 
   Maintains a registry of specialized handlers keyed by the '_type' of entry.
   The handlers are injected from the outside.
+
+  Processors that only care about some types of entries can declare them as
+  wanted_types. Entries of other types are skipped entirely, and navigators
+  that can identify entry types cheaply will not even decode them.
   """
+  @property
+  def wanted_types(self):
+    """The '_type' values to process, or None to process all entries."""
+    return self.__wanted_types
+
   @property
   def handler_registry(self):
     """Registry of callable objects, keyed by "_type", taking the JSON obj."""
@@ -129,16 +138,20 @@ class JournalProcessor(object):
     """
     self.__default_handler = handler if handler else self.handle_unknown
 
-  def __init__(self, registry=None):
+  def __init__(self, registry=None, wanted_types=None):
     """Constructor.
 
     Args:
       registry: [dict] Keyed by string matching the "_type" attribute in the
          journal object read. The values are callable objects that take the
          decoded JSON object from the journal. Return values are ignored.
+      wanted_types: [list of string] If provided then only entries with
+         these "_type" values are processed.
     """
     self.__handler_registry = dict(registry or {})
     self.__default_handler = self.handle_unknown
+    self.__wanted_types = (None if wanted_types is None
+                           else frozenset(wanted_types))
 
   def terminate(self):
     """Terminate the processor (finished processing)."""
@@ -150,8 +163,12 @@ class JournalProcessor(object):
     Args:
       navigator: [JournalNavigator] The journal to process.
     """
+    wanted_types = self.__wanted_types
+    navigator.set_type_filter(wanted_types)
     for obj in navigator:
       entry_type = obj.get('_type')
+      if wanted_types is not None and entry_type not in wanted_types:
+        continue
       handler = (self.__handler_registry.get(entry_type)
                  or self.__default_handler)
       handler(obj)
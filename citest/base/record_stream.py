@@ -13,14 +13,70 @@
 # limitations under the License.
 
 
-"""Implements a frame protocol for writing sized blocks of binary data."""
+"""Implements a frame protocol for writing sized blocks of binary data.
+
+Each frame is a 32-bit length (in network byte order) followed by that many
+bytes of data. Originally the frame data was always the record itself. Streams
+can now start with a header frame declaring how the frames that follow are
+encoded:
+
+   RAW_FRAMES: Each frame is a record.
+   ZLIB_FRAMES: Each frame is an individually zlib-compressed record.
+   ZLIB_BLOCKS: Each frame is a zlib-compressed block containing a sequence
+      of framed records. This compresses better than ZLIB_FRAMES because
+      the compressor can share repeated content across records.
+
+A header frame can also appear later in the stream (e.g. when appending to an
+existing file) to change the encoding of the frames that follow it. Streams
+without a header are RAW_FRAMES. A frame whose data starts with '{' is always
+a raw record, so plain JSON records appended to an encoded stream are still
+readable.
+"""
+import json
 import struct
 import sys
+import zlib
 
 if sys.version_info[0] > 2:
   basestring = str
 
 
+RAW_FRAMES = 'raw'
+ZLIB_FRAMES = 'zlib'
+ZLIB_BLOCKS = 'zlib-block'
+
+# The version of the stream format declared by header frames.
+# Streams without a header are implicitly version 1.
+STREAM_FORMAT_VERSION = 2
+
+# Frame data starting with this prefix is a header frame.
+# The remainder of the frame data is a JSON dictionary.
+_HEADER_PREFIX = b'#citest-journal '
+
+# The number of leading record bytes given to RecordInputStream.next_accepted.
+PEEK_BYTES = 64
+
+# Default uncompressed size of ZLIB_BLOCKS blocks.
+_DEFAULT_BLOCK_SIZE = 256 * 1024
+
+
+def _tell_or_zero(stream):
+  """Returns the current position of the stream, or 0 if not seekable."""
+  try:
+    return stream.tell()
+  except (AttributeError, IOError, OSError):
+    return 0
+
+
+class PartialFrameError(ValueError):
+  """Denotes that the stream ended part way through a frame.
+
+  This is what a crashed writer leaves behind, but is also what a reader
+  sees when it catches up with a writer still writing the frame.
+  """
+  pass
+
+
 class RecordOutputStream(object):
   """Writes data elements to framed stream with 32-bit frame lengths."""
 
@@ -29,30 +85,99 @@ class RecordOutputStream(object):
     """Returns the delegate stream being written to."""
     return self.__stream
 
-  def __init__(self, stream):
+  @property
+  def frame_encoding(self):
+    """Returns the frame encoding or None if no header was written."""
+    return self.__frame_encoding
+
+  @property
+  def offset(self):
+    """Returns the offset at which the next frame will be written.
+
+    Records still pending in a ZLIB_BLOCKS block are not yet accounted for.
+    """
+    return self.__offset
+
+  def __init__(self, stream, frame_encoding=None,
+               block_size=_DEFAULT_BLOCK_SIZE):
     """Constructor.
 
     Args:
       stream: [stream] The stream to write into.
+      frame_encoding: [string] If not None then write a header declaring
+          this encoding (e.g. ZLIB_FRAMES) and encode the frames accordingly.
+      block_size: [int] For ZLIB_BLOCKS, the uncompressed size at which
+          pending records are written out as a block.
     """
+    if frame_encoding not in (None, RAW_FRAMES, ZLIB_FRAMES, ZLIB_BLOCKS):
+      raise ValueError('Unknown frame encoding {0!r}'.format(frame_encoding))
+
     self.__stream = stream
+    self.__frame_encoding = frame_encoding
+    self.__block_size = block_size
+    self.__block = []
+    self.__block_bytes = 0
+    self.__block_count = 0
+    self.__offset = _tell_or_zero(stream)
+    if frame_encoding is not None:
+      header = {'version': STREAM_FORMAT_VERSION,
+                'frame_encoding': frame_encoding}
+      self.__write_frame(_HEADER_PREFIX + str.encode(json.dumps(header)))
 
   def close(self):
     """Closes the delegate stream."""
+    self.flush()
     self.__stream.close()
 
+  def flush(self):
+    """Writes out any records still pending in the current block."""
+    if not self.__block:
+      return
+    data = b''.join(self.__block)
+    self.__block = []
+    self.__block_bytes = 0
+    self.__block_count = 0
+    self.__write_frame(zlib.compress(data))
+
   def append(self, data):
     """Appends a record to the stream.
 
     Args:
       data: [string] The string (array of bytes) to write.
+
+    Returns:
+      The (frame_offset, record_index) position of the record in the stream.
+      The frame_offset is the offset of the frame containing the record,
+      relative to the stream position when this was constructed if the
+      stream is not seekable. The record_index is the index of the record
+      within that frame, which is always 0 unless the frame is a block.
     """
     if not isinstance(data, basestring):
       raise TypeError('{0} is not a string'.format(type(data)))
     encoded_data = str.encode(data)
-    count = len(encoded_data)
-    self.__stream.write(struct.pack('!I', count))
+    if self.__frame_encoding == ZLIB_BLOCKS:
+      # Nothing else is written while a block is pending so the block
+      # will be written at the current offset.
+      position = (self.__offset, self.__block_count)
+      self.__block.append(struct.pack('!I', len(encoded_data)))
+      self.__block.append(encoded_data)
+      self.__block_bytes += 4 + len(encoded_data)
+      self.__block_count += 1
+      if self.__block_bytes >= self.__block_size:
+        self.flush()
+      return position
+
+    if self.__frame_encoding == ZLIB_FRAMES:
+      encoded_data = zlib.compress(encoded_data)
+    position = (self.__offset, 0)
+    self.__write_frame(encoded_data)
+    return position
+
+  def __write_frame(self, encoded_data):
+    """Writes the bytes as a frame into the delegate stream."""
+    self.__stream.write(struct.pack('!I', len(encoded_data)))
     self.__stream.write(encoded_data)
+    self.__offset += 4 + len(encoded_data)
 
 
 class RecordInputStream(object):
@@ -70,6 +195,59 @@ class RecordInputStream(object):
       stream: [stream] The stream to read from.
     """
     self.__stream = stream
+    self.__header = None
+    self.__frame_encoding = RAW_FRAMES
+    self.__block_records = []  # Remaining records in block, reversed.
+    self.__block_offset = None
+    self.__block_index = 0     # Index of the next record in the block.
+    self.__offset = _tell_or_zero(stream)
+    self.__position = None
+
+  @property
+  def header(self):
+    """Returns the most recent header read from the stream, if any."""
+    return self.__header
+
+  @property
+  def frame_encoding(self):
+    """Returns the frame encoding in effect at the current position."""
+    return self.__frame_encoding
+
+  @property
+  def position(self):
+    """Returns the (frame_offset, record_index) of the last record read.
+
+    See RecordOutputStream.append.
+    """
+    return self.__position
+
+  @property
+  def next_position(self):
+    """Returns the (frame_offset, record_index) that will be read next.
+
+    This does not account for header frames that might precede it.
+    """
+    if self.__block_records:
+      return (self.__block_offset, self.__block_index)
+    return (self.__offset, 0)
+
+  def seek(self, position, frame_encoding=None):
+    """Positions the stream to read the record at the given position.
+
+    Args:
+      position: [(int, int)] The (frame_offset, record_index) to read next
+          as previously returned by RecordOutputStream.append or position.
+      frame_encoding: [string] The frame encoding in effect at that position
+          if different from the current encoding.
+    """
+    frame_offset, record_index = position
+    self.__stream.seek(frame_offset)
+    self.__offset = frame_offset
+    self.__block_records = []
+    if frame_encoding is not None:
+      self.__frame_encoding = frame_encoding
+    for _ in range(record_index):
+      self.next()
 
   def __iter__(self):
     """Makes this iterable over the frames."""
@@ -92,16 +270,166 @@ class RecordInputStream(object):
       StopIteration if there are no more records.
       ValueError if the stream is corrupt.
     """
+    return self.next_accepted(None)
+
+  def next_accepted(self, accept, limit=None):
+    """Reads the next record whose leading bytes satisfy a predicate.
+
+    Records that are not accepted are skipped. Where the encoding permits,
+    skipped records are neither copied out of the stream nor decompressed
+    beyond their leading bytes.
+
+    Args:
+      accept: [callable] Given up to the first PEEK_BYTES bytes of a record,
+          returns whether to read that record. None accepts every record.
+      limit: [int] If not None then stop at the first frame beginning at or
+          past this offset rather than reading or skipping it.
+
+    Returns:
+      The next accepted binary string data written into the stream.
+
+    Raises:
+      StopIteration if there are no more records (before the limit).
+      PartialFrameError if the stream ends part way through a frame.
+      ValueError if the stream is otherwise corrupt.
+    """
+    while True:
+      while self.__block_records:
+        self.__position = (self.__block_offset, self.__block_index)
+        self.__block_index += 1
+        value = self.__block_records.pop()
+        if accept is None or accept(value[:PEEK_BYTES]):
+          return bytes.decode(value)
+
+      frame_offset = self.__offset
+      if limit is not None and frame_offset >= limit:
+        raise StopIteration()
+      count = self.__read_frame_size()
+      value = self.__read_bytes(min(count, PEEK_BYTES))
+      if (value.startswith(_HEADER_PREFIX)
+          or self.__frame_encoding == ZLIB_BLOCKS and value[:1] != b'{'):
+        value += self.__read_bytes(count - len(value))
+        if value.startswith(_HEADER_PREFIX):
+          self.__set_header(value[len(_HEADER_PREFIX):])
+        else:
+          self.__block_records = self.__split_block(self.__decompress(value))
+          self.__block_offset = frame_offset
+          self.__block_index = 0
+        continue
+
+      self.__position = (frame_offset, 0)
+      if self.__frame_encoding == RAW_FRAMES or value[:1] == b'{':
+        if accept is None or accept(value):
+          return bytes.decode(value + self.__read_bytes(count - len(value)))
+        self.__skip_bytes(count - len(value))
+        continue
+
+      # ZLIB_FRAMES
+      value += self.__read_bytes(count - len(value))
+      if accept is None:
+        return bytes.decode(self.__decompress(value))
+      try:
+        decompressor = zlib.decompressobj()
+        prefix = decompressor.decompress(value, PEEK_BYTES)
+        if accept(prefix):
+          return bytes.decode(
+              prefix
+              + decompressor.decompress(decompressor.unconsumed_tail)
+              + decompressor.flush())
+      except zlib.error as ex:
+        raise ValueError('Frame is corrupted -- {0}'.format(ex))
+
+  def scan_frames(self):
+    """Iterates over the positions of the remaining frames.
+
+    Only the frame lengths and enough of each frame to recognize headers are
+    read so this is much cheaper than reading the records. Header frames are
+    adopted but not returned.
+
+    Yields:
+      The (frame_offset, frame_size, frame_encoding) of each record frame.
+      The frame_size includes the length prefix.
+    """
+    self.__block_records = []
+    while True:
+      frame_offset = self.__offset
+      try:
+        count = self.__read_frame_size()
+      except StopIteration:
+        return
+      value = self.__read_bytes(min(count, len(_HEADER_PREFIX)))
+      if value == _HEADER_PREFIX:
+        value = self.__read_bytes(count - len(value))
+        self.__set_header(value)
+        continue
+      self.__skip_bytes(count - len(value))
+      yield frame_offset, 4 + count, self.__frame_encoding
+
+  @staticmethod
+  def __decompress(value):
+    """Returns the decompressed frame data."""
+    try:
+      return zlib.decompress(value)
+    except zlib.error as ex:
+      raise ValueError('Frame is corrupted -- {0}'.format(ex))
+
+  def __set_header(self, data):
+    """Adopts the header encoded in the frame data."""
+    header = json.loads(bytes.decode(data))
+    version = header.get('version', 0)
+    if version > STREAM_FORMAT_VERSION:
+      raise ValueError(
+          'Unsupported stream format version {0}'.format(version))
+    frame_encoding = header.get('frame_encoding', RAW_FRAMES)
+    if frame_encoding not in (RAW_FRAMES, ZLIB_FRAMES, ZLIB_BLOCKS):
+      raise ValueError('Unknown frame encoding {0!r}'.format(frame_encoding))
+    self.__header = header
+    self.__frame_encoding = frame_encoding
+
+  @staticmethod
+  def __split_block(block):
+    """Returns the list of record data in a block in reverse order."""
+    records = []
+    offset = 0
+    while offset < len(block):
+      if offset + 4 > len(block):
+        raise ValueError('Block is corrupted -- truncated frame length')
+      count = struct.unpack_from('!I', block, offset)[0]
+      offset += 4
+      if offset + count > len(block):
+        raise ValueError('Block is corrupted -- truncated frame')
+      records.append(block[offset:offset + count])
+      offset += count
+    records.reverse()
+    return records
+
+  def __read_frame_size(self):
+    """Reads the size of the next frame from the stream.
+
+    Raises:
+      StopIteration if there are no more frames.
+      ValueError if the stream is corrupt.
+    """
     size = self.__stream.read(4)
     if len(size) == 0:
       raise StopIteration()
 
     if len(size) != 4:
-      raise ValueError('Frame is corrupted len={0} of 4'.format(len(size)))
+      raise PartialFrameError(
+          'Frame is corrupted len={0} of 4'.format(len(size)))
+    self.__offset += 4
+    return struct.unpack('!I', size)[0]
 
-    count = struct.unpack('!I', size)[0]
+  def __read_bytes(self, count):
+    """Reads the next count bytes of the current frame."""
     value = self.__stream.read(count)
     if len(value) != count:
-      raise ValueError(
+      raise PartialFrameError(
           'Frame is corrupted -- missing {0}'.format(count - len(value)))
-    return bytes.decode(value)
+    self.__offset += count
+    return value
+
+  def __skip_bytes(self, count):
+    """Skips over the next count bytes of the current frame."""
+    self.__offset += count
+    self.__stream.seek(self.__offset)
@@ -64,11 +64,19 @@ import json
 import sys
 import types
 
+from .journal_blobs import BLOB_REFERENCE_KEY
+from .snapshot_budget import PAYLOAD_RELATIONS
+
 if sys.version_info[0] > 2:
   basestring = str
   long = int
 
 
+# The metadata value classes that are used as is.
+_PRIMITIVE_METADATA_CLASSES = frozenset(
+    [str, bool, int, long, float, None.__class__])
+
+
 def _normalize_metadata_value(value):
   """Convert value into an appropriate format to use as metadata.
 
@@ -99,7 +107,9 @@ def _normalize_metadata_kwargs(metadata):
   """
   result = {}
   for key, value in metadata.items():
-    result[key] = _normalize_metadata_value(value)
+    if value.__class__ not in _PRIMITIVE_METADATA_CLASSES:
+      value = _normalize_metadata_value(value)
+    result[key] = value
   return result
 
 
@@ -124,7 +134,15 @@ class JsonSnapshotable(object):
 
 
 class JsonSnapshotableEntity(JsonSnapshotable):
-  """Interface for storing a composite object into a JsonSnapshot."""
+  """Interface for storing a composite object into a JsonSnapshot.
+
+  Classes whose instances always export the same snapshot once constructed
+  can set snapshot_is_immutable so that snapshots sharing entities export
+  each instance only once. See JsonSnapshot.
+  """
+
+  # Whether the snapshot exported by an instance can never change.
+  snapshot_is_immutable = False
 
   def to_snapshot_value(self, snapshot):
     """Convert this instance into the value to write into the snapshot.
@@ -163,6 +181,44 @@ class JsonSnapshotableEntity(JsonSnapshotable):
         self.__class__))
 
 
+class SnapshotRelation(object):
+  """The standard relations that edges can have.
+
+  These are the values of the 'relation' edge annotation described by the
+  module docstring. The values are shared strings so that the many edges in
+  a large snapshot do not each hold their own copy.
+  """
+  # pylint: disable=too-few-public-methods
+  INPUT = 'INPUT'
+  OUTPUT = 'OUTPUT'
+  DATA = 'DATA'
+  ERROR = 'ERROR'
+  MECHANISM = 'MECHANISM'
+  CONTROL = 'CONTROL'
+  VALID = 'VALID'
+  INVALID = 'INVALID'
+
+  ALL = frozenset([INPUT, OUTPUT, DATA, ERROR, MECHANISM, CONTROL,
+                   VALID, INVALID])
+
+
+def _entity_edge_to_json_object(edge):
+  """Serializes an edge to an entity into a object that is json encodable."""
+  result = {'_to': edge.target.id}
+  result.update(edge.metadata)
+  return result
+
+
+def _value_edge_to_json_object(edge):
+  """Serializes an edge to a value into a object that is json encodable."""
+  result = {}
+  value = edge.value
+  if value is not None:
+    result['_value'] = value
+  result.update(edge.metadata)
+  return result
+
+
 class Edge(object):
   """Represents a relationship between entities (an edge in the a graph).
 
@@ -184,9 +240,11 @@ class Edge(object):
      _value: [any] If present then this edge references a  value
         that is an implied entity specifying this value.
      label: The name of the relationship for display purposes.
-     relation: The type of relationship
+     relation: The type of relationship. See SnapshotRelation.
   """
 
+  __slots__ = ['__metadata', '__to_json_object', '__target', '__value']
+
   @property
   def metadata(self):
     """Metadata annotations on the edge.
@@ -206,20 +264,26 @@ class Edge(object):
     """Returns the value."""
     return self.__value
 
-  def __init__(self, _to_json_object, _target=None, _value=None, **metadata):
+  def __init__(self, _to_json_object=None, _target=None, _value=None,
+               **metadata):
     """Constructs the edge.
 
     Args:
       _to_json_object: [obj (Edge)] Converts edge to json object to serialize.
+         If None then the standard serialization for an edge to an entity or
+         value is used.
       _target: [SnapshotEntity] The target entity, or None.
       _value: [SnapshotEntity] The edge value, or None if same as _target.
       metadata: [kwargs] Additional metadata annotations for the edge.
          The keys are determined by the Entity at the source of the edge.
     """
-    self.__metadata = _normalize_metadata_kwargs(metadata)
-    self.__to_json_object = _to_json_object
     if _target is not None and not isinstance(_target, SnapshotEntity):
       raise TypeError('{0} is not SnapshotEntity'.format(_target.__class__))
+    self.__metadata = _normalize_metadata_kwargs(metadata)
+    if _to_json_object is None:
+      _to_json_object = (_value_edge_to_json_object if _target is None
+                         else _entity_edge_to_json_object)
+    self.__to_json_object = _to_json_object
     self.__target = _target
     self.__value = _value if _value is not None else _target
 
@@ -269,6 +333,8 @@ class SnapshotEntity(object):
      class: The class of the original instance that this entity represents.
   """
 
+  __slots__ = ['__id', '__metadata', '__ordered_edges', '__released']
+
   @property
   def id(self):
     """Returns the entity's id."""
@@ -294,7 +360,11 @@ class SnapshotEntity(object):
 
     Each list contains all the edges to a different target entity.
     """
-    return self.__entity_edges.values()
+    entity_edges = {}
+    for edge in self.__ordered_edges:
+      if edge.target is not None:
+        entity_edges.setdefault(edge.target.id, []).append(edge)
+    return entity_edges.values()
 
   def __init__(self, entity_id, **metadata):
     """Constructs an entity.
@@ -307,8 +377,7 @@ class SnapshotEntity(object):
     self.__id = entity_id
     self.__metadata = _normalize_metadata_kwargs(metadata)
     self.__ordered_edges = []
-    self.__entity_edges = {}  # subset that reference entities
-    self.__value_edges = []   # subset that reference values
+    self.__released = False
 
   def add_metadata(self, key, value):
     """Adds a new metadata key.
@@ -317,9 +386,26 @@ class SnapshotEntity(object):
       key: [string] Keys beginning with '_' are reserved for internal use.
       value: [any] The metadata value.
     """
+    self.__check_not_released()
     value = _normalize_metadata_value(value)
     self.__metadata[key] = value
 
+  def release(self):
+    """Drops the entity's contents once they were written elsewhere.
+
+    The entity can still be referenced by id but can no longer be changed.
+    This is used by JsonSnapshot.stream_entities.
+    """
+    self.__released = True
+    self.__metadata = {}
+    self.__ordered_edges = []
+
+  def __check_not_released(self):
+    if self.__released:
+      raise ValueError(
+          'Entity {0} was already written out of the snapshot.'.format(
+              self.__id))
+
   def add_edge(self, edge):
     """Adds an edge that has already been constructed.
 
@@ -337,33 +423,145 @@ class SnapshotEntity(object):
     """
     if not isinstance(edge, Edge):
       raise TypeError('{0} is not an Edge'.format(edge.__class__))
-
-    target = edge.target
-    if target is not None:
-      to_id = edge.target.id
-      if not to_id in self.__entity_edges:
-        self.__entity_edges[to_id] = [edge]
-      else:
-        self.__entity_edges[to_id].append(edge)
-    else:
-      self.__value_edges.append(edge)
+    self.__check_not_released()
     self.__ordered_edges.append(edge)
     return edge
 
   def to_json_object(self):
     """Serializes this entity into a object that is json encodable."""
     result = {'_id': self.__id}
-
-    edges = []
-    for edge in self.edges:
-      edges.append(edge.to_json_object())
-    if edges:
-      result['_edges'] = edges
-
+    if self.__ordered_edges:
+      result['_edges'] = [edge.to_json_object()
+                          for edge in self.__ordered_edges]
     result.update(self.__metadata)
     return result
 
 
+# The classes of values that are their own snapshot value.
+_PRIMITIVE_CLASSES = frozenset(
+    [str, basestring, bool, int, long, float, None.__class__])
+
+# Markers in _SNAPSHOT_VALUE_HANDLERS for classes needing special handling.
+_SNAPSHOTABLE_HANDLER = 'snapshotable'
+_CONTAINER_HANDLER = 'container'
+
+
+def _lambda_to_snapshot_value(value):
+  if sys.version_info[0] > 2:
+    return 'Lambda "{0}"'.format(value.__name__)
+  return 'Lambda "{0}"'.format(value.func_name)
+
+
+def _find_snapshot_value_handler(klass):
+  """Determines how to convert values of the given class into snapshots.
+
+  Returns:
+    A function converting a value of the class, or one of the handler
+    markers, or None if the class cannot be converted.
+  """
+  # pylint: disable=too-many-return-statements
+  if issubclass(klass, JsonSnapshotable):
+    return _SNAPSHOTABLE_HANDLER
+  if issubclass(klass, (basestring, bool, int, long, float, None.__class__)):
+    return lambda value: value
+  if issubclass(klass, SnapshotEntity):
+    # The entity already exists in the snapshot. Presumably this
+    # entity was the result of to_snapshot_value (or in an earlier
+    # call), which wrote the entity into the snapshot so here we merely
+    # need to reference the existing entity within the snapshot.
+    return lambda value: {'_type': 'EntityReference', '_id': value.id}
+  if issubclass(klass, (list, dict)):
+    return _CONTAINER_HANDLER
+  if issubclass(klass, type):
+    return lambda value: 'type ' + value.__name__
+  if issubclass(klass, BaseException):
+    return lambda value: '{0}: {1}'.format(value.__class__.__name__, value)
+  if issubclass(klass, types.MethodType):
+    return lambda value: 'Method "{0}"'.format(value.__name__)
+  if issubclass(klass, types.LambdaType):
+    return _lambda_to_snapshot_value
+  if issubclass(klass, datetime.datetime):
+    return lambda value: value.isoformat()
+  return None
+
+
+# Caches _find_snapshot_value_handler by class as values are converted.
+_SNAPSHOT_VALUE_HANDLERS = {}
+
+
+def _to_snapshot_leaf_value(value, snapshot):
+  """Converts a value into its snapshot value unless it is a container.
+
+  Returns:
+    The converted value and whether it is a list or dict whose elements
+    still need converting.
+  """
+  while True:
+    klass = value.__class__
+    handler = _SNAPSHOT_VALUE_HANDLERS.get(klass)
+    if handler is None:
+      handler = _find_snapshot_value_handler(klass)
+      if handler is None:
+        raise TypeError(
+            '{0} is not implicitly JsonSnapshotable: {1!r}'.format(
+                klass, value))
+      _SNAPSHOT_VALUE_HANDLERS[klass] = handler
+
+    if handler is _CONTAINER_HANDLER:
+      return value, True
+    if handler is not _SNAPSHOTABLE_HANDLER:
+      return handler(value), False
+
+    # Turn value into the snapshot value (which might be an entity
+    # or wrapped value) and continue depending on the new value type.
+    snapshot_value = value.to_snapshot_value(snapshot)
+    if snapshot_value is value:
+      raise TypeError(
+          '{0} is not implicitly JsonSnapshotable: {1!r}'.format(
+              klass, value))
+    value = snapshot_value
+
+
+class _ContainerConversion(object):
+  """Converts the elements of a list or dict into snapshot values.
+
+  The container itself is the result unless an element was changed by
+  the conversion, in which case a new container is made.
+  """
+
+  # pylint: disable=too-few-public-methods
+  __slots__ = ['container', 'keys', 'children', 'index', 'results']
+
+  def __init__(self, container):
+    self.container = container
+    if isinstance(container, dict):
+      self.keys = list(container.keys())
+      self.children = list(container.values())
+    else:
+      self.keys = None
+      self.children = container
+    self.index = 0
+    self.results = None  # The converted elements once any were changed.
+
+  def add_result(self, converted):
+    """Records the converted value of the element at index."""
+    if self.results is None:
+      if converted is self.children[self.index]:
+        self.index += 1
+        return
+      self.results = list(self.children[:self.index])
+    self.results.append(converted)
+    self.index += 1
+
+  def finish(self):
+    """Returns the converted container."""
+    if self.results is None:
+      return self.container
+    if self.keys is None:
+      return self.results
+    return dict(zip(self.keys, self.results))
+
+
 class JsonSnapshotHelper(object):
   """Helper class for implementing JsonSnapshotable."""
 
@@ -376,57 +574,42 @@ class JsonSnapshotHelper(object):
     However lists and dictionaries may reference other entities that need
     to be snapshotted. For example references to other entities, or other
     object types that need to be converted.
+
+    Lists and dictionaries are walked iteratively so deeply nested values
+    do not exhaust the stack. Those whose contents need no conversion are
+    returned as is rather than copied.
     """
     # pylint: disable=invalid-name
-    # pylint: disable=unused-argument
-    # pylint: disable=too-many-return-statements
-
-    if isinstance(value, JsonSnapshotable):
-      # Turn value into the snapshot value (which might be an entity
-      # or wrapped value) and continue the method depending on the new
-      # value type returned.
-      value = value.to_snapshot_value(snapshot)
-
-    if isinstance(value, (basestring, bool, int, long, float, None.__class__)):
+    value, is_container = _to_snapshot_leaf_value(value, snapshot)
+    if not is_container:
       return value
 
-    if isinstance(value, SnapshotEntity):
-      # The entity already exists in the snapshot. Presumably this
-      # entity was the result of to_snapshot_value above (or in an earlier
-      # call), which wrote the entity into the snapshot so here we merely
-      # need to reference the existing entity within the snapshot.
-      return {'_type': 'EntityReference', '_id': value.id}
-
-    if isinstance(value, list):
-      return [cls.ToJsonSnapshotValue(elem, snapshot) for elem in value]
-
-    if isinstance(value, dict):
-      result = {}
-      for name, elem in value.items():
-        result[name] = cls.ToJsonSnapshotValue(elem, snapshot)
-      return result
-
-    if isinstance(value, type):
-      return 'type ' + value.__name__
-
-    if isinstance(value, BaseException):
-      return '{0}: {1}'.format(value.__class__.__name__, value)
-
-    if isinstance(value, types.MethodType):
-      return 'Method "{0}"'.format(value.__name__)
-
-    if isinstance(value, types.LambdaType):
-      if sys.version_info[0] > 2:
-        return 'Lambda "{0}"'.format(value.__name__)
+    stack = [_ContainerConversion(value)]
+    while stack:
+      frame = stack[-1]
+      children = frame.children
+      for index in range(frame.index, len(children)):
+        child = children[index]
+        klass = child.__class__
+        if klass in _PRIMITIVE_CLASSES:
+          if frame.results is not None:
+            frame.results.append(child)
+          continue
+        frame.index = index
+        if klass is dict or klass is list:
+          stack.append(_ContainerConversion(child))
+          break
+        converted, is_container = _to_snapshot_leaf_value(child, snapshot)
+        if is_container:
+          stack.append(_ContainerConversion(converted))
+          break
+        frame.add_result(converted)
       else:
-        return 'Lambda "{0}"'.format(value.func_name)
-
-    if isinstance(value, datetime.datetime):
-      return value.isoformat()
-
-    raise TypeError(
-        '{0} is not implicitly JsonSnapshotable: {1!r}'.format(
-            value.__class__, value))
+        stack.pop()
+        result = frame.finish()
+        if stack:
+          stack[-1].add_result(result)
+    return result
 
   @staticmethod
   def AssertExpectedValue(expect, have, msg=None):
@@ -538,29 +721,20 @@ class JsonSnapshotEdgeBuilder(object):
       return self.__new_entity_edge(_value, label=_label, **metadata)
 
     value = self.__value_helper.ToJsonSnapshotValue(_value, self.__snapshot)
+    if metadata.get('relation') in PAYLOAD_RELATIONS:
+      value, limit_metadata = self.__snapshot.limit_payload(value)
+      metadata.update(limit_metadata)
     return self.__new_value_edge(value, label=_label, **metadata)
 
   @staticmethod
   def  __new_entity_edge(_entity, **metadata):
-    def to_json_object(edge):
-      """Serializes the edge into a object that is json encodable."""
-      result = {}
-      result['_to'] = edge.target.id
-      result.update(edge.metadata)
-      return result
-    return Edge(_target=_entity, _to_json_object=to_json_object, **metadata)
+    return Edge(_to_json_object=_entity_edge_to_json_object,
+                _target=_entity, **metadata)
 
   @staticmethod
   def  __new_value_edge(_value, **metadata):
-    def to_json_object(edge):
-      """Serializes the edge into a object that is json encodable."""
-      result = {}
-      if _value is not None:
-        result['_value'] = _value
-      if edge.metadata:
-        result.update(edge.metadata)
-      return result
-    return Edge(_value=_value, _to_json_object=to_json_object, **metadata)
+    return Edge(_to_json_object=_value_edge_to_json_object,
+                _value=_value, **metadata)
 
   def make(self, _from, _label, _value, **metadata):
     """Creates a new directional edge from |_from| to |_value|.
@@ -578,35 +752,43 @@ class JsonSnapshotEdgeBuilder(object):
 
   def make_input(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='INPUT', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.INPUT,
+                      **metadata))
 
   def make_output(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='OUTPUT', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.OUTPUT,
+                      **metadata))
 
   def make_mechanism(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='MECHANISM', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.MECHANISM,
+                      **metadata))
 
   def make_control(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='CONTROL', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.CONTROL,
+                      **metadata))
 
   def make_data(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='DATA', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.DATA,
+                      **metadata))
 
   def make_error(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='ERROR', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.ERROR,
+                      **metadata))
 
   def make_valid(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='VALID', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.VALID,
+                      **metadata))
 
   def make_invalid(self, _from, _label, _value, **metadata):
     return _from.add_edge(
-        self.new_edge(_label, _value, relation='INVALID', **metadata))
+        self.new_edge(_label, _value, relation=SnapshotRelation.INVALID,
+                      **metadata))
 
   @staticmethod
   def object_count_to_summary(obj, subject='object', plural=None):
@@ -631,7 +813,7 @@ class JsonSnapshotEdgeBuilder(object):
   @staticmethod
   def determine_valid_relation(is_valid):
     """Return specific relation name depending on validity of the value."""
-    return 'VALID' if is_valid else 'INVALID'
+    return SnapshotRelation.VALID if is_valid else SnapshotRelation.INVALID
 
 
 class JsonSnapshot(object):
@@ -684,8 +866,17 @@ class JsonSnapshot(object):
     """Constructs snapshot.
 
     Args:
+      _payload_budget: [SnapshotPayloadBudget] If provided then limits the
+          size of the payloads on DATA and OUTPUT edges. See snapshot_budget.
+      _shared_entities: [SharedEntityCache] If provided then immutable
+          objects are exported into shared entity graphs referenced by
+          placeholder entities. See journal_blobs.
       metadata: [kwargs] Metadata to associate with the snapshot.
     """
+    self.__payload_budget = metadata.pop('_payload_budget', None)
+    self.__shared_entities = metadata.pop('_shared_entities', None)
+    self.__exported_mutable = False
+    self.__payload_bytes = 0
     self.__last_id = 0
     self.__entities = {}
     self.__snapshotable_entities = {}
@@ -693,6 +884,11 @@ class JsonSnapshot(object):
     self.__subject_entity = None
     self.__edge_builder = JsonSnapshotEdgeBuilder(self)
 
+    # When streaming, the function to write completed entities with
+    # and the ids of the entities not yet written, in creation order.
+    self.__entity_writer = None
+    self.__unwritten_ids = []
+
   def add_metadata(self, key, value):
     """Adds a new metadata key.
 
@@ -703,6 +899,23 @@ class JsonSnapshot(object):
     value = _normalize_metadata_value(value)
     self.__metadata[key] = value
 
+  def limit_payload(self, value):
+    """Applies the snapshot's payload budget to a DATA or OUTPUT value.
+
+    Args:
+      value: [any] The JSON snapshot value for the edge.
+
+    Returns:
+      The value to put on the edge and a dictionary of additional edge
+      metadata describing any truncation.
+    """
+    if self.__payload_budget is None:
+      return value, {}
+    value, size, metadata = self.__payload_budget.limit_payload(
+        value, self.__payload_bytes)
+    self.__payload_bytes += size
+    return value, metadata
+
   def add_object(self, snapshotable_entity):
     """Adds snapshotable data into the snapshot.
 
@@ -719,6 +932,41 @@ class JsonSnapshot(object):
     """
     self.make_entity_for_object_summary(snapshotable_entity)
 
+  def stream_entities(self, writer):
+    """Writes entities out of the snapshot as they are completed.
+
+    This lets large snapshots be serialized without holding all the
+    entities in memory at once. An entity is considered complete once the
+    export of the snapshotable object it was made for returns. Any entities
+    created during that export are considered part of it so are completed
+    along with it. Other entities are written by flush_entities.
+
+    Once written, entities are released so can only be referenced. They are
+    no longer returned by get_entity or included in to_json_object.
+
+    Args:
+      writer: [callable] Called with each completed SnapshotEntity.
+    """
+    self.__entity_writer = writer
+
+  def flush_entities(self):
+    """Writes out all the remaining entities when streaming them."""
+    self.__write_entities_from(0)
+
+  def __write_entities_from(self, mark):
+    """Writes out the entities created since mark when streaming them.
+
+    Args:
+      mark: [int] The index into the unwritten ids to write from.
+    """
+    if self.__entity_writer is None:
+      return
+    for entity_id in self.__unwritten_ids[mark:]:
+      entity = self.__entities.pop(entity_id)
+      self.__entity_writer(entity)
+      entity.release()
+    del self.__unwritten_ids[mark:]
+
   def make_entity_for_object(self, snapshotable):
     """Returns a possibly shared node for |snapshotable|.
 
@@ -732,11 +980,55 @@ class JsonSnapshot(object):
           '{0} is not JsonSnapshotable'.format(snapshotable.__class__))
 
     entity = self.find_entity_for_object(snapshotable)
-    if entity is None:
-      entity = self.new_entity()
-      entity.add_metadata('class', snapshotable.__class__)
-      self.__snapshotable_entities[id(snapshotable)] = entity
-      snapshotable.export_to_json_snapshot(self, entity)
+    if entity is not None:
+      return entity
+
+    mark = len(self.__unwritten_ids)
+    if (self.__shared_entities is not None
+        and getattr(snapshotable, 'snapshot_is_immutable', False)):
+      entity = self.__make_shared_entity(snapshotable)
+    else:
+      entity = self.__export_new_entity(snapshotable)
+    self.__write_entities_from(mark)
+    return entity
+
+  def __export_new_entity(self, snapshotable):
+    """Returns a new entity that snapshotable was exported into."""
+    if not getattr(snapshotable, 'snapshot_is_immutable', False):
+      self.__exported_mutable = True
+    entity = self.new_entity()
+    entity.add_metadata('class', snapshotable.__class__)
+    self.__snapshotable_entities[id(snapshotable)] = entity
+    snapshotable.export_to_json_snapshot(self, entity)
+    return entity
+
+  def __make_shared_entity(self, snapshotable):
+    """Returns a placeholder entity for the shared graph of snapshotable.
+
+    The graph is exported into its own snapshot the first time that
+    snapshotable is seen, then reused. Graphs that contain mutable objects,
+    such as a predicate that can still be appended to, are exported each
+    time since they may have changed. They are still only written once.
+    """
+    digest = self.__shared_entities.get_digest(snapshotable)
+    if digest is None:
+      graph = JsonSnapshot(_shared_entities=self.__shared_entities,
+                           _payload_budget=self.__payload_budget)
+      self.__shared_entities.begin_graph()
+      try:
+        graph.__export_new_entity(snapshotable)
+      except:
+        self.__shared_entities.abort_graph()
+        raise
+      if graph.__exported_mutable:
+        self.__exported_mutable = True
+      digest = self.__shared_entities.add(
+          snapshotable, graph.to_json_object(),
+          reusable=not graph.__exported_mutable)
+
+    entity = self.new_entity()
+    entity.add_metadata(BLOB_REFERENCE_KEY, digest)
+    self.__snapshotable_entities[id(snapshotable)] = entity
     return entity
 
   def make_entity_for_object_summary(self, snapshotable):
@@ -753,10 +1045,14 @@ class JsonSnapshot(object):
 
     entity = self.find_entity_for_object_summary(snapshotable)
     if entity is None:
+      mark = len(self.__unwritten_ids)
+      if not getattr(snapshotable, 'snapshot_is_immutable', False):
+        self.__exported_mutable = True
       entity = self.new_entity()
       entity.add_metadata('class', snapshotable.__class__)
       self.__snapshotable_entities['s_{0}'.format(id(snapshotable))] = entity
       snapshotable.export_summary_to_json_snapshot(self, entity)
+      self.__write_entities_from(mark)
     return entity
 
   def new_entity(self, **metadata):
@@ -768,6 +1064,8 @@ class JsonSnapshot(object):
     self.__last_id += 1
     entity = SnapshotEntity(entity_id=self.__last_id, **metadata)
     self.__entities[self.__last_id] = entity
+    if self.__entity_writer is not None:
+      self.__unwritten_ids.append(self.__last_id)
     if self.__subject_entity is None:
       self.__subject_entity = entity
     return entity
@@ -801,15 +1099,19 @@ class JsonSnapshot(object):
       entity_id: [any]  The id comes from previously allocated entity.
 
     Raises:
-      KeyError if the entity_id was not known.
+      KeyError if the entity_id was not known or was already streamed out.
     """
     return self.__entities[entity_id]
 
   def to_json_object(self):
-    """Serializes this snapshot into a object that is json encodable."""
+    """Serializes this snapshot into a object that is json encodable.
+
+    Entities that were already streamed out are not included.
+    """
     result = {'_type': 'JsonSnapshot'}
-    if self.__entities:
+    if self.__subject_entity is not None:
       result['_subject_id'] = self.__subject_entity.id
+    if self.__entities:
       entities = {}
       for key, entity in self.__entities.items():
         entities[key] = entity.to_json_object()
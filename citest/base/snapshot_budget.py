@@ -0,0 +1,164 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Implements size budgets for the payloads held by snapshots.
+
+DATA and OUTPUT edges often hold entire HTTP bodies, command output or
+observed lists. A SnapshotPayloadBudget bounds how much of these payloads
+a JsonSnapshot holds. Payloads over budget are replaced by a preview of
+their head and tail, and the edge is annotated with:
+   _truncated: [bool] True.
+   _original_size: [int] The size of the payload's encoding.
+   _digest: [string] The SHA-256 hex digest of the payload's encoding.
+   _payload_path: [string] If the payload was spilled into a sidecar file,
+      the path to that file relative to the parent of the spill directory.
+
+The size of a payload is the number of bytes in the UTF-8 encoding of a
+string, or of the compact JSON encoding of other values. Payloads that reference snapshot entities are
+never truncated since the references are only meaningful in the snapshot.
+"""
+
+import errno
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+if sys.version_info[0] > 2:
+  basestring = str
+
+
+# The edge relations whose values are subject to the budget.
+PAYLOAD_RELATIONS = frozenset(['DATA', 'OUTPUT'])
+
+_COMPACT_ENCODER = json.JSONEncoder(separators=(',', ':'))
+_ENTITY_REFERENCE = '"_type":"EntityReference"'
+
+
+class SnapshotPayloadBudget(object):
+  """Specifies how much payload data snapshots may hold.
+
+  A budget is only configuration, so one instance can be shared by all the
+  snapshots in a journal. Each JsonSnapshot keeps track of its own usage.
+  """
+
+  @property
+  def edge_bytes(self):
+    """The most bytes a single payload may have, or 0 for no limit."""
+    return self.__edge_bytes
+
+  @property
+  def snapshot_bytes(self):
+    """The most payload bytes a single snapshot may have, or 0 for no limit."""
+    return self.__snapshot_bytes
+
+  @property
+  def spill_dir(self):
+    """The directory that full payloads are written into, if any."""
+    return self.__spill_dir
+
+  def __init__(self, edge_bytes=0, snapshot_bytes=0, preview_bytes=1024,
+               spill_dir=None):
+    """Constructor.
+
+    Args:
+      edge_bytes: [int] If positive then the largest payload on an edge.
+      snapshot_bytes: [int] If positive then the largest total of payloads
+          within a snapshot. Payloads beyond this are truncated.
+      preview_bytes: [int] The size of the preview replacing a payload.
+      spill_dir: [string] If not None then write each truncated payload in
+          full into a file in this directory, named after its digest. The
+          directory is typically placed alongside the journal so that
+          reports can link to the payloads.
+    """
+    self.__edge_bytes = edge_bytes or 0
+    self.__snapshot_bytes = snapshot_bytes or 0
+    self.__preview_bytes = preview_bytes
+    self.__spill_dir = spill_dir
+
+  def limit_payload(self, value, used_bytes):
+    """Applies the budget to a payload.
+
+    Args:
+      value: [any] The JSON snapshot value of a DATA or OUTPUT edge.
+      used_bytes: [int] The payload bytes the snapshot already holds.
+
+    Returns:
+      A tuple of the value to store, the number of bytes it adds to the
+      snapshot, and a dictionary of metadata to add to the edge. The
+      metadata is empty if the value is within budget.
+    """
+    if isinstance(value, basestring):
+      text = value
+    else:
+      text = _COMPACT_ENCODER.encode(value)
+    data = text.encode('utf-8')
+    size = len(data)
+
+    # None means there is no limit; 0 means the snapshot budget is used up.
+    limit = self.__edge_bytes or None
+    if self.__snapshot_bytes:
+      remaining = max(self.__snapshot_bytes - used_bytes, 0)
+      limit = remaining if limit is None else min(limit, remaining)
+    if (limit is None or size <= max(limit, self.__preview_bytes)
+        or _ENTITY_REFERENCE in text):
+      return value, size, {}
+
+    digest = hashlib.sha256(data).hexdigest()
+    metadata = {'_truncated': True, '_original_size': size, '_digest': digest}
+    if self.__spill_dir is not None:
+      metadata['_payload_path'] = self.__spill(
+          data, digest, isinstance(value, basestring))
+    preview = self.make_preview(text)
+    return preview, len(preview.encode('utf-8')), metadata
+
+  def make_preview(self, text):
+    """Returns the head and tail of text within the preview size.
+
+    The head and tail are cut on byte boundaries, dropping any character
+    that the cut splits.
+    """
+    data = text.encode('utf-8')
+    half = self.__preview_bytes // 2
+    head = data[:half]
+    tail = data[len(data) - half:] if half else b''
+    return u'{head}\n... [{omitted} bytes omitted] ...\n{tail}'.format(
+        head=head.decode('utf-8', 'ignore'),
+        omitted=len(data) - len(head) - len(tail),
+        tail=tail.decode('utf-8', 'ignore'))
+
+  def __spill(self, data, digest, is_text):
+    """Writes a payload into the spill directory unless already there.
+
+    Several threads may spill at once, so each writes its own temporary
+    file and renames it into place.
+
+    Returns:
+      The path of the payload relative to the parent of the spill directory.
+    """
+    name = '{0}.{1}'.format(digest, 'txt' if is_text else 'json')
+    path = os.path.join(self.__spill_dir, name)
+    if not os.path.exists(path):
+      try:
+        os.makedirs(self.__spill_dir)
+      except OSError as ex:
+        if ex.errno != errno.EEXIST:
+          raise
+      fd, tmp_path = tempfile.mkstemp(dir=self.__spill_dir, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as stream:
+        stream.write(data)
+      os.rename(tmp_path, path)
+    return os.path.join(os.path.basename(os.path.normpath(self.__spill_dir)),
+                        name)
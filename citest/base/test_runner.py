@@ -37,13 +37,14 @@ import os.path
 import re
 import stat
 import sys
+import time
 import unittest
 
 # Our modules.
 from . import global_journal
 from . import args_util
 from .bindings import ConfigurationBindingsBuilder
-from .snapshot import JsonSnapshotableEntity
+from .snapshot import JsonSnapshotableEntity, SnapshotRelation
 
 # If a -log_config is not provided, then use this.
 _DEFAULT_LOG_CONFIG = """{
@@ -91,11 +92,11 @@ class TestResultSnapshotableEntity(JsonSnapshotableEntity):
   def default_relation(self):
     """Overall status relation."""
     if self.__result.errors:
-      return 'ERROR'
+      return SnapshotRelation.ERROR
     if self.__result.failures:
-      return 'INVALID'
+      return SnapshotRelation.INVALID
     if self.__result.testsRun - len(self.__result.skipped):
-      return 'VALID'
+      return SnapshotRelation.VALID
     return None
 
   def __init__(self, result):
@@ -126,9 +127,9 @@ class TestResultSnapshotableEntity(JsonSnapshotableEntity):
       snapshot.edge_builder.make_valid(entity, 'OK', num_ok)
     maybe_add_list('Skipped', num_skipped, self.__result.skipped)
     maybe_add_list('Failures', num_failures, self.__result.failures,
-                   relation='INVALID')
+                   relation=SnapshotRelation.INVALID)
     maybe_add_list('Errors', num_errors, self.__result.errors,
-                   relation='ERROR')
+                   relation=SnapshotRelation.ERROR)
     entity.add_metadata('_default_relation', self.default_relation)
       
 
@@ -314,6 +315,17 @@ class TestRunner(object):
     self._terminate_and_flush_journal()
     return len(result.failures) + len(result.errors)
 
+  @staticmethod
+  def __flush_log_handlers():
+    """Flushes the handlers of all the loggers."""
+    loggers = [logging.getLogger()]
+    loggers.extend(logger
+                   for logger in list(logging.root.manager.loggerDict.values())
+                   if isinstance(logger, logging.Logger))
+    for logger in loggers:
+      for handler in logger.handlers:
+        handler.flush()
+
   def _terminate_and_flush_journal(self):
     """Helper function to supress when testing.
 
@@ -325,6 +337,10 @@ class TestRunner(object):
     """
     logger = logging.getLogger(__name__)
     if self.__journal:
+      # Flush the log handlers first so that any records they are holding
+      # back, such as collapsed repeats, are written into the journal.
+      self.__flush_log_handlers()
+
       # Terminate the journal to close and flush the file.
       # Unbind the global journal so it is no longer referencing here.
       if global_journal.get_global_journal() == self.__journal:
@@ -408,7 +424,9 @@ class TestRunner(object):
         ' be substituted. Otherwise this is a standard python logging'
         ' configuration schema as described in'
         ' https://docs.python.org/2/library/logging.config.html'
-        '#logging-config-dictschema')
+        '#logging-config-dictschema. The citest.base.JournalLogHandler'
+        ' handler also accepts journal_levels, journal_rate_limits and'
+        ' collapse_repeats to sample what is journaled.')
 
   def start_logging(self):
     """Setup default logging from the citest.base.log_config parameter."""
@@ -496,6 +514,20 @@ class TestRunner(object):
                                defaults=init_defaults)
     self.__bindings = self.__bindings_builder.build()
     self.start_logging()
+    self.prefetch_bindings()
+
+  def prefetch_bindings(self):
+    """Computes the prefetchable lazy bindings before the tests run.
+
+    This pays the latency of slow lazy initializers concurrently, once,
+    rather than one at a time in the middle of the tests needing them.
+    """
+    logger = logging.getLogger(__name__)
+    start = time.time()
+    keys = self.__bindings.prefetch_lazy_initializers()
+    if keys:
+      logger.info('Prefetched bindings %s in %.3f secs',
+                  ', '.join(keys), time.time() - start)
 
   def _cleanup(self):
     """Helper function when running a suite for cleaning up the global context.
@@ -21,6 +21,7 @@ from .gcp_contract import GcpContractBuilder
 from citest.base import (
     ExecutionContext,
     JournalLogger,
+    SnapshotRelation,
     get_global_journal)
 
 from citest.json_predicate import (
@@ -201,12 +202,13 @@ def verify_quota(title, gcp_agent, project_quota, regions):
   execution_context = ExecutionContext()
   contract = make_quota_contract(gcp_agent, project_quota, regions)
   verify_results = None
-  context_relation = 'ERROR'
+  context_relation = SnapshotRelation.ERROR
 
   try:
     JournalLogger.begin_context(title)
     verify_results = contract.verify(execution_context)
-    context_relation = 'VALID' if verify_results else 'INVALID'
+    context_relation = (SnapshotRelation.VALID if verify_results
+                        else SnapshotRelation.INVALID)
   finally:
     if verify_results is not None:
       journal = get_global_journal()
@@ -28,6 +28,7 @@ import time
 
 from citest.base import JournalLogger
 from citest.base import JsonSnapshotableEntity
+from citest.base import SnapshotRelation
 import citest.json_predicate.predicate as predicate
 from . import observer as ob
 from . import observation_verifier as ov
@@ -168,12 +169,13 @@ class ContractClause(predicate.ValuePredicate):
     JournalLogger.begin_context(
         'Verifying ContractClause: {0}'.format(self.__title))
 
-    context_relation = 'ERROR'
+    context_relation = SnapshotRelation.ERROR
     try:
       JournalLogger.delegate("store", self, _title='Clause Specification')
 
       result = self.__do_verify(context)
-      context_relation = 'VALID' if result else 'INVALID'
+      context_relation = (SnapshotRelation.VALID if result
+                          else SnapshotRelation.INVALID)
     finally:
       JournalLogger.end_context(relation=context_relation)
     return result
@@ -23,6 +23,7 @@ and calls the delegate with the attribute value rather than the Observation.
 
 import logging
 
+from citest.base import SnapshotRelation
 from citest.json_predicate import (
     PredicateResult,
     ValuePredicate,
@@ -77,7 +78,8 @@ class ObservationPredicateResult(PredicateResult):
         entity, 'Observation', self.__observation)
     snapshot.edge_builder.make(
         entity, 'Result', self.__pred_result,
-        relation=('VALID' if self.__pred_result.valid else 'INVALID'))
+        relation=(SnapshotRelation.VALID if self.__pred_result.valid
+                  else SnapshotRelation.INVALID))
     super(ObservationPredicateResult, self).export_to_json_snapshot(
         snapshot, entity)
 
@@ -108,6 +110,12 @@ class NotObservationPredicate(ObservationPredicate):
   def __call__(self, context, value):
     return self.__pred(context, value)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(NotObservationPredicate):
+      return super(NotObservationPredicate, self).is_valid(context, value)
+    return self.__pred.is_valid(context, value)
+
   def __str__(self):
     return str(self.__pred)
 
@@ -196,6 +204,15 @@ class ObservationValuePredicate(ObservationPredicate):
         pred_result.valid, observation,
         pred=self.__pred, pred_result=pred_result)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(ObservationValuePredicate):
+      return super(ObservationValuePredicate, self).is_valid(context, value)
+    observation = value
+    if observation.errors:
+      return False
+    return self.__pred.is_valid(context, observation.objects)
+
   def export_to_json_snapshot(self, snapshot, entity):
     """Implements JsonSnapshotableEntity interface."""
     snapshot.edge_builder.make_control(entity, 'Predicate', self.__pred)
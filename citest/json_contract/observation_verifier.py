@@ -19,9 +19,13 @@
 import logging
 
 from citest.base import JsonSnapshotableEntity
+from citest.base import SnapshotRelation
 import citest.json_predicate.map_predicate as map_predicate
 import citest.json_predicate.predicate as predicate
 from citest.json_predicate.logic_predicate import NOT
+from citest.json_predicate.path_predicate import (
+    PATH_VALUE_INDEX_KEY,
+    PathValueIndex)
 
 from . import observation_predicate as op
 
@@ -237,11 +241,11 @@ class ObservationVerifyResult(predicate.PredicateResult):
     if self.__good_results != []:
       edge = builder.make(entity, 'Good Results', self.__good_results)
       if self.__good_results:
-        edge.add_metadata('relation', 'VALID')
+        edge.add_metadata('relation', SnapshotRelation.VALID)
     if self.__bad_results != []:
       edge = builder.make(entity, 'Bad Results', self.__bad_results)
       if self.__bad_results:
-        edge.add_metadata('relation', 'INVALID')
+        edge.add_metadata('relation', SnapshotRelation.INVALID)
 
   def __str__(self):
     return ('{0} Observed {1} good and {2} bad with {3} failed constraints.'
@@ -339,6 +343,9 @@ class ObservationVerifier(predicate.ValuePredicate):
   def __call__(self, context, observation):
     """Verify the observation.
 
+    The verifiers share a PathValueIndex over the observation so that each
+    path is only traced once through the observed objects.
+
     Args:
       observation: The observation to verify.
       context: The execution context containing additional runtime data
@@ -347,6 +354,43 @@ class ObservationVerifier(predicate.ValuePredicate):
     Returns:
       ObservationVerifyResult containing the verification results.
     """
+    return self.__apply_with_path_value_index(
+        self.__verify, context, observation)
+
+  def is_valid(self, context, observation):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(ObservationVerifier):
+      return super(ObservationVerifier, self).is_valid(context, observation)
+    return self.__apply_with_path_value_index(
+        self.__is_valid, context, observation)
+
+  def __apply_with_path_value_index(self, func, context, observation):
+    """Calls func(context, observation) with a PathValueIndex installed.
+
+    An index already installed by an enclosing verifier is reused.
+    """
+    if context.get(PATH_VALUE_INDEX_KEY, None) is not None:
+      return func(context, observation)
+
+    context.set_internal(PATH_VALUE_INDEX_KEY, PathValueIndex())
+    try:
+      return func(context, observation)
+    finally:
+      context.clear_key(PATH_VALUE_INDEX_KEY)
+
+  def __is_valid(self, context, observation):
+    """Helper function determining the validity of observation for is_valid."""
+    if not self.__dnf_verifiers:
+      logging.getLogger(__name__).warn(
+          'No verifiers were set, so "%s" will pass by default.', self.title)
+      return True
+
+    # Outer terms are or'd together; inner terms are and'd together.
+    return any(all(v.is_valid(context, observation) for v in term)
+               for term in self.__dnf_verifiers)
+
+  def __verify(self, context, observation):
+    """Helper function verifying the observation for __call__."""
     builder = ObservationVerifyResultBuilder(observation)
     if not self.__dnf_verifiers:
       logging.getLogger(__name__).warn(
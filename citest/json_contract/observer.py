@@ -17,6 +17,7 @@
 
 
 from citest.base import JsonSnapshotableEntity
+from citest.base import SnapshotRelation
 
 class Observation(JsonSnapshotableEntity):
   """Tracks details for ObjectObserver and ObservationVerifier."""
@@ -40,7 +41,7 @@ class Observation(JsonSnapshotableEntity):
     builder = snapshot.edge_builder
     edge = builder.make(entity, 'Errors', self.__errors)
     if self.__errors:
-      edge.add_metadata('relation', 'ERROR')
+      edge.add_metadata('relation', SnapshotRelation.ERROR)
     builder.make_data(entity, 'Objects', self.__objects,
                       format='json',
                       summary=builder.object_count_to_summary(self.__objects))
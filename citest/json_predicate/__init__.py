@@ -64,7 +64,9 @@ from .path_predicate_result import (
 
 from .path_predicate import (
     DONT_ENUMERATE_TERMINAL,
-    PathPredicate)
+    PATH_VALUE_INDEX_KEY,
+    PathPredicate,
+    PathValueIndex)
 
 from .path_transforms import (
     FieldDifference)
@@ -62,6 +62,36 @@ class DictSubsetPredicate(BinaryPredicate):
     operand = self.eval_context_operand(context)
     return self._is_subset(context, value, '', operand, value)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(DictSubsetPredicate):
+      return super(DictSubsetPredicate, self).is_valid(context, value)
+    if not isinstance(value, dict):
+      return False
+    operand = self.eval_context_operand(context)
+    return self._is_valid_subset(context, operand, value)
+
+  def _is_valid_subset(self, context, a, b):
+    """Determine if |a| is a subset of |b| without explaining why not.
+
+    This has the same outcome as _is_subset.
+    """
+    # pylint: disable=invalid-name
+    for name, a_value in a.items():
+      if name not in b:
+        return False
+      b_value = b[name]
+      if isinstance(b_value, dict):
+        if not self._is_valid_subset(context, a_value, b_value):
+          return False
+      elif isinstance(b_value, list):
+        elem_pred = LIST_SUBSET if isinstance(a_value, list) else CONTAINS
+        if not elem_pred(a_value).is_valid(context, b_value):
+          return False
+      elif context.eval(a_value) != b_value:
+        return False
+    return True
+
   def _is_subset(self, context, source, path, a, b):
     """Determine if |a| is a subset of |b|.
 
@@ -135,6 +165,135 @@ class DictSubsetPredicate(BinaryPredicate):
         path_value=PathValue(path, b), valid=True)
 
 
+def _freeze_json(value):
+  """Returns a hashable value equal to the frozen form of equal JSON values.
+
+  Raises:
+    TypeError if the value is not hashable and not a dict or list.
+  """
+  if isinstance(value, dict):
+    return (_FROZEN_DICT_TAG,
+            frozenset((key, _freeze_json(elem)) for key, elem in value.items()))
+  if isinstance(value, list):
+    return (_FROZEN_LIST_TAG, tuple(_freeze_json(elem) for elem in value))
+  hash(value)
+  return value
+
+# Distinguish frozen dicts and lists from tuples and sets within values.
+_FROZEN_DICT_TAG = object()
+_FROZEN_LIST_TAG = object()
+
+
+class _ListMemberIndex(object):
+  """Finds the elements in a list that are equal to or supersets of values.
+
+  Elements are hashed by their frozen JSON value to look up members. Dicts
+  are hashed by the value of a key field in the subset being looked up so
+  only those with the same value need to be compared. The indexes are built
+  when first needed.
+  """
+
+  def __init__(self, context, the_list):
+    """Constructor.
+
+    Args:
+      context: [ExecutionContext] The context to compare values within.
+      the_list: [list] The list of elements to look up values in.
+    """
+    self.__context = context
+    self.__list = the_list
+    self.__evaluated_list = None
+    self.__frozen_members = None
+    self.__unhashable_members = None
+    self.__key_indexes = {}
+
+  def __evaluate_list(self):
+    """Returns the list elements evaluated within the context."""
+    if self.__evaluated_list is None:
+      self.__evaluated_list = self.__context.eval(self.__list)
+    return self.__evaluated_list
+
+  def has_member(self, value):
+    """Determine if an element of the evaluated list is equal to value."""
+    if self.__frozen_members is None:
+      self.__frozen_members = set()
+      self.__unhashable_members = []
+      for elem in self.__evaluate_list():
+        try:
+          self.__frozen_members.add(_freeze_json(elem))
+        except TypeError:
+          self.__unhashable_members.append(elem)
+
+    try:
+      frozen = _freeze_json(value)
+    except TypeError:
+      return value in self.__evaluate_list()
+    return (frozen in self.__frozen_members
+            or value in self.__unhashable_members)
+
+  def has_list_superset(self, value):
+    """Determine if an element is a list that value is a subset of."""
+    pred = LIST_SUBSET(value)
+    for elem in self.__list:
+      if isinstance(elem, list) and pred.is_valid(self.__context, elem):
+        return True
+    return False
+
+  def has_dict_superset(self, value):
+    """Determine if an element is a dict that value is a subset of."""
+    pred = DICT_SUBSET(value)
+    operand = pred.eval_context_operand(self.__context)
+    for elem in self.__find_dict_candidates(operand):
+      # pylint: disable=protected-access
+      if pred._is_valid_subset(self.__context, operand, elem):
+        return True
+    return False
+
+  def __find_dict_candidates(self, operand):
+    """Returns the dict elements that could be supersets of operand."""
+    for key, value in operand.items():
+      if isinstance(value, (dict, list)):
+        continue
+      try:
+        hash(value)
+      except TypeError:
+        continue
+      buckets, others = self.__get_key_index(key)
+      return buckets.get(value, []) + others
+
+    return [elem for elem in self.__list if isinstance(elem, dict)]
+
+  def __get_key_index(self, key):
+    """Returns the index of dict elements by their value for key.
+
+    Returns:
+      A tuple of the dict of elements keyed by their hashable scalar value
+      for the key, and the list of elements whose value for the key is
+      not such a value. Elements without the key are not indexed.
+    """
+    index = self.__key_indexes.get(key)
+    if index is not None:
+      return index
+
+    buckets = {}
+    others = []
+    for elem in self.__list:
+      if not isinstance(elem, dict) or key not in elem:
+        continue
+      value = elem[key]
+      if isinstance(value, (dict, list)):
+        others.append(elem)
+        continue
+      try:
+        buckets.setdefault(value, []).append(elem)
+      except TypeError:
+        others.append(elem)
+
+    index = (buckets, others)
+    self.__key_indexes[key] = index
+    return index
+
+
 class _BaseListMembershipPredicate(BinaryPredicate):
   """Implements binary predicate comparison predicate for list membership."""
   # pylint: disable=abstract-method
@@ -161,25 +320,31 @@ class _BaseListMembershipPredicate(BinaryPredicate):
            and the value is a subset of a member of the list.
       False otherwise.
     """
-    if self.__strict or isinstance(elem, (int, long, float, basestring)):
-      return elem in context.eval(the_list)
+    return self._verify_indexed_elem(
+        context, elem, _ListMemberIndex(context, the_list))
 
-    if self.__strict:
-      return False
+  def _verify_all_elems(self, context, elems, the_list):
+    """Verify if each of |elems| is in |the_list|.
+
+    This is the same as calling _verify_elem on each of the elems, but
+    only indexes |the_list| once.
+    """
+    index = _ListMemberIndex(context, the_list)
+    for elem in elems:
+      if not self._verify_indexed_elem(context, elem, index):
+        return False
+    return True
+
+  def _verify_indexed_elem(self, context, elem, index):
+    """Implements _verify_elem using a _ListMemberIndex of the list."""
+    if self.__strict or isinstance(elem, (int, long, float, basestring)):
+      return index.has_member(elem)
 
-    pred = None
     if isinstance(elem, list):
-      pred = LIST_SUBSET(elem)
+      return index.has_list_superset(elem)
     elif isinstance(elem, dict):
-      pred = DICT_SUBSET(elem)
-    else:
-      raise TypeError('Unhandled type {0}'.format(elem.__class__))
-
-    for value in the_list:
-      if pred(context, value):
-        return True
-
-    return False
+      return index.has_dict_superset(elem)
+    raise TypeError('Unhandled type {0}'.format(elem.__class__))
 
 
 class ListSimilarPredicate(_BaseListMembershipPredicate):
@@ -200,21 +365,11 @@ class ListSimilarPredicate(_BaseListMembershipPredicate):
     # However dictionary elements cannot be compared to sort.
     # So we'll look both lists to be subsets of one another since subset
     # checks are already implemented.
-    for elem in self.eval_context_operand(context):
-      if not self._verify_elem(context, elem, the_list=value):
-        return PathValueResult(pred=self, valid=False,
-                               path_value=PathValue('', value),
-                               source=value, target_path='')
-
-    for elem in value:
-      if not self._verify_elem(context, elem,
-                               the_list=self.eval_context_operand(context)):
-        return PathValueResult(pred=self, valid=False,
-                               path_value=PathValue('', value),
-                               source=value, target_path='')
-
+    operand = self.eval_context_operand(context)
+    valid = (self._verify_all_elems(context, operand, the_list=value)
+             and self._verify_all_elems(context, value, the_list=operand))
     return PathValueResult(
-        pred=self, valid=True, path_value=PathValue('', value),
+        pred=self, valid=valid, path_value=PathValue('', value),
         source=value, target_path='')
 
 
@@ -232,14 +387,10 @@ class ListSubsetPredicate(_BaseListMembershipPredicate):
     if not isinstance(value, list):
       return TypeMismatchError(list, value.__class__, value)
 
-    for elem in self.eval_context_operand(context):
-      if not self._verify_elem(context, elem, the_list=value):
-        return PathValueResult(pred=self, valid=False,
-                               path_value=PathValue('', value),
-                               source=value, target_path='')
-
+    valid = self._verify_all_elems(
+        context, self.eval_context_operand(context), the_list=value)
     return PathValueResult(
-        pred=self, valid=True, path_value=PathValue('', value),
+        pred=self, valid=valid, path_value=PathValue('', value),
         source=value, target_path='')
 
 
@@ -302,6 +453,23 @@ class ContainsPredicate(BinaryPredicate):
                            source=value, target_path='',
                            path_value=PathValue('', bad_values))
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(ContainsPredicate):
+      return super(ContainsPredicate, self).is_valid(context, value)
+    if isinstance(value, basestring):
+      return STR_SUBSTR(self.operand).is_valid(context, value)
+    if isinstance(value, dict):
+      return DICT_SUBSET(self.operand).is_valid(context, value)
+    if isinstance(value, int or long or float):
+      return NUM_EQ(self.operand).is_valid(context, value)
+    if not isinstance(value, list):
+      raise NotImplementedError(
+          'Unhandled value class {0}'.format(value.__class__))
+    if isinstance(self.operand, list):
+      return LIST_SUBSET(self.operand).is_valid(context, value)
+    return any(self.is_valid(context, elem) for elem in value)
+
 
 class EquivalentPredicate(BinaryPredicate):
   """Specifies a predicate that expects the value and operand are "equal".
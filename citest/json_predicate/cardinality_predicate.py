@@ -293,3 +293,30 @@ class CardinalityPredicate(predicate.ValuePredicate,
 
     return result_type(valid=valid, cardinality_pred=self,
                        path_pred_result=collected_result)
+
+  def is_valid(self, context, obj):
+    """Implements ValuePredicate interface.
+
+    Unlike __call__, this stops looking for values once there are enough to
+    decide the outcome, such as any value when max is 0 or min values when
+    there is no max.
+    """
+    if self._specializes_call(CardinalityPredicate):
+      return super(CardinalityPredicate, self).is_valid(context, obj)
+
+    the_max = context.eval(self.__max)
+    the_min = context.eval(self.__min)
+
+    # Only count as many values as it takes to decide the outcome.
+    if the_max is None:
+      limit = max(the_min, 1)
+    elif the_max == 0:
+      limit = 1
+    else:
+      limit = the_max + 1
+    count = self.__path_pred.count_valid_values(context, obj, limit=limit)
+    if not count:
+      return the_max == 0
+    return (the_max != 0
+            and count >= the_min
+            and (the_max is None or count <= the_max))
@@ -22,6 +22,9 @@ from .sequenced_predicate_result import SequencedPredicateResult
 class ConjunctivePredicate(ValuePredicate):
   """A ValuePredicate that calls a sequence of predicates until one fails."""
 
+  # append() can still change the conjunction.
+  snapshot_is_immutable = False
+
   @property
   def predicates(self):
     """The list of predicates that are ANDed together."""
@@ -62,10 +65,22 @@ class ConjunctivePredicate(ValuePredicate):
     return SequencedPredicateResult(
         valid=valid, pred=self, results=everything)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(ConjunctivePredicate):
+      return super(ConjunctivePredicate, self).is_valid(context, value)
+    for pred in self.__conjunction:
+      if not pred.is_valid(context, value):
+        return False
+    return True
+
 
 class DisjunctivePredicate(ValuePredicate):
   """A ValuePredicate that calls a sequence of predicates until one succeeds."""
 
+  # append() can still change the disjunction.
+  snapshot_is_immutable = False
+
   @property
   def predicates(self):
     """The list of predicates that are ORed together."""
@@ -106,6 +121,15 @@ class DisjunctivePredicate(ValuePredicate):
     return SequencedPredicateResult(
         valid=valid, pred=self, results=everything)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(DisjunctivePredicate):
+      return super(DisjunctivePredicate, self).is_valid(context, value)
+    for pred in self.__disjunction:
+      if pred.is_valid(context, value):
+        return True
+    return False
+
 
 class NegationPredicate(ValuePredicate):
   """A ValuePredicate that negates another predicate."""
@@ -138,6 +162,12 @@ class NegationPredicate(ValuePredicate):
     return SequencedPredicateResult(
         valid=not base_result.valid, pred=self, results=[base_result])
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(NegationPredicate):
+      return super(NegationPredicate, self).is_valid(context, value)
+    return not self.__pred.is_valid(context, value)
+
 
 class ConditionalPredicate(ValuePredicate):
   """A ValuePredicate that implements IF/THEN.
@@ -227,6 +257,16 @@ class ConditionalPredicate(ValuePredicate):
     return SequencedPredicateResult(
         valid=result.valid, pred=self, results=tried)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(ConditionalPredicate):
+      return super(ConditionalPredicate, self).is_valid(context, value)
+    if self.__demorgan_pred:
+      return self.__demorgan_pred.is_valid(context, value)
+    if self.__if_pred.is_valid(context, value):
+      return self.__then_pred.is_valid(context, value)
+    return self.__else_pred.is_valid(context, value)
+
 
 AND = ConjunctivePredicate
 OR = DisjunctivePredicate
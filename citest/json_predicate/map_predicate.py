@@ -18,6 +18,7 @@
 import collections
 
 from citest.base import JsonSnapshotableEntity
+from citest.base import SnapshotRelation
 from .sequenced_predicate_result import SequencedPredicateResult
 from . import predicate
 
@@ -130,13 +131,13 @@ class MapPredicateResult(SequencedPredicateResult):
                         summary=builder.object_count_to_summary(
                             self.__good_map, subject='valid mapping'))
     if self.__good_map:
-      edge.add_metadata('relation', 'VALID')
+      edge.add_metadata('relation', SnapshotRelation.VALID)
     edge = builder.make(entity, 'Bad Mappings',
                         func(self.__bad_map),
                         summary=builder.object_count_to_summary(
                             self.__bad_map, subject='invalid mapping'))
     if self.__bad_map:
-      edge.add_metadata('relation', 'INVALID')
+      edge.add_metadata('relation', SnapshotRelation.INVALID)
     super(MapPredicateResult, self).export_to_json_snapshot(snapshot, entity)
 
   def __init__(self, valid, pred, obj_list, all_results,
@@ -248,6 +249,26 @@ class MapPredicate(predicate.ValuePredicate):
         good_map=good_map,
         bad_map=bad_map)
 
+  def is_valid(self, context, obj):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(MapPredicate):
+      return super(MapPredicate, self).is_valid(context, obj)
+
+    if not isinstance(obj, list) and obj != None:
+      obj_list = [obj]
+    else:
+      obj_list = obj or []
+
+    good_count = 0
+    for elem in obj_list:
+      if self.__pred.is_valid(context, elem):
+        good_count += 1
+
+    the_min = context.eval(self.__min)
+    the_max = context.eval(self.__max)
+    return not (the_min != None and good_count < the_min
+                or the_max != None and good_count > the_max)
+
   def export_to_json_snapshot(self, snapshot, entity):
     """Implements JsonSnapshotableEntity interface."""
     builder = snapshot.edge_builder
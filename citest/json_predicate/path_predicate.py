@@ -78,11 +78,6 @@ from .path_result import (
     IndexBoundsError)
 
 
-# An internal data structure used to queue path values as we navigate.
-_QueueElement = collections.namedtuple('QueueElem',
-                                       ['path_offset', 'path_value'])
-
-
 # Terminal used to mean dont enumerate the value if it is a list
 DONT_ENUMERATE_TERMINAL = '@'
 
@@ -97,125 +92,193 @@ _SEGMENT_RE = re.compile(r'\{0}?([^\{0}\{1}\[]+)'.format(
     PATH_SEP, DONT_ENUMERATE_TERMINAL))
 
 
-def _process_dict_element(elem, target_path):
-  """Helper function for processing dictionary objects in the queue.
+# The kinds of steps taken from a dictionary within a compiled path.
+_FIELD_STEP = 'field'            # Continue with the value of a field.
+_TERMINAL_DICT_STEP = 'terminal'  # The path ends with the dictionary itself.
+_INDEX_MISMATCH_STEP = 'index'    # The path indexes into the dictionary.
 
-  Args:
-    elem: [_QueueElement] Element to process has a list value.
-    target_path: [string] The desired path we were looking for.
+# The ExecutionContext internal key holding the PathValueIndex, if any.
+PATH_VALUE_INDEX_KEY = '_path_value_index'
 
-  Returns:
-    array of _QueueElement
-  """
-  path_offset = elem.path_offset
-  from_path_value = elem.path_value
-
-  # The value of the path to this point is the end of the trace.
-  base_path = from_path_value.path
-  source = from_path_value.value
-
-  # Continue tracing from this object to the path remainder.
-  # Determine the next path segment we are looking for.
-  match = _INDEX_RE.search(target_path, path_offset)
-  if match is not None and match.start(0) == path_offset:
-    return TypeMismatchError(list, dict, source, target_path, from_path_value)
-  match = _SEGMENT_RE.search(target_path, path_offset)
-  if match is None:
-    next_offset = len(target_path)
-    next_segment = target_path[path_offset:]
-
-    if path_offset == next_offset - 1 and next_segment == PATH_SEP:
-      # Terminal enumerated dict is just itself.
-      return [_QueueElement(next_offset, from_path_value)], []
-  else:
-    next_offset = match.end(0)
-    next_segment = match.groups(0)[0]
-
-  # Add the segment to the path to this value.
-  # This is not strictly the path up to the next offset
-  # because we might be decorating the path (e.g. array indexes taken).
-  if not base_path:
-    value_path = next_segment
-  else:
-    value_path = PATH_SEP.join([base_path, next_segment])
-
-  # Get the segment value, if any.
-  value = source.get(next_segment, None)
-  if value is None:
-    return (
-        [],
-        [MissingPathError(source, next_segment, path_value=from_path_value)])
-
-  return ([_QueueElement(next_offset, PathValue(value_path, value))], [])
-
-
-def _process_list_element(elem, target_path):
-  """Helper function for processing list objects in the queue.
-
-  Args:
-    elem: [_QueueElement] Element to process has a list value.
-    target_path: [string] The desired path we were looking for.
-
-  Returns:
-    array of _QueueElement
+# The most compiled paths to cache before starting over.
+_MAX_COMPILED_PATHS = 1024
+_COMPILED_PATHS = {}
+
+
+class _CompiledPath(object):
+  """A path parsed into the steps to take from each offset within it.
+
+  A path is traversed breadth-first from the root value. Where the traversal
+  goes next only depends on the offset reached within the path and whether
+  the value there is a dict, list or something else, so the steps for each
+  offset are determined once up front.
   """
-  path_offset = elem.path_offset
-  from_path_value = elem.path_value
+  # pylint: disable=too-few-public-methods
+  __slots__ = ['__path', '__dict_steps', '__list_steps', '__remainders']
+
+  def __init__(self, path):
+    """Constructor.
+
+    Args:
+      path: [string] The path to compile, without any terminal specifier.
+    """
+    self.__path = path
+
+    # (kind, next_offset, segment) to take from dicts at each offset.
+    self.__dict_steps = []
+
+    # (index, next_offset) to take from lists at each offset.
+    # An index of None means that all the elements are taken.
+    self.__list_steps = []
+
+    # The path remaining at each offset, to report missing from other values.
+    self.__remainders = []
+
+    for offset in range(len(path)):
+      self.__dict_steps.append(self.__compile_dict_step(offset))
+      self.__list_steps.append(self.__compile_list_step(offset))
+      self.__remainders.append(
+          path[offset + 1:] if path[offset] == PATH_SEP else path[offset:])
 
-  # The value of the path to this point is the end of the trace.
-  base_path = from_path_value.path
-  source = from_path_value.value
+  def __compile_dict_step(self, offset):
+    """Determines the step to take from a dict at the given offset."""
+    path = self.__path
+    match = _INDEX_RE.search(path, offset)
+    if match is not None and match.start(0) == offset:
+      return _INDEX_MISMATCH_STEP, None, None
 
-  filter_index = None
-  match = _INDEX_RE.search(target_path, path_offset)
-  if match is not None and match.start(0) == path_offset:
-    filter_index = int(match.groups(0)[0])
-    if filter_index >= len(source):
-      return [], [IndexBoundsError(filter_index, list,
-                                   target_path=target_path[path_offset:],
-                                   path_value=from_path_value)]
+    match = _SEGMENT_RE.search(path, offset)
+    if match is not None:
+      return _FIELD_STEP, match.end(0), match.group(1)
 
-    path_offset = match.end(0)
+    if offset == len(path) - 1 and path[offset] == PATH_SEP:
+      return _TERMINAL_DICT_STEP, len(path), None
+    return _FIELD_STEP, len(path), path[offset:]
+
+  def __compile_list_step(self, offset):
+    """Determines the step to take from a list at the given offset."""
+    match = _INDEX_RE.search(self.__path, offset)
+    if match is not None and match.start(0) == offset:
+      return int(match.group(1)), match.end(0)
+    return None, offset
+
+  def trace(self, root):
+    """Collects the values at the end of the path.
+
+    Args:
+      root: [PathValue] The value to start from.
+
+    Returns:
+      A tuple of the list of PathValue found at the end of the path and the
+      list of PathResult failures for the paths that could not be followed,
+      both in breadth-first order.
+    """
+    end = len(self.__path)
+    dict_steps = self.__dict_steps
+    list_steps = self.__list_steps
+    found = []
+    failures = []
+    queue = collections.deque([(0, root)])
+    while queue:
+      offset, path_value = queue.popleft()
+      if offset >= end:
+        found.append(path_value)
+        continue
+
+      value = path_value.value
+      if isinstance(value, dict):
+        kind, next_offset, segment = dict_steps[offset]
+        if kind is _FIELD_STEP:
+          field_value = value.get(segment, None)
+          if field_value is None:
+            failures.append(
+                MissingPathError(value, segment, path_value=path_value))
+          else:
+            base_path = path_value.path
+            queue.append((next_offset, PathValue(
+                base_path + PATH_SEP + segment if base_path else segment,
+                field_value)))
+        elif kind is _TERMINAL_DICT_STEP:
+          queue.append((next_offset, path_value))
+        else:
+          failures.append(
+              TypeMismatchError(list, dict, value, self.__path, path_value))
+
+      elif isinstance(value, list):
+        index, next_offset = list_steps[offset]
+        if index is None:
+          queue.extend([(next_offset, elem)
+                        for elem in _enumerate_list(path_value)])
+        elif index < len(value):
+          queue.append((next_offset, PathValue(
+              '{0}[{1}]'.format(path_value.path, index), value[index])))
+        else:
+          failures.append(
+              IndexBoundsError(index, list,
+                               target_path=self.__path[offset:],
+                               path_value=path_value))
+
+      else:
+        failures.append(
+            MissingPathError(value, self.__remainders[offset],
+                             path_value=path_value))
 
-  # Try to follow the path from each of the objects in the list.
-  candidates = []
-  fails = []
-  for index, value in enumerate(source):
-    if filter_index is not None and index != filter_index:
-      continue
+    return found, failures
 
-    elem_path = '{0}[{1}]'.format(base_path, index)
-    candidates.append(
-        _QueueElement(path_offset, PathValue(elem_path, value)))
 
-  return candidates, fails
+def _compile_path(path):
+  """Returns the _CompiledPath for the given path."""
+  compiled = _COMPILED_PATHS.get(path)
+  if compiled is None:
+    if len(_COMPILED_PATHS) >= _MAX_COMPILED_PATHS:
+      _COMPILED_PATHS.clear()
+    compiled = _CompiledPath(path)
+    _COMPILED_PATHS[path] = compiled
+  return compiled
 
 
-def _process_queue_element(top, target_path):
-  """Determine all the next values in the given path for the queue element.
+class PathValueIndex(object):
+  """Remembers the values found along paths through source values.
 
-  Args:
-    top: [_QueueElement] The queue element to process.
-    target_path: [string] The original desired path.
+  An index is shared by the PathPredicates applied to the same values, such
+  as the objects of an Observation being verified, so that each path is only
+  traced once through each source. PathPredicates use the index found in
+  their ExecutionContext under PATH_VALUE_INDEX_KEY, if any.
 
-  Returns:
-    array of _QueueElement
+  Sources are identified by their id, and are held by the index so that the
+  ids remain unique. They must not be modified while the index is in use.
   """
 
-  if isinstance(top.path_value.value, dict):
-    return _process_dict_element(top, target_path)
+  def __init__(self):
+    """Constructor."""
+    self.__traces = {}   # The trace keyed by (id(source), path).
+    self.__sources = {}  # The sources keyed by their id.
 
-  if isinstance(top.path_value.value, list):
-    return _process_list_element(top, target_path)
+  def trace(self, source, path):
+    """Returns the values and failures found along a path through source.
 
-  source = top.path_value.value
-  path_offset = top.path_offset
-  if target_path[path_offset] == PATH_SEP:
-    path_offset += 1
+    Args:
+      source: [dict or list] The JSON value the path is relative to.
+      path: [string] The path without any terminal specifier.
+
+    Returns:
+      A tuple of the list of PathValue found at the end of the path and the
+      list of PathResult failures. These must not be modified.
+    """
+    key = (id(source), path)
+    found = self.__traces.get(key)
+    if found is None:
+      found = _compile_path(path).trace(PathValue('', source))
+      self.__sources[id(source)] = source
+      self.__traces[key] = found
+    return found
 
-  return ([],
-          [MissingPathError(source, target_path[path_offset:],
-                            path_value=top.path_value)])
+
+def _enumerate_list(path_value):
+  """Returns the PathValue of each element of a list PathValue."""
+  base_path = path_value.path + '['
+  return [PathValue(base_path + str(index) + ']', elem)
+          for index, elem in enumerate(path_value.value)]
 
 
 class ProducesPathPredicateResult(object):
@@ -314,71 +377,110 @@ class PathPredicate(ValuePredicate, ProducesPathPredicateResult):
         (i.e. pred(lookup(source, path)))
     """
 
-    path = context.eval(self.__path)
-
     builder = PathPredicateResultBuilder(pred=self.source_pred, source=source)
+    path_values, failures, enumerate_terminal = self.__trace(context, source)
+    builder.add_all_path_failures(failures)
+    return self.__add_path_values_to_builder(
+        context, builder, path_values, enumerate_terminal)
+
+  def is_valid(self, context, source):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(PathPredicate):
+      return super(PathPredicate, self).is_valid(context, source)
+    return self.count_valid_values(context, source, limit=1) > 0
+
+  def count_valid_values(self, context, source, limit=None):
+    """Counts the values along the path that satisfy the bound predicate.
+
+    This is the number of path_values in the result of calling the
+    predicate, but without building the result.
+
+    Args:
+      context: [ExecutionContext] The evaluation context.
+      source: [obj] JSON object to lookup within.
+      limit: [int] If not None then stop counting once this many are found.
+
+    Returns:
+      The number of valid values found, up to the limit.
+    """
+    path_values, _, enumerate_terminal = self.__trace(context, source)
+    count = 0
+    for path_value in path_values:
+      if enumerate_terminal and isinstance(path_value.value, list):
+        candidates = path_value.value
+      else:
+        candidates = [path_value.value]
+
+      for value in candidates:
+        if self.__pred is not None:
+          if self.__transform:
+            value = self.__transform(context, value)
+          if not self.__pred.is_valid(context, value):
+            continue
+        count += 1
+        if count == limit:
+          return count
+    return count
+
+  def __trace(self, context, source):
+    """Helper method finding the values at the end of the path.
+
+    Returns:
+      A tuple of the list of PathValue at the end of the path, the list of
+      failures for the paths that could not be followed, and whether
+      list values at the end of the path are to be enumerated.
+    """
+    path = context.eval(self.__path)
     enumerate_terminal = self.__enumerate_terminals
     if path and path[-1] in (PATH_SEP, DONT_ENUMERATE_TERMINAL):
       enumerate_terminal = path[-1] != DONT_ENUMERATE_TERMINAL
       path = path[:-1]
 
-    queue = [_QueueElement(0, PathValue('', source))]
+    root = PathValue('', source)
     if not path and not (enumerate_terminal and isinstance(source, list)):
-      return self.__add_queue_to_builder(
-          context, builder, queue, enumerate_terminal)
+      return [root], [], enumerate_terminal
 
-    final_queue = []
-    while queue:
-      top = queue.pop(0)
-      if top.path_offset >= len(path):
-        final_queue.append(top)
-        continue
+    index = context.get(PATH_VALUE_INDEX_KEY, None)
+    if index is not None and isinstance(source, (dict, list)):
+      path_values, failures = index.trace(source, path)
+    else:
+      path_values, failures = _compile_path(path).trace(root)
+    return path_values, failures, enumerate_terminal
 
-      candidates, fails = _process_queue_element(top, path)
-      queue.extend(candidates)
-      builder.add_all_path_failures(fails)
-
-    return self.__add_queue_to_builder(
-        context, builder, final_queue, enumerate_terminal)
-
-  def __add_queue_to_builder(
-      self, context, builder, final_queue, enumerate_terminal):
-    """Helper method for processing the final candidates from the queue.
+  def __add_path_values_to_builder(
+      self, context, builder, path_values, enumerate_terminal):
+    """Helper method for processing the final candidates from the path.
 
     Apply the filter bound to this predicate, if any, to determine whether
     each of the final candidates should be kept or rejected.
 
     Args:
       builder: [PathPredicateResultBuilder] To add the results into.
-      final_queue: [list of _QueueElement] The final candidate values.
-      enumerate_terminal: [bool] If true, then list values in the queue
+      path_values: [list of PathValue] The final candidate values.
+      enumerate_terminal: [bool] If true, then list values in path_values
          should be enumerated (one level) into individual elements.
 
     Returns:
       PathPredicateResult
     """
-    for elem in final_queue:
-      value = elem.path_value.value
-      if enumerate_terminal and isinstance(value, list):
-        candidates, fails = _process_queue_element(elem, self.__path)
+    for path_value in path_values:
+      if enumerate_terminal and isinstance(path_value.value, list):
         # We're already at the end point, so there is no more path based
-        # filtering to do. The above step would have just expanded out
-        # the list elements into individual elements, which should never
-        # fail.
-        assert len(fails) == 0
+        # filtering to do. Just expand the list into its elements.
+        candidates = _enumerate_list(path_value)
       else:
-        candidates = [elem]
+        candidates = [path_value]
 
       if self.__pred is None:
         for trial in candidates:
           if self.__transform:
-            xformed = self.__transform(context, trial.path_value.value)
-            transformed_path_value = PathValue(trial.path_value.path, xformed)
+            xformed = self.__transform(context, trial.value)
+            transformed_path_value = PathValue(trial.path, xformed)
           else:
-            transformed_path_value = trial.path_value
+            transformed_path_value = trial
 
           builder.add_result_candidate(
-              trial.path_value,
+              trial,
               PathValueResult(source=builder.source,
                               target_path=transformed_path_value.path,
                               path_value=transformed_path_value,
@@ -386,8 +488,7 @@ class PathPredicate(ValuePredicate, ProducesPathPredicateResult):
                               pred=None))
 
       else:
-        for trial in candidates:
-          path_value = trial.path_value
+        for path_value in candidates:
           if self.__transform:
             xformed = self.__transform(context, path_value.value)
           else:
@@ -27,9 +27,16 @@ class ValuePredicate(JsonSnapshotableEntity):
 
    The intent of this class is to check if a JSON object contains fields
    with particular values, ranges or other properties.
+
+   Predicates are not changed once constructed so their snapshots can be
+   shared among the snapshots that reference them. Predicates that can be
+   changed, such as those with an append method, set snapshot_is_immutable
+   to False.
   """
   # pylint: disable=too-few-public-methods
 
+  snapshot_is_immutable = True
+
   def __call__(self, context, value):
     """Apply this predicate against the provided value.
 
@@ -44,6 +51,31 @@ class ValuePredicate(JsonSnapshotableEntity):
         '__call__() needs to be specialized for {0}'.format(
             self.__class__.__name__))
 
+  def is_valid(self, context, value):
+    """Determine whether this predicate holds for the provided value.
+
+    This is equivalent to bool(self(context, value)), but predicates can
+    specialize it to avoid building the PredicateResult explaining why.
+    It is used where only the outcome matters, such as attempts to verify
+    a contract clause that are going to be retried.
+
+    Args:
+      context: The evaluation context to consider within.
+      value: The value to consider.
+
+    Returns:
+      True if the value is valid, False if not.
+    """
+    return bool(self(context, value))
+
+  def _specializes_call(self, klass):
+    """Determine whether this instance's class overrides klass.__call__.
+
+    Specialized is_valid methods use this to defer to the base class
+    implementation for derived classes that change __call__ but not is_valid.
+    """
+    return self.__class__.__call__ != klass.__call__
+
   def __str__(self):
     return self.__class__.__name__
 
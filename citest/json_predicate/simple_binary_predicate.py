@@ -57,6 +57,15 @@ class SimpleBinaryPredicate(BinaryPredicate):
     return PathValueResult(pred=self, source=value, target_path='',
                            path_value=PathValue('', value), valid=valid)
 
+  def is_valid(self, context, value):
+    """Implements ValuePredicate interface."""
+    if self._specializes_call(SimpleBinaryPredicate):
+      return super(SimpleBinaryPredicate, self).is_valid(context, value)
+    operand = self.eval_context_operand(context)
+    if self.operand_type and not isinstance(value, self.operand_type):
+      return False
+    return bool(self.__comparison_op(value, operand))
+
 
 class SimpleBinaryPredicateFactory(object):
   """Create a SimpleBinaryPredicate once we have an operand to bind to it."""
@@ -34,5 +34,9 @@ from .html_renderer import HtmlRenderer
 # them to debug tests (in a TextRenderer).
 from .dump_renderer import DumpRenderer
 
+# The Trace renderer translates journal contexts into trace events that
+# can be loaded into trace viewers such as chrome://tracing or Perfetto.
+from .trace_renderer import TraceEventRenderer
+
 # Top level function for converting a journal into HTML.
 from .generate_html_report import journal_to_html
@@ -138,6 +138,8 @@ class DumpRenderer(JournalProcessor):
       if '_value' in edge.keys():
         kind = '_value'
         value = edge['_value']
+        if edge.get('_truncated'):
+          kind = '_value(truncated from {0})'.format(edge.get('_original_size'))
       elif '_to' in edge.keys():
         kind = '_to'
         value = edge['_to']
@@ -51,6 +51,8 @@ except ImportError:
 
 from citest.base import (
     JournalProcessor,
+    MergedJournalNavigator,
+    ParallelJournalNavigator,
     StreamJournalNavigator
 )
 
@@ -261,21 +263,16 @@ class JournalTimeExtractor(JournalProcessor):
     """Returns list of TestRecord for all the extracted tests."""
     return self.__tests
 
-  def __ignore(self, _):
-    """Ignores entry in journal."""
-    pass
-
   def __init__(self):
     registry = {
-        'JsonSnapshot': self.__ignore,
         'JournalContextControl': self.handle_context_control,
-        'JournalMessage': self.__ignore
     }
     self.__in_test = None
     self.__tests = []
     self.__context_stack = []
     self.__timestamp = 0
-    super(JournalTimeExtractor, self).__init__(registry=registry)
+    super(JournalTimeExtractor, self).__init__(
+        registry=registry, wanted_types=registry.keys())
 
   def __handle_begin_context(self, control):
     self.__context_stack.append(control)
@@ -315,11 +312,15 @@ class JournalTimeExtractor(JournalProcessor):
                                control=control))
 
 
-def extract_times(input_path, config_tags):
+def extract_times(input_path, config_tags, decode_processes=0):
   """Extract time from path."""
   print('Processing %s' % input_path)
   journal_name = os.path.splitext(os.path.basename(input_path))[0]
-  navigator = StreamJournalNavigator.new_from_path(input_path)
+  if decode_processes > 0:
+    navigator = ParallelJournalNavigator.new_from_path(
+        input_path, processes=decode_processes)
+  else:
+    navigator = StreamJournalNavigator.new_from_path(input_path)
   processor = JournalTimeExtractor()
   processor.process(navigator)
 
@@ -330,6 +331,25 @@ def extract_times(input_path, config_tags):
   }
 
 
+def extract_merged_times(input_paths, config_tags):
+  """Extract time from several journals as if they were one suite.
+
+  Args:
+    input_paths: [list of string] The journals written by a parallel run.
+    config_tags: [dict] The config tags for the summary.
+  """
+  print('Processing %s' % ', '.join(input_paths))
+  navigator = MergedJournalNavigator.new_from_paths(input_paths)
+  processor = JournalTimeExtractor()
+  processor.process(navigator)
+
+  return {
+      'config': config_tags,
+      'suite': navigator.journal_name,
+      'tests': [test.to_dict() for test in processor.tests]
+  }
+
+
 def write_to_console(summaries):
   """Write the summaries to stdout."""
   encoder = json.JSONEncoder(indent=2, separators=(',', ': '))
@@ -425,6 +445,12 @@ def main(args):
                       help='branch the journal was produced from.')
   parser.add_argument('--execution_id',
                       help='execution id for test run (jenkins build number).')
+  parser.add_argument('--decode_processes', default=0, type=int,
+                      help='Decode each journal using this many worker'
+                      ' processes. 0 decodes within this process.')
+  parser.add_argument('--merge', default=False, action='store_true',
+                      help='Summarize the journals as one suite, such as the'
+                      ' journals written by the processes of a parallel run.')
 
   options = parser.parse_args(args)
   config_tags = {}
@@ -436,8 +462,12 @@ def main(args):
     config_tags['execution_id'] = options.execution_id
 
   summaries = []
-  for path in options.journals:
-    summaries.append(extract_times(path, config_tags))
+  if options.merge:
+    summaries.append(extract_merged_times(options.journals, config_tags))
+  else:
+    for path in options.journals:
+      summaries.append(extract_times(
+          path, config_tags, decode_processes=options.decode_processes))
 
   emit = True
   if options.output_path:
@@ -26,6 +26,9 @@ files.
 
 To only generate an index file, invoke with --nohtml.
 To only generate the HTML files, invoke with --noindex.
+
+Journals written by the processes of a parallel run can instead be merged
+into one combined HTML file with --merged_html=<path>.
 """
 
 import argparse
@@ -33,14 +36,17 @@ import os
 import resource
 import sys
 
-from citest.base import StreamJournalNavigator
+from citest.base import (
+    MergedJournalNavigator,
+    ParallelJournalNavigator,
+    StreamJournalNavigator)
 from citest.reporting.html_renderer import HtmlRenderer
 from citest.reporting.html_document_manager import HtmlDocumentManager
 from citest.reporting.html_index_renderer import HtmlIndexRenderer
 from citest.reporting.html_index_table_renderer import HtmlIndexTableRenderer
 
 
-def journal_to_html(input_path, prune=False):
+def journal_to_html(input_path, prune=False, decode_processes=0):
   """Main program for converting a journal JSON file into HTML.
 
   This will write a file using in the input_path directory with the
@@ -48,14 +54,46 @@ def journal_to_html(input_path, prune=False):
 
   Args:
     input_path: [string] Path the journal file.
+    prune: [bool] Whether to prune the HTML. See HtmlRenderer.
+    decode_processes: [int] If positive then decode the journal using this
+       many worker processes.
   """
   output_path = os.path.basename(os.path.splitext(input_path)[0]) + '.html'
 
   document_manager = HtmlDocumentManager(
       title='Report for {0}'.format(os.path.basename(input_path)))
 
+  if decode_processes > 0:
+    navigator = ParallelJournalNavigator.new_from_path(
+        input_path, processes=decode_processes)
+  else:
+    navigator = StreamJournalNavigator.new_from_path(input_path)
+
   processor = HtmlRenderer(document_manager, prune=prune)
-  processor.process(StreamJournalNavigator.new_from_path(input_path))
+  processor.process(navigator)
+  processor.terminate()
+  document_manager.wrap_tag(document_manager.new_tag('table'))
+  document_manager.build_to_path(output_path)
+
+
+def journals_to_merged_html(input_paths, output_path, prune=False):
+  """Renders several journals into a single HTML file.
+
+  The journals are merged by timestamp, one top-level context at a time,
+  so that the report reads as a single run.
+
+  Args:
+    input_paths: [list of string] Paths to the journal files.
+    output_path: [string] The path of the HTML file to write.
+    prune: [bool] Whether to prune the HTML. See HtmlRenderer.
+  """
+  document_manager = HtmlDocumentManager(
+      title='Report for {0}'.format(
+          ', '.join(os.path.basename(path) for path in input_paths)))
+
+  navigator = MergedJournalNavigator.new_from_paths(input_paths)
+  processor = HtmlRenderer(document_manager, prune=prune)
+  processor.process(navigator)
   processor.terminate()
   document_manager.wrap_tag(document_manager.new_tag('table'))
   document_manager.build_to_path(output_path)
@@ -153,12 +191,24 @@ def main(argv):
                       ' typical verification and debugging use cases.')
   parser.add_argument('--output_dir', default='.',
                       help='Write index files to this base directory')
+  parser.add_argument('--decode_processes', default=0, type=int,
+                      help='Decode each journal using this many worker'
+                      ' processes. 0 decodes within this process.')
+  parser.add_argument('--merged_html', default=None,
+                      help='Also render all the journals merged by timestamp'
+                      ' into this one HTML file, such as for the journals'
+                      ' written by the processes of a parallel run.')
 
   options = parser.parse_args(argv[1:])
 
   if options.html:
     for path in options.journals:
-      journal_to_html(path, prune=options.prune_html)
+      journal_to_html(path, prune=options.prune_html,
+                      decode_processes=options.decode_processes)
+
+  if options.merged_html:
+    journals_to_merged_html(options.journals, options.merged_html,
+                            prune=options.prune_html)
 
   if options.table:
     build_table(options.journals, options.output_dir)
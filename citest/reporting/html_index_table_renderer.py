@@ -340,7 +340,9 @@ class HtmlIndexTableRenderer(JournalProcessor):
       document_manager: [HtmlDocumentManager] Helps with look & feel,
           and structure.
     """
-    super(HtmlIndexTableRenderer, self).__init__()
+    # Only snapshots and context controls contribute to the summary.
+    super(HtmlIndexTableRenderer, self).__init__(
+        wanted_types=['JsonSnapshot', 'JournalContextControl'])
     self.__document_manager = document_manager
     self.default_handler = self.__handle_generic
     self.__total_stats = TestStats.new()
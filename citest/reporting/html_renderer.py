@@ -295,6 +295,36 @@ class ProcessToRenderInfo(object):
     else:
       return HtmlInfo(self.__document_manager.make_text_block(str(value)))
 
+  def process_truncated_value(self, edge, value):
+    """Render the preview of a value that exceeded a snapshot payload budget.
+
+    Args:
+      edge: [dict] The JSON encoding of the JsonSnapshot Edge whose value
+         was truncated. See citest.base.snapshot_budget.
+      value: [string] The preview of the original value.
+
+    Returns:
+      HtmlInfo encoding of the preview, linking to the full value if it
+      was spilled into a file.
+    """
+    document_manager = self.__document_manager
+    size = edge.get('_original_size')
+    children = [
+        document_manager.make_tag_text('ff', value),
+        document_manager.new_tag('br'),
+        document_manager.make_tag_text(
+            'i', 'Truncated from {0} bytes (sha256 {1}).'.format(
+                size, edge.get('_digest')))
+    ]
+    payload_path = edge.get('_payload_path')
+    if payload_path:
+      children.append(
+          document_manager.make_tag_text('a', ' Full value', href=payload_path))
+    return HtmlInfo(
+        document_manager.make_tag_container('span', children),
+        document_manager.make_text_block(
+            '{0} bytes (truncated)'.format(size)))
+
   def process_list(self, value, snapshot, edge_to_list, in_relation,
                    default_expanded=None):
     """Renders value as HTML.
@@ -433,7 +463,9 @@ class ProcessToRenderInfo(object):
         else:
           default_expanded = None
 
-        if value and edge.get('format', None) in ['json', 'pre', 'yaml']:
+        if edge.get('_truncated'):
+          value_info = self.process_truncated_value(edge, value)
+        elif value and edge.get('format', None) in ['json', 'pre', 'yaml']:
           value_info = self.process_edge_value(edge, value)
         elif isinstance(value, list):
           value_info = self.process_list(value, snapshot, edge, in_relation)
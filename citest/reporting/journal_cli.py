@@ -16,7 +16,8 @@
 
 Provides commands for manipulating journal files. The primary purposes are
 
-   1) To dump file content for inspection or debugging
+   1) To dump file content for inspection or debugging, or to export its
+      timing as a trace for trace viewers
    2) To create journal files to indicate that tests could not be run.
       Normally journal files are created while running tests. However if
       the tests cannot be run at all (e.g. precondition failed in a launcher)
@@ -26,6 +27,7 @@ Provides commands for manipulating journal files. The primary purposes are
 
 import argparse
 import json
+import os
 import sys
 import yaml
 
@@ -35,8 +37,15 @@ except ImportError:
   from io import StringIO
 
 
-from citest.base import Journal, StreamJournalNavigator
-from citest.reporting import DumpRenderer
+from citest.base import (
+    Journal,
+    MergedJournalNavigator,
+    StreamJournalNavigator,
+    rebuild_journal_index)
+from citest.base.journal_index import index_path_for_journal
+from citest.reporting import (
+    DumpRenderer,
+    TraceEventRenderer)
 
 
 def load_metadata(path):
@@ -85,9 +94,14 @@ class WriteCommand(JournalCommand):
     super(WriteCommand, self).__init__(*pos_args, **kwargs)
 
   def open_journal(self, options):
-    """Opens an existing journal for appending."""
+    """Opens an existing journal for appending.
+
+    If the journal has a sidecar index then the index is appended to as well.
+    """
     journal = Journal()
-    journal.open_with_path(options.path, _append=True, _message=None)
+    journal.open_with_path(
+        options.path, _append=True, _message=None,
+        _index=os.path.exists(index_path_for_journal(options.path)))
     return journal
 
   def get_record_metadata(self, options):
@@ -123,6 +137,10 @@ class WriteCommand(JournalCommand):
       parser.add_argument(
           '--journal_metadata',
           help='JSON encoded journal metadata.')
+      parser.add_argument(
+          '--encoding', default='pretty',
+          choices=['pretty', 'compact', 'zlib', 'zlib-block'],
+          help='How to encode the journal entries.')
     return parser
 
 
@@ -217,7 +235,7 @@ class NewCommand(WriteCommand):
     if options.message:
       args['_message'] = options.message
 
-    journal = Journal()
+    journal = Journal(encoding=options.encoding)
     journal.open_with_path(options.path, **args)
     journal.terminate(_message=None)
 
@@ -265,7 +283,7 @@ class MakeErrorCommand(WriteCommand):
         '--message', required=True, help='The message.')
 
   def __call__(self, options):
-    journal = Journal()
+    journal = Journal(encoding=options.encoding)
     journal.open_with_path(
         options.path, **self.get_journal_metadata(options))
     journal.begin_context(options.title or 'Error')
@@ -292,14 +310,74 @@ class DumpCommand(JournalCommand):
                         help='Show all the details.')
     parser.add_argument('--outline', default=False, action='store_true',
                         help='Show an outline only.')
+    parser.add_argument('--merge_with', default=[], action='append',
+                        metavar='PATH',
+                        help='Another journal to merge by timestamp, such as'
+                        ' from other processes of a parallel run.'
+                        ' This can be repeated.')
+
+  def __call__(self, options):
+    """Process command."""
+    if options.merge_with:
+      navigator = MergedJournalNavigator.new_from_paths(
+          [options.path] + options.merge_with)
+    else:
+      navigator = StreamJournalNavigator.new_from_path(options.path)
+    processor = DumpRenderer(vars(options))
+    processor.process(navigator)
+    processor.terminate()
 
 
+class TraceCommand(JournalCommand):
+  """Export the timing of an existing journal as trace events."""
+
+  def __init__(self):
+    super(TraceCommand, self).__init__(
+        'trace',
+        help='Export the journal contexts as Chrome trace events (JSON)'
+        ' for chrome://tracing or https://ui.perfetto.dev.')
+
+  def init_argument_parser(self, argparser):
+    """Adds arguments."""
+    parser = super(TraceCommand, self).init_argument_parser(argparser)
+    parser.add_argument(
+        '--output', default=None,
+        help='Path to write the trace to if not <path>.trace.json')
+    parser.add_argument('--messages', default=False, action='store_true',
+                        help='Also include messages as instant events.')
+
   def __call__(self, options):
     """Process command."""
+    output = options.output or (
+        os.path.splitext(options.path)[0] + '.trace.json')
     navigator = StreamJournalNavigator.new_from_path(options.path)
-    processor = DumpRenderer(vars(options))
+    processor = TraceEventRenderer(include_messages=options.messages)
     processor.process(navigator)
     processor.terminate()
+    processor.write(output)
+    print('Wrote {0} trace events to {1}'.format(
+        len(processor.events), output))
+
+
+class IndexCommand(JournalCommand):
+  """Rebuild the sidecar index for an existing journal."""
+
+  def __init__(self):
+    super(IndexCommand, self).__init__(
+        'index',
+        help='Write the sidecar index for an existing journal.')
+
+  def init_argument_parser(self, argparser):
+    """Adds arguments."""
+    parser = super(IndexCommand, self).init_argument_parser(argparser)
+    parser.add_argument(
+        '--index_path', default=None,
+        help='Path to write the index to if not <path>.idx')
+
+  def __call__(self, options):
+    """Process command."""
+    count = rebuild_journal_index(options.path, options.index_path)
+    print('Indexed {0} entries in {1}'.format(count, options.path))
 
 
 def not_found(options):
@@ -318,7 +396,9 @@ def main(argv):
           NewCommand(),
           SealCommand(),
           MakeErrorCommand(),
-          DumpCommand()
+          DumpCommand(),
+          IndexCommand(),
+          TraceCommand()
       ]
   }
 
@@ -0,0 +1,149 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Renders journals as Chrome trace events for viewing in trace viewers.
+
+The output is the JSON object format of the Trace Event Format, which can
+be loaded into chrome://tracing or https://ui.perfetto.dev to see where the
+time went across the threads of a test run.
+"""
+
+import json
+
+from citest.base import JournalProcessor
+
+
+def _to_micros(seconds):
+  """Converts seconds into the microseconds used by trace events."""
+  return int(round(seconds * 1000000))
+
+
+class TraceEventRenderer(JournalProcessor):
+  """Class that renders a journal into trace events.
+
+  Each context becomes a complete ("X") event on the track of the thread
+  that wrote it. Contexts timed by JournalLogger use their monotonic
+  duration; others use the difference between their timestamps. Messages
+  can also be included as instant ("i") events.
+  """
+
+  @property
+  def events(self):
+    """The list of trace events rendered so far."""
+    return self.__events
+
+  def __init__(self, include_messages=False, pid=1):
+    """Constructor.
+
+    Args:
+      include_messages: [bool] Whether to render messages as instant events.
+      pid: [int] The process id to attribute the events to.
+    """
+    registry = {'JournalContextControl': self.render_context_control}
+    if include_messages:
+      registry['JournalMessage'] = self.render_message
+    super(TraceEventRenderer, self).__init__(
+        registry=registry, wanted_types=list(registry.keys()))
+    self.__pid = pid
+    self.__events = []
+    self.__context_stacks = {}  # The open BEGIN entries keyed by thread.
+    self.__last_timestamp = None
+
+  def terminate(self):
+    """Implements JournalProcessor interface.
+
+    Contexts that were never ended are ended at the last timestamp seen.
+    """
+    for stack in self.__context_stacks.values():
+      while stack:
+        begin = stack.pop()
+        self.__add_context_event(
+            begin, {'_timestamp': self.__last_timestamp}, unfinished=True)
+    self.__events.sort(key=lambda event: event['ts'])
+
+  def to_json_object(self):
+    """Returns the trace as a JSON object."""
+    return {'traceEvents': self.__events, 'displayTimeUnit': 'ms'}
+
+  def write(self, path):
+    """Writes the trace as JSON into the given path."""
+    with open(path, 'w') as stream:
+      json.dump(self.to_json_object(), stream)
+
+  def render_context_control(self, entry):
+    """Render a JournalContextControl entry."""
+    self.__note_timestamp(entry)
+    stack = self.__context_stacks.setdefault(entry.get('_thread'), [])
+    control = entry.get('control')
+    if control == 'BEGIN':
+      stack.append(entry)
+    elif control == 'END' and stack:
+      self.__add_context_event(stack.pop(), entry)
+
+  def render_message(self, entry):
+    """Render a JournalMessage entry."""
+    self.__note_timestamp(entry)
+    value = entry.get('_value') or ''
+    self.__events.append({
+        'name': value.split('\n', 1)[0][:80],
+        'cat': 'message',
+        'ph': 'i',
+        's': 't',
+        'ts': _to_micros(entry['_timestamp']),
+        'pid': self.__pid,
+        'tid': entry.get('_thread'),
+        'args': {'level': entry.get('_level')}
+    })
+
+  def __note_timestamp(self, entry):
+    """Keeps track of the latest timestamp for unfinished contexts."""
+    timestamp = entry.get('_timestamp')
+    if timestamp is not None and (self.__last_timestamp is None
+                                  or timestamp > self.__last_timestamp):
+      self.__last_timestamp = timestamp
+
+  def __add_context_event(self, begin, end, unfinished=False):
+    """Adds the complete event for a context.
+
+    Args:
+      begin: [dict] The BEGIN JournalContextControl entry.
+      end: [dict] The END JournalContextControl entry.
+      unfinished: [bool] Whether the context was never actually ended.
+    """
+    start = begin['_timestamp']
+    if '_monotonic_start' in end and '_monotonic_end' in end:
+      duration = end['_monotonic_end'] - end['_monotonic_start']
+    else:
+      duration = (end.get('_timestamp') or start) - start
+
+    args = {}
+    for key, name in [('_context_id', 'context_id'),
+                      ('_parent_id', 'parent_id')]:
+      if begin.get(key) is not None:
+        args[name] = begin[key]
+    if end.get('relation'):
+      args['relation'] = end['relation']
+    if unfinished:
+      args['unfinished'] = True
+
+    self.__events.append({
+        'name': begin.get('_title') or 'context',
+        'cat': 'context',
+        'ph': 'X',
+        'ts': _to_micros(start),
+        'dur': _to_micros(max(duration, 0)),
+        'pid': self.__pid,
+        'tid': begin.get('_thread'),
+        'args': args
+    })
@@ -44,7 +44,8 @@ from citest.base import (
     BaseTestCase,
     ExecutionContext,
     JournalLogger,
-    JsonSnapshotableEntity)
+    JsonSnapshotableEntity,
+    SnapshotRelation)
 
 
 _DEFAULT_TEST_ID = os.environ.get('CITEST_TEST_ID', time.strftime('%H%M%S'))
@@ -78,9 +79,10 @@ class OperationContractExecutionAttempt(JsonSnapshotableEntity):
     permits different elements to distinguish valid/invalid relationships.
     """
     if self.__exception is not None:
-      return 'ERROR'
+      return SnapshotRelation.ERROR
     if self.__verification is not None:
-      return 'VALID' if self.__verification else 'INVALID'
+      return (SnapshotRelation.VALID if self.__verification
+              else SnapshotRelation.INVALID)
     return None
 
   @property
@@ -224,7 +226,7 @@ class OperationContractExecutionTrace(JsonSnapshotableEntity):
 
     my_default_relation = None
     if self.__exception is not None:
-      my_default_relation = 'ERROR'
+      my_default_relation = SnapshotRelation.ERROR
       builder.make_error(entity, 'Exception', self.__exception, format='pre')
 
     if self.__attempts:
@@ -596,11 +598,12 @@ class AgentTestCase(BaseTestCase):
         verify_results = context.get(
             self.CONTEXT_KEY_CONTRACT_VERIFY_RESULTS, None)
         if verify_results is None:
-          context_relation = 'ERROR'
+          context_relation = SnapshotRelation.ERROR
         else:
           final_status_ok = context.get(self.CONTEXT_KEY_FINAL_STATUS_OK, False)
-          context_relation = ('VALID' if (final_status_ok and verify_results)
-                              else 'INVALID')
+          context_relation = (
+              SnapshotRelation.VALID if (final_status_ok and verify_results)
+              else SnapshotRelation.INVALID)
         JournalLogger.end_context(relation=context_relation)
 
   def _do_run_test_case_with_hooks(self, test_case, context, **kwargs):
@@ -666,11 +669,12 @@ class AgentTestCase(BaseTestCase):
       context.set_internal(self.CONTEXT_KEY_ATTEMPT_INFO, attempt_info)
       status = attempt_info.status
       title = '%s summary' % status.__class__.__name__
+      relation = (SnapshotRelation.VALID if status.finished_ok
+                  else SnapshotRelation.ERROR if status.error
+                  else SnapshotRelation.INVALID if status.finished
+                  else None)
       JournalLogger.delegate("store_summary", status, _title=title,
-                             relation=('VALID' if status.finished_ok
-                                       else 'ERROR' if status.error
-                                       else 'INVALID' if status.finished
-                                       else None))
+                             relation=relation)
 
       # We're always going to verify the contract, even if the request itself
       # failed. We set the verification on the attempt here, but do not assert
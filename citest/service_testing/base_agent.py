@@ -33,6 +33,7 @@ import time
 from citest.base import JsonScrubber
 from citest.base import JsonSnapshotableEntity
 from citest.base import JournalLogger
+from citest.base import SnapshotRelation
 
 
 class AgentError(Exception, JsonSnapshotableEntity):
@@ -211,7 +212,8 @@ class AgentOperationStatus(JsonSnapshotableEntity):
     builder.make_output(entity, 'Finished', self.finished)
     if self.finished:
       builder.make(entity, 'Finished OK', self.finished_ok,
-                   relation='VALID' if self.finished_ok else 'INVALID')
+                   relation=(SnapshotRelation.VALID if self.finished_ok
+                             else SnapshotRelation.INVALID))
     else:
       builder.make(entity, 'Timed Out', self.timed_out)
     if self.error:
@@ -231,16 +233,16 @@ class AgentOperationStatus(JsonSnapshotableEntity):
     entity.add_metadata('StatusId', self.id)
 
     if self.finished_ok:
-      final_relation = 'VALID'
+      final_relation = SnapshotRelation.VALID
       final_status = 'OK'
     elif self.finished:
-      final_relation = 'INVALID'
+      final_relation = SnapshotRelation.INVALID
       final_status = 'Not OK'
     else:
       final_relation = None
       final_status = 'Not Finished'
     if self.error:
-      final_relation = 'ERROR'
+      final_relation = SnapshotRelation.ERROR
 
     builder.make(entity, 'Status State', final_status, relation=final_relation)
     if self.error:
@@ -288,11 +290,12 @@ class AgentOperationStatus(JsonSnapshotableEntity):
 
     message = 'Wait on id={0}, max_secs={1}'.format(self.id, max_secs)
     JournalLogger.begin_context(message)
-    context_relation = 'ERROR'
+    context_relation = SnapshotRelation.ERROR
     try:
       self.refresh()
       self.__wait_helper(poll_every_secs, max_secs)
-      context_relation = 'VALID' if self.finished_ok else 'INVALID'
+      context_relation = (SnapshotRelation.VALID if self.finished_ok
+                          else SnapshotRelation.INVALID)
     finally:
       JournalLogger.end_context(relation=context_relation)
 
@@ -44,6 +44,7 @@ except ImportError:
 
 from citest.base import JournalLogger
 from citest.base import JsonSnapshotableEntity
+from citest.base import SnapshotRelation
 from .http_scrubber import HttpScrubber
 
 from . import base_agent
@@ -119,7 +120,9 @@ class HttpResponseType(JsonSnapshotableEntity):
           for the payload value.
     """
     builder = snapshot.edge_builder
-    code_relation = { 2: 'VALID', 4: 'INVALID', 5: 'ERROR' }.get(
+    code_relation = {2: SnapshotRelation.VALID,
+                     4: SnapshotRelation.INVALID,
+                     5: SnapshotRelation.ERROR}.get(
         self.http_code // 100, None)
 
     edge = builder.make(entity, 'HTTP Code', self.http_code,
@@ -128,7 +131,7 @@ class HttpResponseType(JsonSnapshotableEntity):
       edge = builder.make_data(entity, 'Response Headers', self.headers)
 
     if not self.ok():
-      edge.add_metadata('relation', 'ERROR')
+      edge.add_metadata('relation', SnapshotRelation.ERROR)
     if self.exception:
       edge = builder.make_error(entity, 'Response Error', self.exception)
       if format:
@@ -16,6 +16,7 @@
 
 import os
 import sys
+import threading
 import unittest
 try:
   import ConfigParser
@@ -199,6 +200,39 @@ class ConfigurationBindingsTest(unittest.TestCase):
     self.assertEquals('have', bindings.get('has_default'))
     self.assertIsNone(bindings.get('lazy')) # because we overrode it
 
+  def test_prefetch_lazy_initializers(self):
+    started = {'first': threading.Event(), 'second': threading.Event()}
+    called = []
+
+    def concurrent_initializer(bindings, key):
+      called.append(key)
+      started[key].set()
+      other = 'second' if key == 'first' else 'first'
+      return started[other].wait(5) and key.upper()
+
+    def failing_initializer(bindings, key):
+      raise ValueError('Expected failure')
+
+    lazy_evaluator = TestLazyEvaluator()
+    builder = ConfigurationBindingsBuilder()
+    builder.update_lazy_initializers({'first': concurrent_initializer,
+                                      'second': concurrent_initializer},
+                                     prefetch=True)
+    builder.add_lazy_initializer('failing', failing_initializer, prefetch=True)
+    builder.add_lazy_initializer('overriden', lazy_evaluator, prefetch=True)
+    builder.add_lazy_initializer('lazy', lazy_evaluator)
+    builder.set_override('overriden', 'OverridenValue')
+
+    bindings = builder.build()
+    self.assertEquals(['first', 'second'],
+                      bindings.prefetch_lazy_initializers())
+    self.assertEquals('FIRST', bindings.overrides['first'])
+    self.assertEquals('SECOND', bindings['second'])
+    self.assertEquals(['first', 'second'], sorted(called))
+    self.assertEquals([], lazy_evaluator.called_with_bk)
+    self.assertFalse('failing' in bindings.overrides)
+    self.assertEquals([], bindings.prefetch_lazy_initializers())
+
   def test_contains(self):
     lazy_evaluator = TestLazyEvaluator()
     builder = ConfigurationBindingsBuilder()
@@ -223,6 +257,34 @@ class ConfigurationBindingsTest(unittest.TestCase):
     self.assertEquals([], lazy_evaluator.called_with_bk)
     self.assertFalse('implied' in bindings)
 
+  def test_sections(self):
+    parser = ConfigParser.RawConfigParser()
+    parser.set(ConfigParser.DEFAULTSECT, 'shared', 'DefaultSection')
+    for section, value in [('first', 'First'), ('second', 'Second')]:
+      parser.add_section(section)
+      parser.set(section, 'value', value)
+      parser.set(section, section, value)
+    parser.set('second', 'empty', '')
+
+    bindings = ConfigurationBindings(parser, {}, defaults={'empty': 'Empty'})
+    self.assertEquals('First', bindings['VALUE'])
+    self.assertEquals('Second', bindings['second'])
+    self.assertEquals('DefaultSection', bindings['shared'])
+    self.assertEquals('Given', bindings.get('empty', 'Given'))
+
+    bindings['value'] = 'Override'
+    self.assertEquals('Override', bindings['value'])
+
+    second = bindings.get_section_bindings('second')
+    self.assertEquals('Override', second['value'])
+    self.assertEquals('DefaultSection', second['shared'])
+    self.assertFalse('first' in second)
+    self.assertTrue('second' in second)
+
+    missing = bindings.get_section_bindings('missing')
+    self.assertFalse('first' in missing)
+    self.assertEquals('DefaultSection', missing['shared'])
+
 
 if __name__ == '__main__':
   unittest.main()
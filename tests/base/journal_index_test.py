@@ -0,0 +1,160 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test citest.base.journal_index module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from citest.base import (
+    IndexedJournalNavigator,
+    Journal,
+    JournalIndex,
+    rebuild_journal_index)
+
+from tests.base.test_clock import TestClock
+
+
+class JournalIndexTest(unittest.TestCase):
+  # pylint: disable=missing-docstring
+
+  @classmethod
+  def setUpClass(cls):
+    cls.temp_dir = tempfile.mkdtemp(prefix='journal_index_test')
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.temp_dir)
+
+  def write_journal(self, name, encoding='pretty'):
+    path = os.path.join(self.temp_dir, name + '.journal')
+    journal = Journal(now_function=TestClock(), encoding=encoding)
+    journal.open_with_path(path, _index=True)
+    journal.begin_context('OUTER')
+    journal.write_message('Outer Message')
+    journal.begin_context('INNER')
+    journal.write_message('Inner Message')
+    journal.end_context()
+    journal.end_context()
+    journal.begin_context('OTHER')
+    journal.write_message('Other Message')
+    journal.end_context()
+    journal.terminate()
+    return path
+
+  def test_index_entries(self):
+    path = self.write_journal('test_entries')
+    index = JournalIndex.new_from_path(path + '.idx')
+    self.assertEquals(
+        [('JournalMessage', 0), ('JournalContextControl', 0),
+         ('JournalMessage', 1), ('JournalContextControl', 1),
+         ('JournalMessage', 2), ('JournalContextControl', 1),
+         ('JournalContextControl', 0), ('JournalContextControl', 0),
+         ('JournalMessage', 1), ('JournalContextControl', 0),
+         ('JournalMessage', 0)],
+        [(entry.type, entry.depth) for entry in index.entries])
+
+    outer, inner, other = index.find_contexts()
+    self.assertEquals(['OUTER', 'INNER', 'OTHER'],
+                      [outer.title, inner.title, other.title])
+    self.assertEquals(6, outer.pair)
+    self.assertEquals(5, inner.pair)
+    self.assertEquals(inner.sequence, index.entries[5].pair)
+    self.assertEquals({}, index.open_contexts)
+
+  def test_interleaved_thread_contexts(self):
+    path = os.path.join(self.temp_dir, 'test_threads.journal')
+    journal = Journal(now_function=TestClock())
+    journal.open_with_path(path, _index=True, _message=None)
+    journal.begin_context('A', _thread=1)
+    journal.begin_context('B', _thread=2)
+    journal.write_message('In A', _thread=1)
+    journal.end_context(_thread=1)
+    journal.write_message('In B', _thread=2)
+    journal.end_context(_thread=2)
+    journal.terminate(_message=None)
+
+    navigator = IndexedJournalNavigator.new_from_path(path)
+    self.assertEquals([0, 0, 1, 0, 1, 0],
+                      [entry.depth for entry in navigator.index.entries])
+    for title, message in [('A', 'In A'), ('B', 'In B')]:
+      context = navigator.index.find_contexts(title)[0]
+      got = [entry.get('_value') or entry.get('control')
+             for entry in navigator.new_for_context(context)
+             if entry['_thread'] == context.thread]
+      self.assertEquals(['BEGIN', message, 'END'], got)
+
+  def test_navigate_context(self):
+    for encoding in ['pretty', 'zlib', 'zlib-block']:
+      path = self.write_journal('test_context_' + encoding, encoding)
+      navigator = IndexedJournalNavigator.new_from_path(path)
+      inner = navigator.index.find_contexts('INNER')[0]
+      got = [entry.get('_value') or entry.get('control')
+             for entry in navigator.new_for_context(inner)]
+      self.assertEquals(['BEGIN', 'Inner Message', 'END'], got)
+
+  def test_navigate_types_and_times(self):
+    path = self.write_journal('test_types')
+    navigator = IndexedJournalNavigator.new_from_path(path)
+    got = [entry['_value']
+           for entry in navigator.new_for_types(['JournalMessage'])]
+    self.assertEquals(['Starting journal.', 'Outer Message', 'Inner Message',
+                       'Other Message', 'Finished journal.'], got)
+
+    start = navigator.index.entries[2].timestamp
+    end = navigator.index.entries[4].timestamp
+    got = [entry.get('_value') or entry.get('_title')
+           for entry in navigator.new_for_time_range(start, end)]
+    self.assertEquals(['Outer Message', 'INNER', 'Inner Message'], got)
+
+  def test_type_filter(self):
+    path = self.write_journal('test_filter', 'zlib')
+    navigator = IndexedJournalNavigator.new_from_path(path)
+    navigator.set_type_filter(['JournalContextControl'])
+    self.assertEquals(['OUTER', 'INNER', None, None, 'OTHER', None],
+                      [entry.get('_title') for entry in navigator])
+
+  def test_rebuild(self):
+    path = self.write_journal('test_rebuild', 'zlib-block')
+    with open(path + '.idx', 'r') as stream:
+      expect = stream.read()
+    os.remove(path + '.idx')
+    self.assertEquals(11, rebuild_journal_index(path))
+    with open(path + '.idx', 'r') as stream:
+      self.assertEquals(expect, stream.read())
+
+  def test_append(self):
+    path = os.path.join(self.temp_dir, 'test_append.journal')
+    journal = Journal()
+    journal.open_with_path(path, _index=True)
+    journal.begin_context('OUTER')
+    journal.terminate(_message=None)
+
+    journal = Journal(encoding='zlib')
+    journal.open_with_path(path, _index=True, _append=True, _message=None)
+    journal.write_message('Appended')
+    journal.end_context()
+    journal.terminate(_message=None)
+
+    navigator = IndexedJournalNavigator.new_from_path(path)
+    outer = navigator.index.find_contexts('OUTER')[0]
+    got = [entry.get('_value') or entry.get('control')
+           for entry in navigator.new_for_context(outer)]
+    self.assertEquals(['BEGIN', 'Appended', 'END'], got)
+
+
+if __name__ == '__main__':
+  unittest.main()
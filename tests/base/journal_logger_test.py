@@ -141,6 +141,7 @@ class JournalLoggerTest(unittest.TestCase):
           '_type': 'JournalContextControl',
           '_timestamp': start_time + 1,
           '_thread': current_thread().ident,
+          '_parent_id': None,
           'control': 'BEGIN',
           'foo': 'bar',
         },
@@ -156,16 +157,116 @@ class JournalLoggerTest(unittest.TestCase):
           '_type': 'JournalContextControl',
           '_timestamp': start_time + 3,
           '_thread': current_thread().ident,
+          '_parent_id': None,
           'control': 'END'
         }
       ]
 
       entry_str = _journal_file.getvalue()[offset:]
       input_stream = RecordInputStream(BytesIO(entry_str))
+      context_ids = []
       for expect in expect_sequence:
         json_str = next(input_stream)
         json_dict = json_module.JSONDecoder().decode(json_str)
+        if json_dict['_type'] == 'JournalContextControl':
+          context_ids.append(json_dict.pop('_context_id'))
+        if json_dict.get('control') == 'END':
+          start = json_dict.pop('_monotonic_start')
+          end = json_dict.pop('_monotonic_end')
+          self.assertTrue(start <= end)
         self.assertEqual(expect, json_dict)
+      self.assertEqual(context_ids[0], context_ids[1])
+
+  @staticmethod
+  def journal_entries_since(offset):
+    decoder = json_module.JSONDecoder()
+    return [decoder.decode(json_str) for json_str in
+            RecordInputStream(BytesIO(_journal_file.getvalue()[offset:]))]
+
+  def test_journal_levels(self):
+    offset = len(_journal_file.getvalue())
+    logger = JournalLogger('test.levels.child')
+    logger.addHandler(JournalLogHandler(
+        path=None, journal_levels={'test.levels': 'INFO'}))
+    logger.debug('Hidden')
+    logger.info('Shown')
+    self.assertEqual(
+        ['Shown'],
+        [entry['_value'] for entry in self.journal_entries_since(offset)])
+
+  def test_collapse_repeats(self):
+    offset = len(_journal_file.getvalue())
+    logger = JournalLogger('test_collapse_repeats')
+    handler = JournalLogHandler(path=None, collapse_repeats=True)
+    logger.addHandler(handler)
+    for _ in range(5):
+      logger.debug('Waiting')
+    logger.debug('Done')
+    logger.debug('Done')
+    handler.flush()
+
+    got = [(entry['_value'], entry.get('_repeat_count'))
+           for entry in self.journal_entries_since(offset)]
+    self.assertEqual(
+        [('Waiting', None), ('Waiting', 4), ('Done', None), ('Done', 1)],
+        got)
+
+  def test_close_writes_repeats(self):
+    offset = len(_journal_file.getvalue())
+    logger = JournalLogger('test_close_writes_repeats')
+    handler = JournalLogHandler(path=None, collapse_repeats=True)
+    logger.addHandler(handler)
+    for _ in range(3):
+      logger.debug('Waiting')
+    logger.removeHandler(handler)
+    handler.close()
+
+    got = [(entry['_value'], entry.get('_repeat_count'))
+           for entry in self.journal_entries_since(offset)]
+    self.assertEqual([('Waiting', None), ('Waiting', 2)], got)
+
+  def test_context_writes_repeats(self):
+    offset = len(_journal_file.getvalue())
+    logger = JournalLogger('test_context_writes_repeats')
+    handler = JournalLogHandler(path=None, collapse_repeats=True)
+    logger.addHandler(handler)
+    JournalLogger.begin_context('Polling')
+    for _ in range(3):
+      logger.debug('Waiting')
+    JournalLogger.end_context()
+    logger.removeHandler(handler)
+    handler.close()
+
+    got = [(entry.get('control') or entry['_value'],
+            entry.get('_repeat_count'))
+           for entry in self.journal_entries_since(offset)]
+    self.assertEqual(
+        [('BEGIN', None), ('Waiting', None), ('Waiting', 2), ('END', None)],
+        got)
+
+  def test_rate_limit(self):
+    offset = len(_journal_file.getvalue())
+    logger = JournalLogger('test_rate_limit')
+    logger.addHandler(JournalLogHandler(
+        path=None, journal_rate_limits={'': {'rate': 1, 'burst': 2}}))
+    base_time = logging.makeLogRecord({}).created
+    for index in range(10):
+      record = logger.makeRecord(
+          logger.name, logging.DEBUG, 'PATH', 1, 'Poll %d', (index,), None)
+      # Ten records in the first second, then one more after it.
+      record.created = base_time + index * 0.1
+      logger.handle(record)
+    record = logger.makeRecord(
+        logger.name, logging.DEBUG, 'PATH', 1, 'Finished', (), None)
+    record.created = base_time + 1.5
+    logger.handle(record)
+
+    got = [(entry['_value'], entry.get('_dropped'))
+           for entry in self.journal_entries_since(offset)]
+    self.assertEqual(
+        [('Poll 0', None), ('Poll 1', None), ('Poll 9', 8),
+         ('Finished', None)],
+        got)
 
 
 if __name__ == '__main__':
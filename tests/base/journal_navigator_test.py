@@ -14,16 +14,75 @@
 
 """Test citest.reporting.html_renderer module."""
 
+import json
 import os
 import shutil
 import tempfile
+import threading
 import unittest
 
+from io import BytesIO
 from citest.base import (
+    FollowJournalNavigator,
+    IndexedJournalNavigator,
     Journal,
+    JournalProcessor,
+    JsonSnapshotableEntity,
+    MergedJournalNavigator,
+    ParallelJournalNavigator,
+    RecordInputStream,
+    SegmentedJournalNavigator,
     StreamJournalNavigator)
 
 
+class LargeData(JsonSnapshotableEntity):
+  def __init__(self, name):
+    self.__name = name
+
+  def export_to_json_snapshot(self, snapshot, entity):
+    builder = snapshot.edge_builder
+    builder.make_data(entity, 'Name', self.__name)
+    builder.make_data(entity, 'Payload', {'items': list(range(100))})
+    builder.make_output(entity, 'Other', ['Some other output'] * 10)
+
+
+class SharedPart(JsonSnapshotableEntity):
+  snapshot_is_immutable = True
+
+  def __init__(self, name, child=None):
+    self.__name = name
+    self.__child = child
+
+  def export_to_json_snapshot(self, snapshot, entity):
+    builder = snapshot.edge_builder
+    builder.make_control(entity, 'Name', self.__name)
+    if self.__child is not None:
+      builder.make_mechanism(entity, 'Child', self.__child)
+      builder.make_data(entity, 'Children', [self.__child])
+
+
+class MutablePart(JsonSnapshotableEntity):
+  def __init__(self, names):
+    self.__names = list(names)
+
+  def append(self, name):
+    self.__names.append(name)
+
+  def export_to_json_snapshot(self, snapshot, entity):
+    snapshot.edge_builder.make_control(entity, 'Names', list(self.__names))
+
+
+class PartUser(JsonSnapshotableEntity):
+  def __init__(self, name, part):
+    self.__name = name
+    self.__part = part
+
+  def export_to_json_snapshot(self, snapshot, entity):
+    builder = snapshot.edge_builder
+    builder.make_data(entity, 'Name', self.__name)
+    builder.make_mechanism(entity, 'Part', self.__part)
+
+
 class StreamNavigatorTest(unittest.TestCase):
   # pylint: disable=missing-docstring
 
@@ -79,6 +138,434 @@ class StreamNavigatorTest(unittest.TestCase):
         self.assertEquals(record, expect.pop())
     self.assertEquals([], expect)
 
+  def test_empty_file(self):
+    path = os.path.join(self.temp_dir, 'test_empty.journal')
+    with open(path, 'wb'):
+      pass
+    navigator = StreamJournalNavigator.new_from_path(path)
+    self.assertEquals([], list(navigator))
+    self.assertEquals([], list(navigator))
+
+  def test_encodings(self):
+    for encoding in ['pretty', 'compact', 'zlib', 'zlib-block']:
+      journal = Journal(encoding=encoding)
+      path = os.path.join(self.temp_dir, 'test_{0}.journal'.format(encoding))
+      journal.open_with_path(path)
+      for index in range(10):
+        journal.write_message('Message {0}'.format(index), index=index)
+      journal.terminate()
+
+      navigator = StreamJournalNavigator.new_from_path(path)
+      got = [record['_value'] for record in navigator]
+      self.assertEquals(
+          ['Starting journal.']
+          + ['Message {0}'.format(index) for index in range(10)]
+          + ['Finished journal.'],
+          got)
+
+  def test_type_filter(self):
+    for encoding in ['pretty', 'compact', 'zlib', 'zlib-block']:
+      journal = Journal(encoding=encoding)
+      path = os.path.join(self.temp_dir, 'test_filter_{0}.journal'.format(
+          encoding))
+      journal.open_with_path(path)
+      journal.begin_context('Outer')
+      journal.write_message('Hello')
+      journal.end_context()
+      journal.terminate()
+
+      navigator = StreamJournalNavigator.new_from_path(path)
+      navigator.set_type_filter(['JournalContextControl'])
+      self.assertEquals(['BEGIN', 'END'],
+                        [record['control'] for record in navigator])
+
+      got = []
+      processor = JournalProcessor(
+          registry={'JournalMessage': got.append},
+          wanted_types=['JournalMessage'])
+      processor.process(StreamJournalNavigator.new_from_path(path))
+      self.assertEquals(['Starting journal.', 'Hello', 'Finished journal.'],
+                        [record['_value'] for record in got])
+
+  def test_parallel(self):
+    for encoding in ['pretty', 'zlib', 'zlib-block']:
+      path = os.path.join(self.temp_dir, 'test_parallel_{0}.journal'.format(
+          encoding))
+      journal = Journal(encoding=encoding)
+      journal.open_with_path(path)
+      for index in range(200):
+        journal.write_message('Message {0}'.format(index), index=index)
+      journal.terminate()
+
+      expect = list(StreamJournalNavigator.new_from_path(path))
+      navigator = ParallelJournalNavigator(path, processes=2, chunk_bytes=512)
+      self.assertEquals(expect, list(navigator))
+
+      navigator = ParallelJournalNavigator(path, processes=2, chunk_bytes=512)
+      navigator.set_type_filter(['JournalContextControl'])
+      self.assertEquals([], list(navigator))
+
+  def test_next_accepted_limit(self):
+    for encoding in ['pretty', 'zlib']:
+      path = os.path.join(self.temp_dir, 'test_limit_{0}.journal'.format(
+          encoding))
+      journal = Journal(encoding=encoding)
+      journal.open_with_path(path, _message=None)
+      for index in range(20):
+        journal.write_message('Message {0}'.format(index))
+      journal.terminate(_message=None)
+
+      with open(path, 'rb') as stream:
+        offsets = [position[0]
+                   for position in RecordInputStream(stream).scan_frames()]
+      with open(path, 'rb') as stream:
+        records = RecordInputStream(stream)
+        # Skipping every record stops at the limit rather than reading on.
+        with self.assertRaises(StopIteration):
+          records.next_accepted(lambda _: False, limit=offsets[10])
+        self.assertEquals('Message 10',
+                          json.loads(records.next_accepted(None))['_value'])
+
+  def test_compressed_is_smaller(self):
+    sizes = {}
+    for encoding in ['pretty', 'compact', 'zlib', 'zlib-block']:
+      journal = Journal(encoding=encoding)
+      path = os.path.join(self.temp_dir, 'test_size_{0}.journal'.format(
+          encoding))
+      journal.open_with_path(path)
+      for index in range(100):
+        journal.write_message('Repeated message text', details={'a': index})
+      journal.terminate()
+      sizes[encoding] = os.path.getsize(path)
+
+    self.assertLess(sizes['compact'], sizes['pretty'])
+    self.assertLess(sizes['zlib-block'], sizes['zlib'])
+    self.assertLess(sizes['zlib-block'], sizes['compact'])
+
+  def test_append_plain_to_encoded(self):
+    path = os.path.join(self.temp_dir, 'test_append.journal')
+    journal = Journal(encoding='zlib-block')
+    journal.open_with_path(path, _message='First')
+    journal.terminate(_message=None)
+
+    journal = Journal()
+    journal.open_with_path(path, _append=True, _message='Second')
+    journal.terminate(_message=None)
+
+    journal = Journal(encoding='zlib')
+    journal.open_with_path(path, _append=True, _message='Third')
+    journal.terminate(_message=None)
+
+    with open(path, 'rb') as stream:
+      records = RecordInputStream(BytesIO(stream.read()))
+      got = [text for text in records]
+      self.assertEquals('zlib', records.header['frame_encoding'])
+    navigator = StreamJournalNavigator.new_from_path(path)
+    self.assertEquals(['First', 'Second', 'Third'],
+                      [record['_value'] for record in navigator])
+    self.assertEquals(3, len(got))
+
+  def _write_nested_journal(self, path, **kwargs):
+    journal = Journal(now_function=lambda: 1.0)
+    journal.open_with_path(path, **kwargs)
+    journal.begin_context('OUTER')
+    for index in range(10):
+      journal.begin_context('INNER {0}'.format(index))
+      journal.write_message('Message {0}'.format(index))
+      journal.end_context()
+    journal.end_context()
+    journal.terminate()
+
+  def test_segment_by_entries(self):
+    plain_path = os.path.join(self.temp_dir, 'test_unsegmented.journal')
+    self._write_nested_journal(plain_path)
+    expect = list(StreamJournalNavigator.new_from_path(plain_path))
+
+    path = os.path.join(self.temp_dir, 'test_segment_entries.journal')
+    self._write_nested_journal(path, _segment_entries=7)
+    navigator = StreamJournalNavigator.new_from_path(path)
+    self.assertTrue(isinstance(navigator, SegmentedJournalNavigator))
+    self.assertEquals(5, len(navigator.segment_paths))
+    self.assertEquals(expect, list(navigator))
+
+    # Each segment is a well formed journal on its own.
+    for segment_path in navigator.segment_paths:
+      depth = 0
+      for entry in StreamJournalNavigator.new_from_path(segment_path):
+        if entry['_type'] == 'JournalContextControl':
+          depth += 1 if entry['control'] == 'BEGIN' else -1
+          self.assertTrue(depth >= 0)
+      self.assertEquals(0, depth)
+
+    # Contexts open at a boundary are continued in the next segment.
+    second = list(StreamJournalNavigator.new_from_path(
+        navigator.segment_paths[1]))
+    self.assertEquals('OUTER', second[0]['_title'])
+    self.assertTrue(second[0]['_segment_continuation'])
+
+    parallel = ParallelJournalNavigator(path, processes=2, chunk_bytes=256)
+    self.assertEquals(expect, list(parallel))
+
+  def test_segment_by_bytes(self):
+    path = os.path.join(self.temp_dir, 'test_segment_bytes.journal')
+    self._write_nested_journal(path, _segment_bytes=512)
+    navigator = StreamJournalNavigator.new_from_path(path)
+    self.assertTrue(len(navigator.segment_paths) > 1)
+    for segment_path in navigator.segment_paths[:-1]:
+      self.assertTrue(os.path.getsize(segment_path) < 1024)
+    self.assertEquals(
+        ['Starting journal.'] + ['Message {0}'.format(i) for i in range(10)]
+        + ['Finished journal.'],
+        [entry['_value'] for entry in navigator
+         if entry['_type'] == 'JournalMessage'])
+
+  def test_segment_pruned(self):
+    path = os.path.join(self.temp_dir, 'test_segment_pruned.journal')
+    self._write_nested_journal(path, _segment_entries=7)
+    segment_paths = SegmentedJournalNavigator(path).segment_paths
+    os.remove(segment_paths[0])
+    got = [entry for entry in SegmentedJournalNavigator(path)
+           if entry['_type'] == 'JournalMessage']
+    self.assertEquals('Message 2', got[0]['_value'])
+
+  def test_segment_blobs(self):
+    part = SharedPart('parent', SharedPart('child'))
+
+    def write_journal(path, **kwargs):
+      journal = Journal(now_function=lambda: 1.0, **kwargs)
+      journal.open_with_path(path, _segment_entries=3)
+      for name in ['first', 'second', 'third', 'fourth']:
+        journal.store(LargeData(name))
+        journal.store(PartUser(name, part))
+      journal.terminate()
+
+    plain_path = os.path.join(self.temp_dir, 'test_segment_no_blobs.journal')
+    write_journal(plain_path)
+    expect = list(StreamJournalNavigator.new_from_path(plain_path))
+
+    path = os.path.join(self.temp_dir, 'test_segment_blobs.journal')
+    write_journal(path, blob_min_bytes=100, share_entities=True)
+    self.assertEquals(expect, list(StreamJournalNavigator.new_from_path(path)))
+
+    # Each segment has the blobs that it references.
+    navigator = SegmentedJournalNavigator(path)
+    self.assertTrue(len(navigator.segment_paths) > 2)
+    for segment_path in navigator.segment_paths:
+      for entry in StreamJournalNavigator.new_from_path(segment_path):
+        self.assertFalse('"_blob"' in json.dumps(entry))
+
+  def test_segment_thread_contexts(self):
+    path = os.path.join(self.temp_dir, 'test_segment_threads.journal')
+    journal = Journal(now_function=lambda: 1.0)
+    journal.open_with_path(path, _segment_entries=4, _message=None)
+    journal.begin_context('A', _thread=1)
+    journal.begin_context('B', _thread=2)
+    journal.begin_context('A2', _thread=1)
+    for index in range(4):
+      journal.write_message('Message {0}'.format(index), _thread=2)
+    journal.end_context(_thread=1)
+    journal.end_context(_thread=2)
+    journal.end_context(_thread=1)
+    journal.terminate(_message=None)
+
+    # Each segment nests the contexts of each thread on its own.
+    navigator = SegmentedJournalNavigator(path)
+    self.assertTrue(len(navigator.segment_paths) > 1)
+    for segment_path in navigator.segment_paths:
+      stacks = {}
+      for entry in StreamJournalNavigator.new_from_path(segment_path):
+        if entry['_type'] != 'JournalContextControl':
+          continue
+        stack = stacks.setdefault(entry['_thread'], [])
+        if entry['control'] == 'BEGIN':
+          stack.append(entry['_title'])
+        else:
+          self.assertTrue(stack)
+          stack.pop()
+      self.assertEquals([], [title for stack in stacks.values()
+                             for title in stack])
+
+    second = list(StreamJournalNavigator.new_from_path(
+        navigator.segment_paths[1]))
+    self.assertEquals(['A', 'A2'], [entry['_title'] for entry in second[:3]
+                                    if entry['_thread'] == 1])
+    self.assertEquals(['B'], [entry['_title'] for entry in second[:3]
+                              if entry['_thread'] == 2])
+
+  def test_follow_partial_frame(self):
+    source_path = os.path.join(self.temp_dir, 'test_follow_source.journal')
+    journal = Journal(encoding='zlib')
+    journal.open_with_path(source_path)
+    for index in range(3):
+      journal.write_message('Message {0}'.format(index))
+    journal.terminate(_message=None)
+    expect = list(StreamJournalNavigator.new_from_path(source_path))
+    with open(source_path, 'rb') as stream:
+      contents = stream.read()
+
+    path = os.path.join(self.temp_dir, 'test_follow_partial.journal')
+    navigator = FollowJournalNavigator(path, idle_timeout=0,
+                                       min_poll_interval=0)
+    self.assertEquals([], list(navigator))
+
+    # Leave the last frame partially written.
+    with open(path, 'wb') as stream:
+      stream.write(contents[:-5])
+    self.assertEquals(expect[:-1], list(navigator))
+
+    with open(path, 'ab') as stream:
+      stream.write(contents[-5:])
+    self.assertEquals(expect[-1:], list(navigator))
+    navigator.close()
+
+  def test_follow_writer(self):
+    path = os.path.join(self.temp_dir, 'test_follow_writer.journal')
+    journal = Journal()
+    journal.open_with_path(path)
+    navigator = FollowJournalNavigator(path, max_poll_interval=0.01)
+
+    def write_entries():
+      for index in range(50):
+        journal.write_message('Message {0}'.format(index))
+        journal.flush()
+      journal.terminate()
+      navigator.stop()
+
+    got = []
+    processor = JournalProcessor(
+        registry={'JournalMessage': lambda entry: got.append(entry['_value'])})
+    thread = threading.Thread(target=write_entries)
+    thread.start()
+    processor.process(navigator)
+    thread.join()
+    self.assertEquals(
+        ['Starting journal.'] + ['Message {0}'.format(i) for i in range(50)]
+        + ['Finished journal.'],
+        got)
+
+  def test_merged(self):
+    def write_journal(name, times):
+      clock = iter(times)
+      path = os.path.join(self.temp_dir, name + '.journal')
+      journal = Journal(now_function=lambda: next(clock))
+      journal.open_with_path(path, _message=None)
+      journal.begin_context(name)
+      journal.write_message(name + ' inside')
+      journal.end_context()
+      journal.write_message(name + ' after')
+      journal.terminate(_message=None)
+      return path
+
+    paths = [write_journal('merge_a', [1, 2, 5, 6]),
+             write_journal('merge_b', [0, 3, 4, 7])]
+
+    def summarize(navigator):
+      return [(entry['_journal'], entry.get('_value') or entry['control'])
+              for entry in navigator]
+
+    # Whole top-level contexts are kept together by default.
+    self.assertEquals(
+        [('merge_b', 'BEGIN'), ('merge_b', 'merge_b inside'),
+         ('merge_b', 'END'),
+         ('merge_a', 'BEGIN'), ('merge_a', 'merge_a inside'),
+         ('merge_a', 'END'),
+         ('merge_a', 'merge_a after'), ('merge_b', 'merge_b after')],
+        summarize(MergedJournalNavigator.new_from_paths(paths)))
+
+    navigator = MergedJournalNavigator.new_from_paths(
+        paths, interleave_contexts=True)
+    self.assertEquals('merge_a+merge_b', navigator.journal_name)
+    entries = list(navigator)
+    self.assertEquals([0, 1, 2, 3, 4, 5, 6, 7],
+                      [entry['_timestamp'] for entry in entries])
+
+    navigator = MergedJournalNavigator.new_from_paths(paths)
+    navigator.set_type_filter(['JournalMessage'])
+    self.assertEquals(
+        ['merge_b inside', 'merge_a inside', 'merge_a after', 'merge_b after'],
+        [entry['_value'] for entry in navigator
+         if entry['_type'] == 'JournalMessage'])
+
+  def test_blobs(self):
+    def write_journal(path, **kwargs):
+      journal = Journal(now_function=lambda: 1.0, **kwargs)
+      journal.open_with_path(path, _index=True)
+      for name in ['first', 'second', 'third']:
+        journal.store(LargeData(name))
+      journal.terminate()
+
+    plain_path = os.path.join(self.temp_dir, 'test_no_blobs.journal')
+    write_journal(plain_path)
+    expect = list(StreamJournalNavigator.new_from_path(plain_path))
+
+    path = os.path.join(self.temp_dir, 'test_blobs.journal')
+    write_journal(path, blob_min_bytes=100)
+    self.assertLess(os.path.getsize(path), os.path.getsize(plain_path))
+    with open(path, 'rb') as stream:
+      self.assertEquals(
+          2, sum(1 for text in RecordInputStream(stream)
+                 if '"JournalBlob"' in text))
+
+    self.assertEquals(expect, list(StreamJournalNavigator.new_from_path(path)))
+    self.assertEquals(
+        expect, list(ParallelJournalNavigator(path, processes=2,
+                                              chunk_bytes=256)))
+    self.assertEquals(expect, list(IndexedJournalNavigator.new_from_path(path)))
+
+    navigator = IndexedJournalNavigator.new_from_path(path)
+    navigator.set_type_filter(['JsonSnapshot'])
+    self.assertEquals(expect[1:4], list(navigator))
+
+    navigator = StreamJournalNavigator.new_from_path(path)
+    navigator.set_type_filter(['JsonSnapshot'])
+    self.assertEquals(expect[1:4], list(navigator))
+
+  def test_shared_entities(self):
+    part = SharedPart('parent', SharedPart('child'))
+
+    def write_journal(**kwargs):
+      output = BytesIO()
+      journal = Journal(now_function=lambda: 1.0, **kwargs)
+      journal.open_with_file(output, _message=None)
+      for name in ['first', 'second', 'third']:
+        journal.store(PartUser(name, part))
+      return output.getvalue()
+
+    plain = write_journal()
+    expect = list(StreamJournalNavigator.new_from_bytes('plain', plain))
+    self.assertEquals(3, len(expect[0]['_entities']))
+
+    contents = write_journal(share_entities=True)
+    self.assertEquals(
+        2, sum(1 for text in RecordInputStream(BytesIO(contents))
+               if '"JournalBlob"' in text))
+    self.assertEquals(
+        expect, list(StreamJournalNavigator.new_from_bytes('shared', contents)))
+
+  def test_shared_entities_with_mutable_part(self):
+    def write_journal(**kwargs):
+      mutable = MutablePart(['a'])
+      part = SharedPart('parent', mutable)
+      output = BytesIO()
+      journal = Journal(now_function=lambda: 1.0, **kwargs)
+      journal.open_with_file(output, _message=None)
+      journal.store(PartUser('first', part))
+      mutable.append('b')
+      journal.store(PartUser('second', part))
+      journal.store(PartUser('third', part))
+      return output.getvalue()
+
+    plain = write_journal()
+    expect = list(StreamJournalNavigator.new_from_bytes('plain', plain))
+    self.assertNotEqual(expect[0]['_entities'], expect[1]['_entities'])
+
+    contents = write_journal(share_entities=True)
+    self.assertEquals(
+        2, sum(1 for text in RecordInputStream(BytesIO(contents))
+               if '"JournalBlob"' in text))
+    self.assertEquals(
+        expect, list(StreamJournalNavigator.new_from_bytes('shared', contents)))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -21,6 +21,7 @@
 
 import json
 import threading
+import time
 import unittest
 
 from io import BytesIO
@@ -60,9 +61,9 @@ class TestJournal(Journal):
   def clock(self):
     return self.__clock
 
-  def __init__(self, output):
+  def __init__(self, output, **kwargs):
     self.__clock = TestClock()
-    super(TestJournal, self).__init__(now_function=self.__clock)
+    super(TestJournal, self).__init__(now_function=self.__clock, **kwargs)
     self.open_with_file(output)
     self.__output = output
     self.final_content = None
@@ -185,6 +186,43 @@ class JournalTest(unittest.TestCase):
     json_object['_thread'] = threading.current_thread().ident
     self.assertItemsEqual(json_object, got)
 
+  def test_store_streamed_entities(self):
+    """Verify streamed snapshots decode the same as built snapshots."""
+    data = TestData('NAME', 1234, TestDetails())
+    snapshot = JsonSnapshot(_title='Test')
+    snapshot.add_object(data)
+    expect = snapshot.to_json_object()
+    expect['_timestamp'] = 1.23
+    expect['_thread'] = threading.current_thread().ident
+
+    # JSON turns the integer entity ids into string keys.
+    decoder = json.JSONDecoder()
+    expect = decoder.decode(json.JSONEncoder().encode(expect))
+    for encoding in ['pretty', 'compact', 'zlib']:
+      journal = Journal(lambda: 1.23, encoding=encoding)
+      output = BytesIO()
+      journal.open_with_file(output, _message=None)
+      journal.store(data, _title='Test')
+      got = [decoder.decode(text)
+             for text in RecordInputStream(BytesIO(output.getvalue()))]
+      self.assertEquals([expect], got)
+
+  def test_store_streamed_pretty_text(self):
+    """Verify streamed snapshots are indented as if built in memory."""
+    snapshot = JsonSnapshot()
+    snapshot.add_object(TestDetails())
+    expect = snapshot.to_json_object()
+    expect['_timestamp'] = 1.23
+    expect['_thread'] = threading.current_thread().ident
+
+    journal = Journal(lambda: 1.23)
+    output = BytesIO()
+    journal.open_with_file(output, _message=None)
+    journal.store(TestDetails())
+    self.assertEquals(
+        json.JSONEncoder(indent=2, separators=(',', ': ')).encode(expect),
+        next(RecordInputStream(BytesIO(output.getvalue()))))
+
   def test_lifecycle(self):
     """Verify we store multiple objects as a list of snapshots."""
     first = TestData('first', 1, TestDetails())
@@ -217,6 +255,192 @@ class JournalTest(unittest.TestCase):
     json_object['_thread'] = threading.current_thread().ident
     self.assertItemsEqual(json_object, got[2])
 
+  def test_async_preserves_order(self):
+    """Verify the background writer drains all entries in order."""
+    journal = TestJournal(BytesIO(), async_queue_size=2)
+    self.assertTrue(journal.is_async)
+    for index in range(50):
+      journal.write_message('Message {0}'.format(index))
+    journal.terminate()
+
+    decoder = json.JSONDecoder()
+    got = [decoder.decode(text)['_value']
+           for text in RecordInputStream(BytesIO(journal.final_content))]
+    self.assertEquals(
+        ['Starting journal.']
+        + ['Message {0}'.format(index) for index in range(50)]
+        + ['Finished journal.'],
+        got)
+
+  def test_async_from_many_threads(self):
+    """Verify each thread's entries are written in the order queued."""
+    journal = TestJournal(BytesIO(), async_queue_size=4)
+    def write_messages(name):
+      for index in range(20):
+        journal.write_message(name, index=index)
+
+    threads = [threading.Thread(target=write_messages, args=(str(i),))
+               for i in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    journal.terminate()
+
+    decoder = json.JSONDecoder()
+    got = {}
+    for text in RecordInputStream(BytesIO(journal.final_content)):
+      entry = decoder.decode(text)
+      if 'index' in entry:
+        got.setdefault(entry['_value'], []).append(entry['index'])
+    self.assertEquals({str(i): list(range(20)) for i in range(5)}, got)
+
+  def test_async_terminate_while_writing(self):
+    """Verify entries are either written or refused while terminating."""
+    self.check_terminate_while_writing(async_queue_size=2)
+
+  def test_buffer_per_thread_terminate_while_writing(self):
+    """Verify buffered entries are either written or refused."""
+    self.check_terminate_while_writing(buffer_per_thread=True)
+
+  def check_terminate_while_writing(self, **kwargs):
+    journal = TestJournal(BytesIO(), **kwargs)
+    started = threading.Event()
+    written = {}
+    def write_messages(name):
+      written[name] = 0
+      try:
+        while True:
+          journal.write_message(name, index=written[name])
+          written[name] += 1
+          started.set()
+      except ValueError:
+        pass
+
+    threads = [threading.Thread(target=write_messages, args=(str(i),))
+               for i in range(4)]
+    for thread in threads:
+      thread.start()
+    started.wait()
+    journal.terminate()
+    for thread in threads:
+      thread.join(10)
+      self.assertFalse(thread.is_alive())
+
+    decoder = json.JSONDecoder()
+    got = {}
+    for text in RecordInputStream(BytesIO(journal.final_content)):
+      entry = decoder.decode(text)
+      if 'index' in entry:
+        got[entry['_value']] = got.get(entry['_value'], 0) + 1
+    self.assertEquals({name: count for name, count in written.items()
+                       if count},
+                      got)
+
+  def test_buffer_per_thread(self):
+    """Verify buffered entries from many threads are merged by timestamp."""
+    clock_lock = threading.Lock()
+    clock = [0]
+    def now():
+      with clock_lock:
+        clock[0] += 1
+        return clock[0]
+
+    output = BytesIO()
+    journal = Journal(now_function=now, buffer_per_thread=True)
+    journal.open_with_file(output)
+    journal._do_close = lambda: None  # Keep the output for inspection.
+    def write_messages(name):
+      journal.begin_context(name)
+      for index in range(20):
+        journal.write_message(name, index=index)
+      journal.end_context()
+
+    threads = [threading.Thread(target=write_messages, args=(str(i),))
+               for i in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    journal.terminate()
+
+    decoder = json.JSONDecoder()
+    entries = [decoder.decode(text)
+               for text in RecordInputStream(BytesIO(output.getvalue()))]
+    timestamps = [entry['_timestamp'] for entry in entries]
+    self.assertEquals(sorted(timestamps), timestamps)
+    self.assertEquals(5 * 22 + 2, len(entries))
+    self.assertEquals('Finished journal.', entries[-1]['_value'])
+
+  def test_buffer_per_thread_holds_back_later_entries(self):
+    """Verify entries wait for a stalled thread's earlier entry."""
+    clock_lock = threading.Lock()
+    clock = [0]
+    stalled = threading.Event()
+    resume = threading.Event()
+    def now():
+      with clock_lock:
+        clock[0] += 1
+        timestamp = clock[0]
+      if threading.current_thread().name == 'stalled':
+        stalled.set()
+        resume.wait()
+      return timestamp
+
+    output = BytesIO()
+    journal = Journal(now_function=now, buffer_per_thread=True)
+    journal.open_with_file(output)
+    journal._do_close = lambda: None  # Keep the output for inspection.
+    thread = threading.Thread(
+        target=journal.write_message, args=('stalled',), name='stalled')
+    thread.start()
+    stalled.wait()
+    journal.write_message('later')
+    time.sleep(3 * journal._MERGE_INTERVAL)
+    resume.set()
+    thread.join()
+    journal.terminate()
+
+    decoder = json.JSONDecoder()
+    entries = [decoder.decode(text)
+               for text in RecordInputStream(BytesIO(output.getvalue()))]
+    self.assertEquals(['stalled', 'later'],
+                      [entry['_value'] for entry in entries[1:3]])
+
+  def test_buffer_per_thread_terminate_while_stamping(self):
+    """Verify terminate waits for an entry that is being buffered."""
+    stamping = threading.Event()
+    resume = threading.Event()
+    def now():
+      if threading.current_thread().name == 'stamping':
+        stamping.set()
+        resume.wait(10)
+      return 1.0
+
+    output = BytesIO()
+    journal = Journal(now_function=now, buffer_per_thread=True)
+    journal.open_with_file(output, _message=None)
+    journal._do_close = lambda: None  # Keep the output for inspection.
+    writer = threading.Thread(
+        target=journal.write_message, args=('Late',), name='stamping')
+    writer.start()
+    stamping.wait()
+    terminator = threading.Thread(
+        target=journal.terminate, kwargs={'_message': None})
+    terminator.start()
+    time.sleep(3 * journal._MERGE_INTERVAL)
+    resume.set()
+    writer.join()
+    terminator.join()
+
+    got = [json.loads(text)['_value']
+           for text in RecordInputStream(BytesIO(output.getvalue()))]
+    self.assertEquals(['Late'], got)
+
+  def test_buffer_per_thread_is_not_async(self):
+    with self.assertRaises(ValueError):
+      Journal(async_queue_size=10, buffer_per_thread=True)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,168 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test snapshot_budget module."""
+# pylint: disable=missing-docstring
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from io import BytesIO
+from citest.base import (
+    Journal,
+    JsonSnapshot,
+    JsonSnapshotableEntity,
+    RecordInputStream,
+    SnapshotPayloadBudget)
+
+
+class TestResponse(JsonSnapshotableEntity):
+  def __init__(self, body, items):
+    self.body = body
+    self.items = items
+
+  def export_to_json_snapshot(self, snapshot, entity):
+    builder = snapshot.edge_builder
+    builder.make_output(entity, 'Body', self.body, format='pre')
+    builder.make_data(entity, 'Items', self.items, format='json')
+    builder.make_control(entity, 'Control', self.body)
+
+
+class SnapshotBudgetTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.temp_dir = tempfile.mkdtemp(prefix='snapshot_budget_test')
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.temp_dir)
+
+  def test_edge_budget(self):
+    body = 'H' * 100 + 'x' * 1000 + 'T' * 100
+    items = list(range(10))
+    snapshot = JsonSnapshot(_payload_budget=SnapshotPayloadBudget(
+        edge_bytes=500, preview_bytes=200))
+    entity = snapshot.make_entity_for_object(TestResponse(body, items))
+    body_edge, items_edge, control_edge = [
+        edge.to_json_object() for edge in entity.edges]
+
+    self.assertEqual(
+        'H' * 100 + '\n... [1000 bytes omitted] ...\n' + 'T' * 100,
+        body_edge['_value'])
+    self.assertEqual(
+        {'label': 'Body', 'relation': 'OUTPUT', 'format': 'pre',
+         '_truncated': True, '_original_size': 1200,
+         '_digest': hashlib.sha256(body.encode('utf-8')).hexdigest()},
+        dict((key, value) for key, value in body_edge.items()
+             if key != '_value'))
+
+    # Small values and other relations are untouched.
+    self.assertEqual(items, items_edge['_value'])
+    self.assertEqual(body, control_edge['_value'])
+    self.assertFalse('_truncated' in control_edge)
+
+  def test_snapshot_budget(self):
+    budget = SnapshotPayloadBudget(snapshot_bytes=1000, preview_bytes=10)
+    snapshot = JsonSnapshot(_payload_budget=budget)
+    responses = [TestResponse('a' * 900, [1] * 150),
+                 TestResponse('b' * 100, [])]
+    first, second = [snapshot.make_entity_for_object(response)
+                     for response in responses]
+    self.assertEqual(
+        [None, True, None, True, None, None],
+        [edge.metadata.get('_truncated')
+         for edge in first.edges + second.edges])
+
+  def test_exhausted_snapshot_budget(self):
+    for edge_bytes in [0, 1000]:
+      budget = SnapshotPayloadBudget(edge_bytes=edge_bytes,
+                                     snapshot_bytes=2000, preview_bytes=100)
+      value, size, metadata = budget.limit_payload('x' * 5000, 2000)
+      self.assertEqual(budget.make_preview('x' * 5000), value)
+      self.assertEqual(len(value), size)
+      self.assertEqual(5000, metadata['_original_size'])
+      self.assertTrue(metadata['_truncated'])
+
+    snapshot = JsonSnapshot(_payload_budget=SnapshotPayloadBudget(
+        snapshot_bytes=1000, preview_bytes=10))
+    first, second = [snapshot.make_entity_for_object(response)
+                     for response in [TestResponse('a' * 1000, []),
+                                      TestResponse('b' * 500, [])]]
+    self.assertEqual(None, first.edges[0].metadata.get('_truncated'))
+    self.assertEqual(True, second.edges[0].metadata.get('_truncated'))
+
+  def test_spill(self):
+    spill_dir = os.path.join(self.temp_dir, 'test.payloads')
+    budget = SnapshotPayloadBudget(edge_bytes=100, spill_dir=spill_dir)
+    body = 'B' * 5000
+    items = [{'index': i} for i in range(1000)]
+
+    def store(journal):
+      output = BytesIO()
+      journal.open_with_file(output, _message=None)
+      journal.store(TestResponse(body, items))
+      return output.getvalue()
+
+    unlimited = store(Journal())
+    contents = store(Journal(payload_budget=budget))
+    self.assertLess(len(contents), len(unlimited) - len(body))
+
+    entry = json.loads(next(iter(RecordInputStream(BytesIO(contents)))))
+    edges = entry['_entities']['1']['_edges']
+    self.assertEqual('test.payloads',
+                     os.path.dirname(edges[0]['_payload_path']))
+    with open(os.path.join(self.temp_dir, edges[0]['_payload_path'])) as f:
+      self.assertEqual(body, f.read())
+    with open(os.path.join(self.temp_dir, edges[1]['_payload_path'])) as f:
+      self.assertEqual(items, json.load(f))
+
+  def test_concurrent_spill(self):
+    spill_dir = os.path.join(self.temp_dir, 'concurrent.payloads')
+    budget = SnapshotPayloadBudget(edge_bytes=100, preview_bytes=10,
+                                   spill_dir=spill_dir)
+    errors = []
+
+    def spill(index):
+      try:
+        budget.limit_payload('x' * 1000 + str(index % 2), 0)
+      except Exception as ex:
+        errors.append(ex)
+
+    threads = [threading.Thread(target=spill, args=(index,))
+               for index in range(10)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual([], errors)
+    self.assertEqual(2, len(os.listdir(spill_dir)))
+
+  def test_size_is_encoded_bytes(self):
+    budget = SnapshotPayloadBudget(edge_bytes=150, preview_bytes=20)
+    text = u'\u00e9' * 100
+    value, size, metadata = budget.limit_payload(text, 0)
+    self.assertEqual(200, metadata['_original_size'])
+    self.assertEqual(u'\u00e9' * 5 + u'\n... [180 bytes omitted] ...\n'
+                     + u'\u00e9' * 5, value)
+    self.assertEqual(len(value.encode('utf-8')), size)
+
+
+if __name__ == '__main__':
+  unittest.main()
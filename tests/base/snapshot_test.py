@@ -18,13 +18,16 @@
 # pylint: disable=too-few-public-methods
 # pylint: disable=invalid-name
 
+import sys
 import unittest
 
 from citest.base import (
+    Edge,
     JsonSnapshot,
     JsonSnapshotable,
     JsonSnapshotableEntity,
-    JsonSnapshotHelper)
+    JsonSnapshotHelper,
+    SnapshotRelation)
 
 
 class TestWrappedValue(JsonSnapshotable):
@@ -151,6 +154,37 @@ class SnapshotTest(unittest.TestCase):
     self.assertEquals(expect, snapshot.to_json_object())
     self.assertEquals(1, snapshot.find_entity_for_object(ll).id)
 
+  def test_to_json_snapshot_value_containers(self):
+    snapshot = JsonSnapshot()
+    plain = {'a': [1, 'two', None], 'b': {'c': 3.0, 'd': True}}
+    self.assertTrue(
+        JsonSnapshotHelper.ToJsonSnapshotValue(plain, snapshot) is plain)
+
+    ll = TestLinkedList('X')
+    value = {'a': [1, ll, TestWrappedValue([dict])], 'b': plain['b']}
+    converted = JsonSnapshotHelper.ToJsonSnapshotValue(value, snapshot)
+    self.assertEquals(
+        {'a': [1, {'_type': 'EntityReference', '_id': 1}, ['type dict']],
+         'b': {'c': 3.0, 'd': True}},
+        converted)
+    self.assertTrue(converted['b'] is plain['b'])
+    self.assertEquals([1, ll, TestWrappedValue([dict])], value['a'])
+
+    # Deep nesting is not limited by the recursion limit.
+    deep = []
+    node = deep
+    for _ in range(sys.getrecursionlimit() * 2):
+      node.append([])
+      node = node[0]
+    node.append(dict)
+    converted = JsonSnapshotHelper.ToJsonSnapshotValue(deep, snapshot)
+    for _ in range(sys.getrecursionlimit() * 2):
+      converted = converted[0]
+    self.assertEquals(['type dict'], converted)
+
+    self.assertRaises(TypeError, JsonSnapshotHelper.ToJsonSnapshotValue,
+                      [object()], snapshot)
+
   def test_snapshot_make_entity(self):
     """Test snapshotting JsonSnapshotableEntity objects into entities."""
     elem = TestLinkedList('Hello')
@@ -206,6 +240,33 @@ class SnapshotTest(unittest.TestCase):
     json_obj = snapshot.to_json_object()
     self.assertItemsEqual(expect, json_obj)
 
+  def test_snapshot_stream_entities(self):
+    expect_snapshot = JsonSnapshot()
+    expect_snapshot.add_object(
+        TestLinkedList('A', next_elem=TestLinkedList('B')))
+    expect = expect_snapshot.to_json_object()['_entities']
+
+    written = []
+    snapshot = JsonSnapshot()
+    snapshot.stream_entities(
+        lambda entity: written.append((entity, entity.to_json_object())))
+    elem = TestLinkedList('A', next_elem=TestLinkedList('B'))
+    snapshot.add_object(elem)
+
+    # Entities are written once their export completes, innermost first.
+    self.assertEquals([expect[2], expect[1]], [json for _, json in written])
+    self.assertEquals({'_type': 'JsonSnapshot', '_subject_id': 1},
+                      snapshot.to_json_object())
+    self.assertEquals(1, snapshot.make_entity_for_object(elem).id)
+    with self.assertRaises(ValueError):
+      written[0][0].add_metadata('name', 'value')
+
+    # Entities outside of an export are written when flushed.
+    other = snapshot.new_entity(name='Other')
+    snapshot.flush_entities()
+    self.assertEquals(other, written[-1][0])
+    self.assertEquals({'_id': 3, 'name': 'Other'}, written[-1][1])
+
   def test_snapshot_fields(self):
     """Test snapshotting an entity whose data are simple values."""
     snapshot = JsonSnapshot(title='Test Snapshot')
@@ -250,6 +311,31 @@ class SnapshotTest(unittest.TestCase):
 
     self.assertItemsEqual(expect, json_obj)
 
+  def test_snapshot_compact_edges(self):
+    snapshot = JsonSnapshot()
+    entity_a = snapshot.new_entity(name='Entity A')
+    entity_b = snapshot.new_entity(name='Entity B')
+    builder = snapshot.edge_builder
+    first = builder.make_valid(entity_a, 'First', entity_b)
+    builder.make(entity_a, 'Nothing', None)
+    builder.make_data(entity_a, 'Data', 'x', format='json')
+    second = builder.make(entity_a, 'Second', entity_b)
+    entity_a.add_edge(Edge(_value=1, label='Plain'))
+
+    for obj in [entity_a, first]:
+      self.assertFalse(hasattr(obj, '__dict__'))
+    self.assertEqual(SnapshotRelation.VALID, first.metadata['relation'])
+    self.assertEqual([[first, second]], list(entity_a.edge_lists))
+    self.assertEqual(
+        {'_id': 1, 'name': 'Entity A',
+         '_edges': [{'_to': 2, 'label': 'First', 'relation': 'VALID'},
+                    {'label': 'Nothing'},
+                    {'_value': 'x', 'label': 'Data', 'relation': 'DATA',
+                     'format': 'json'},
+                    {'_to': 2, 'label': 'Second'},
+                    {'_value': 1, 'label': 'Plain'}]},
+        entity_a.to_json_object())
+
   def test_snapshot_list(self):
     a = TestLinkedList('A')
     b = TestLinkedList('B')
@@ -45,6 +45,38 @@ class FakeObserver(jc.ObjectObserver):
     return observation.objects
 
 
+class SequencedFakeObserver(jc.ObjectObserver):
+  """Observes the next of a sequence of object lists each time."""
+  def __init__(self, object_lists):
+    super(SequencedFakeObserver, self).__init__()
+    self.__object_lists = list(object_lists)
+    self.num_observations = 0
+
+  def collect_observation(self, context, observation):
+    objects = self.__object_lists[
+        min(self.num_observations, len(self.__object_lists) - 1)]
+    self.num_observations += 1
+    observation.add_all_objects(objects)
+    return observation.objects
+
+
+class CallCountingVerifier(jc.ObservationVerifier):
+  """Counts the detailed verifications requested."""
+  def __init__(self, verifier):
+    super(CallCountingVerifier, self).__init__(verifier.title)
+    self.__verifier = verifier
+    self.num_calls = 0
+    self.num_valid_checks = 0
+
+  def __call__(self, context, observation):
+    self.num_calls += 1
+    return self.__verifier(context, observation)
+
+  def is_valid(self, context, observation):
+    self.num_valid_checks += 1
+    return self.__verifier.is_valid(context, observation)
+
+
 class JsonContractTest(unittest.TestCase):
   def assertEqual(self, expect, have, msg=''):
     if not msg:
@@ -245,6 +277,23 @@ class JsonContractTest(unittest.TestCase):
     self.assertEqual(expect_result, result)
     self.assertFalse(result)
 
+  def test_clause_retry_returns_passing_attempt(self):
+    context = ExecutionContext()
+    fake_observer = SequencedFakeObserver([['B'], ['B', 'A']])
+
+    eq_A = jp.LIST_MATCHES([jp.STR_EQ('A')])
+    verifier = CallCountingVerifier(
+        jc.ValueObservationVerifierBuilder('Has A').EXPECT(eq_A).build())
+    clause = jc.ContractClause('TestClause', fake_observer, verifier,
+                               retryable_for_secs=0.1)
+
+    result = clause.verify(context)
+    self.assertTrue(result)
+    self.assertEqual(2, fake_observer.num_observations)
+    self.assertEqual(2, verifier.num_calls)
+    self.assertEqual(0, verifier.num_valid_checks)
+    self.assertEqual(['B', 'A'], result.verify_results.observation.objects)
+
 
   def _try_verify(self, context, contract, observation,
                   expect_ok, expect_results=None, dump=False):
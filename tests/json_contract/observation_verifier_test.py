@@ -72,6 +72,17 @@ class FakeObservationVerifier(jc.ObservationVerifier):
     return self.__result
 
 
+class IndexRecordingPredicate(jp.ValuePredicate):
+  def __init__(self, path):
+    super(IndexRecordingPredicate, self).__init__()
+    self.indexes = []
+    self.__pred = jp.PathPredicate(path)
+
+  def __call__(self, context, value):
+    self.indexes.append(context.get(jp.PATH_VALUE_INDEX_KEY, None))
+    return self.__pred(context, value)
+
+
 class ObservationVerifierTest(unittest.TestCase):
   def assertEqual(self, expect, have, msg=''):
     if not msg:
@@ -171,6 +182,34 @@ class ObservationVerifierTest(unittest.TestCase):
     self.assertEqual(expect, got)
     self.assertEqual(verifiers, _called_verifiers)
 
+  def test_observation_verifier_shares_path_value_index(self):
+    context = ExecutionContext()
+    observation = jc.Observation()
+    observation.add_all_objects([{'a': 1}, {'a': 2}, {'b': 3}])
+    preds = [IndexRecordingPredicate('a'), IndexRecordingPredicate('a')]
+    builder = jc.ObservationVerifierBuilder(title='Test')
+    for pred in preds:
+      builder.AND(jc.ObservationValuePredicate(pred))
+
+    got = builder.build()(context, observation)
+    self.assertTrue(got)
+    index = preds[0].indexes[0]
+    self.assertTrue(isinstance(index, jp.PathValueIndex))
+    self.assertEqual([index], preds[1].indexes)
+    self.assertIsNone(context.get(jp.PATH_VALUE_INDEX_KEY, None))
+
+    # Each path is traced once through the observed objects.
+    path_values, failures = index.trace(observation.objects, 'a')
+    self.assertTrue(path_values is index.trace(observation.objects, 'a')[0])
+    self.assertEqual([jp.PathValue('[0]/a', 1), jp.PathValue('[1]/a', 2)],
+                     path_values)
+    self.assertEqual(1, len(failures))
+
+    plain_result = jp.PathPredicate('a')(ExecutionContext(),
+                                         observation.objects)
+    for pred_result in got.good_results:
+      self.assertEqual(plain_result, pred_result.pred_result)
+
   def test_result_observation_verifier_conjunction_failure_aborts_early(self):
     context = ExecutionContext()
     builder = jc.ObservationVerifierBuilder(title='Test')
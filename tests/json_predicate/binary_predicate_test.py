@@ -312,6 +312,26 @@ class JsonBinaryPredicateTest(unittest.TestCase):
                            pred=jp.LIST_SIMILAR(actual_source)),
         result)
 
+  def test_list_subset_indexed_values(self):
+    context = ExecutionContext()
+    source = [{'id': i, 'name': 'item{0}'.format(i), 'tags': ['a', 'b']}
+              for i in range(100)]
+    source.extend([{'id': [1, 2]}, 'text', 7, [3, {'x': 'X'}], {'name': 'x'}])
+
+    for expect_valid, operand, strict in [
+        (True, [{'id': 7}, {'id': 99, 'tags': ['b']}], False),
+        (False, [{'id': 7, 'name': 'item8'}], False),
+        (True, [{'id': 2}], False),  # Contained within [1, 2]
+        (False, [{'id': 7, 'tags': ['c']}], False),
+        (True, [{'name': 'x'}, 'text', 7, [{'x': 'X'}]], False),
+        (True, [{'id': 7, 'name': 'item7', 'tags': ['a', 'b']}], True),
+        (False, [{'id': 7, 'name': 'item7', 'tags': ['b', 'a']}], True),
+        (True, [[3, {'x': 'X'}], 7.0], True),
+        (False, [[{'x': 'X'}]], True)]:
+      pred = jp.LIST_SUBSET(operand, strict=strict)
+      self.assertEqual(expect_valid, pred(context, source).valid,
+                       '{0} strict={1}'.format(operand, strict))
+
 
 if __name__ == '__main__':
   unittest.main()
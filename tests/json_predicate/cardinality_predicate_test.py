@@ -34,6 +34,21 @@ _AorX = jp.OR([_eq_A, _eq_X])
 _AorB = jp.OR([_eq_A, _eq_B])
 
 
+class CountingPredicate(jp.ValuePredicate):
+  """Counts the values that the wrapped predicate is applied to."""
+  def __init__(self, pred):
+    self.__pred = pred
+    self.count = 0
+
+  def __call__(self, context, value):
+    self.count += 1
+    return self.__pred(context, value)
+
+  def is_valid(self, context, value):
+    self.count += 1
+    return self.__pred.is_valid(context, value)
+
+
 class CardinalityPredicateTest(unittest.TestCase):
   def assertEqual(self, expect, have, msg=''):
     try:
@@ -150,6 +165,21 @@ class CardinalityPredicateTest(unittest.TestCase):
                   predicate, expect_path_result),
               result)
 
+  def test_cardinality_is_valid_stops_early(self):
+    context = ExecutionContext()
+    source = ['A'] * 1000
+    for min, max, expect_valid, expect_count in [
+        (0, 0, False, 1),
+        (1, None, True, 1),
+        (3, None, True, 3),
+        (1, 2, False, 3),
+        (1, 2000, True, 1000)]:
+      counter = CountingPredicate(_eq_A)
+      predicate = jp.CardinalityPredicate(counter, min=min, max=max)
+      self.assertEqual(expect_valid, predicate.is_valid(context, source))
+      self.assertEqual(expect_count, counter.count)
+      self.assertEqual(expect_valid, bool(predicate(context, source)))
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -227,6 +227,34 @@ class LogicPredicateTest(unittest.TestCase):
       self.assertFalse(result)
       self.assertEqual(expect, result)
 
+  def test_is_valid(self):
+    context = ExecutionContext()
+    aA = jp.PathEqPredicate('a', 'A')
+    bB = jp.PathEqPredicate('b', 'B')
+    cC = jp.PathEqPredicate('c', 'C')
+    preds = [jc.AND([aA, bB]), jc.OR([aA, bB]), jc.NOT(aA),
+             jc.IF(aA, bB), jc.IF(aA, bB, cC),
+             jc.CardinalityPredicate(aA, min=1, max=1),
+             jc.CardinalityPredicate(aA, min=0, max=0)]
+    test_cases = [{'a':'A', 'b':'B', 'c':'C'},
+                  {'a':'A', 'b':'X', 'c':'C'},
+                  {'a':'X', 'b':'B', 'c':'C'},
+                  {'a':'X', 'b':'X', 'c':'X'},
+                  {'b':'B'}]
+    for pred in preds:
+      for test in test_cases:
+        self.assertEqual(bool(pred(context, test)),
+                         pred.is_valid(context, test),
+                         '{0} on {1}'.format(pred, test))
+
+  def test_is_valid_with_specialized_call(self):
+    class AlwaysValid(jc.NegationPredicate):
+      def __call__(self, context, value):
+        return jc.PredicateResult(True)
+
+    context = ExecutionContext()
+    pred = AlwaysValid(jp.PathEqPredicate('a', 'A'))
+    self.assertTrue(pred.is_valid(context, _LETTER_DICT))
 
 if __name__ == '__main__':
   unittest.main()
@@ -29,7 +29,9 @@ from citest.json_predicate import (
     PathPredicateResultBuilder,
     PathValue,
     PathValueResult,
+    IndexBoundsError,
     MissingPathError,
+    TypeMismatchError,
     ValuePredicate
     )
 
@@ -318,6 +320,34 @@ class JsonPathPredicateTest(unittest.TestCase):
     self.assertEqual([], values.path_failures)
 
 
+  def test_collect_with_index_mismatch(self):
+    # """Path with list indexes into values that are not lists."""
+    context = ExecutionContext()
+    source = {'outer': [_LETTER_DICT, ['x', 'y']]}
+    pred = PathPredicate('outer[1][3]')
+    values = pred(context, source)
+    self.assertEqual([], values.path_values)
+    self.assertEqual(
+        [IndexBoundsError(3, list, target_path='[3]',
+                          path_value=PathValue('outer[1]', ['x', 'y']))],
+        values.path_failures)
+
+    pred = PathPredicate('outer[0][1]')
+    values = pred(context, source)
+    self.assertEqual([], values.path_values)
+    self.assertEqual(
+        [TypeMismatchError(list, dict, _LETTER_DICT, 'outer[0][1]',
+                           PathValue('outer[0]', _LETTER_DICT))],
+        values.path_failures)
+
+    pred = PathPredicate('outer/a')
+    values = pred(context, source)
+    self.assertEqual([PathValue('outer[0]/a', 'A')], values.path_values)
+    self.assertEqual(
+        [MissingPathError('x', 'a', path_value=PathValue('outer[1][0]', 'x')),
+         MissingPathError('y', 'a', path_value=PathValue('outer[1][1]', 'y'))],
+        values.path_failures)
+
   def test_collect_from_nested_list_found(self):
     # """Ambiguous path through nested lists."""
     context = ExecutionContext()
@@ -0,0 +1,82 @@
+# Copyright 2018 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test citest.reporting.trace_renderer module."""
+
+import unittest
+
+from citest.reporting.trace_renderer import TraceEventRenderer
+
+
+class TestNavigator(object):
+  # pylint: disable=missing-docstring
+  def __init__(self, entries):
+    self.__entries = iter(entries)
+
+  def set_type_filter(self, types):
+    pass
+
+  def __iter__(self):
+    return self.__entries
+
+
+class TraceEventRendererTest(unittest.TestCase):
+  # pylint: disable=missing-docstring
+
+  def test_contexts(self):
+    entries = [
+        {'_type': 'JournalContextControl', 'control': 'BEGIN',
+         '_title': 'Outer', '_timestamp': 10.0, '_thread': 1,
+         '_context_id': 1, '_parent_id': None},
+        {'_type': 'JournalContextControl', 'control': 'BEGIN',
+         '_title': 'Other', '_timestamp': 10.5, '_thread': 2},
+        {'_type': 'JournalMessage', '_value': 'Hello\nWorld',
+         '_timestamp': 11.0, '_thread': 1, '_level': 10},
+        {'_type': 'JournalContextControl', 'control': 'END',
+         '_timestamp': 12.5, '_thread': 1, 'relation': 'VALID',
+         '_context_id': 1, '_parent_id': None,
+         '_monotonic_start': 100.0, '_monotonic_end': 102.0},
+        {'_type': 'JournalContextControl', 'control': 'BEGIN',
+         '_title': 'Unfinished', '_timestamp': 13.0, '_thread': 1},
+        {'_type': 'JournalMessage', '_value': 'Bye',
+         '_timestamp': 14.0, '_thread': 2},
+    ]
+    renderer = TraceEventRenderer(include_messages=True)
+    renderer.process(TestNavigator(entries))
+    renderer.terminate()
+
+    self.assertEqual(
+        [('Outer', 'X', 10000000, 2000000, 1),
+         ('Other', 'X', 10500000, 3500000, 2),
+         ('Hello', 'i', 11000000, None, 1),
+         ('Unfinished', 'X', 13000000, 1000000, 1),
+         ('Bye', 'i', 14000000, None, 2)],
+        [(event['name'], event['ph'], event['ts'], event.get('dur'),
+          event['tid'])
+         for event in renderer.events])
+    self.assertEqual({'context_id': 1, 'relation': 'VALID'},
+                     renderer.events[0]['args'])
+    self.assertEqual({'unfinished': True}, renderer.events[1]['args'])
+
+  def test_messages_are_optional(self):
+    renderer = TraceEventRenderer()
+    renderer.process(TestNavigator([
+        {'_type': 'JournalMessage', '_value': 'Hello',
+         '_timestamp': 11.0, '_thread': 1}]))
+    renderer.terminate()
+    self.assertEqual([], renderer.to_json_object()['traceEvents'])
+
+
+if __name__ == '__main__':
+  unittest.main()